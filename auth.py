@@ -1,108 +1,58 @@
 import streamlit as st
-import json
-import os
-import re
-from hashlib import sha256
 from typing import Dict, List, Optional
-from datetime import datetime
+from tracker_core import accounts
+from tracker_core.accounts import (
+    GROUPS_DB_FILE, USERS_DB_FILE, get_group_index, get_user_directory, validate_password
+)
+from tracker_core import NotFoundError, TooManyAttempts, ValidationError
+from instrumentation import instrumented
 
-# File to store user credentials and groups
-USERS_DB_FILE = "users.json"
-GROUPS_DB_FILE = "groups.json"
-
-def validate_password(password: str) -> tuple[bool, str]:
-    """
-    Validate password strength
-    Returns: (is_valid, error_message)
-    """
-    if len(password) < 8:
-        return False, "Password must be at least 8 characters long"
-    
-    if not re.search(r"[A-Z]", password):
-        return False, "Password must contain at least one uppercase letter"
-    
-    if not re.search(r"[a-z]", password):
-        return False, "Password must contain at least one lowercase letter"
-    
-    if not re.search(r"\d", password):
-        return False, "Password must contain at least one number"
-    
-    if not re.search(r"[!@#$%^&*(),.?\":{}|<>]", password):
-        return False, "Password must contain at least one special character"
-    
-    return True, ""
+# Streamlit adapters over tracker_core.accounts: the same functions, with
+# failures shown through st.error and a fallback value returned.
 
+@instrumented
 def init_db():
-    """Initialize database files if they don't exist"""
-    if not os.path.exists(USERS_DB_FILE):
-        # Create initial user
-        initial_users = {
-            "swa u gou": {
-                "password": hash_password("swa123"),
-                "created_at": datetime.now().isoformat()
-            }
-        }
-        with open(USERS_DB_FILE, "w") as f:
-            json.dump(initial_users, f)
-    else:
-        # Ensure existing users have groups field
-        try:
-            with open(USERS_DB_FILE, "r") as f:
-                users = json.load(f)
-            updated = False
-            for username in users:
-                if "groups" not in users[username]:
-                    users[username]["groups"] = []
-                    updated = True
-            if updated:
-                with open(USERS_DB_FILE, "w") as f:
-                    json.dump(users, f)
-        except Exception as e:
-            st.error(f"Error updating users file: {str(e)}")
-
-    # Initialize groups file
-    if not os.path.exists(GROUPS_DB_FILE):
-        with open(GROUPS_DB_FILE, "w") as f:
-            json.dump({}, f)
-
-def hash_password(password: str) -> str:
-    """Hash password using SHA-256"""
-    return sha256(password.encode()).hexdigest()
+    """Create missing database files and bring them to the current schema"""
+    try:
+        accounts.init_db()
+    except Exception as e:
+        st.error(f"Error updating database files: {str(e)}")
 
+@instrumented
 def load_users() -> Dict:
-    """Load users from the JSON file"""
+    """Load users from the JSON file (once per unit of work)"""
     try:
-        with open(USERS_DB_FILE, "r") as f:
-            return json.load(f)
+        return accounts.load_users()
     except Exception as e:
         st.error(f"Error loading users: {str(e)}")
         return {}
 
+@instrumented
 def save_users(users: Dict):
     """Save users to the JSON file"""
     try:
-        with open(USERS_DB_FILE, "w") as f:
-            json.dump(users, f)
+        accounts.save_users(users)
     except Exception as e:
         st.error(f"Error saving users: {str(e)}")
 
+@instrumented
 def load_groups() -> Dict:
-    """Load groups from the JSON file"""
+    """Load groups from the JSON file (once per unit of work)"""
     try:
-        with open(GROUPS_DB_FILE, "r") as f:
-            return json.load(f)
+        return accounts.load_groups()
     except Exception as e:
         st.error(f"Error loading groups: {str(e)}")
         return {}
 
+@instrumented
 def save_groups(groups: Dict):
     """Save groups to the JSON file"""
     try:
-        with open(GROUPS_DB_FILE, "w") as f:
-            json.dump(groups, f)
+        accounts.save_groups(groups)
     except Exception as e:
         st.error(f"Error saving groups: {str(e)}")
 
+@instrumented
 def create_user(username: str, password: str, confirm_password: str) -> tuple[bool, str]:
     """
     Create a new user
@@ -112,160 +62,83 @@ def create_user(username: str, password: str, confirm_password: str) -> tuple[bo
     if password != confirm_password:
         return False, "Passwords do not match"
     
-    # Validate password strength
-    is_valid, error_message = validate_password(password)
-    if not is_valid:
-        return False, error_message
-    
-    users = load_users()
-    if username in users:
-        return False, "Username already exists"
-    
-    users[username] = {
-        "password": hash_password(password),
-        "created_at": datetime.now().isoformat(),
-        "groups": []  # List of group IDs the user belongs to
-    }
-    save_users(users)
+    try:
+        accounts.create_user(username, password)
+    except (ValidationError, TooManyAttempts) as e:
+        return False, str(e)
+    except Exception as e:
+        return False, f"Error creating user: {str(e)}"
     return True, "User created successfully"
 
+@instrumented
 def authenticate_user(username: str, password: str) -> bool:
-    """Authenticate user credentials"""
-    users = load_users()
-    if username not in users:
+    """Authenticate user credentials; raises TooManyAttempts when logins are throttled"""
+    try:
+        return accounts.authenticate_user(username, password)
+    except TooManyAttempts:
+        raise
+    except Exception as e:
+        st.error(f"Error logging in: {str(e)}")
         return False
-    
-    return users[username]["password"] == hash_password(password)
 
+@instrumented
 def create_group(name: str, creator_username: str, description: str = "") -> str:
     """Create a new expense group"""
     try:
-        groups = load_groups()
-        users = load_users()
-        
-        # Generate a unique group ID
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        group_id = f"group_{timestamp}_{len(groups)}"
-        
-        # Create the group
-        groups[group_id] = {
-            "name": name,
-            "description": description,
-            "creator": creator_username,
-            "members": [creator_username],
-            "created_at": datetime.now().isoformat(),
-            "invites_pending": []
-        }
-        
-        # Add group to user's groups
-        if creator_username in users:
-            if "groups" not in users[creator_username]:
-                users[creator_username]["groups"] = []
-            users[creator_username]["groups"].append(group_id)
-            
-            save_groups(groups)
-            save_users(users)
-            return group_id
-        else:
-            st.error("Creator user not found")
-            return ""
+        return accounts.create_group(name, creator_username, description)
+    except NotFoundError as e:
+        st.error(str(e))
+        return ""
     except Exception as e:
         st.error(f"Error creating group: {str(e)}")
         return ""
 
+@instrumented
 def invite_to_group(group_id: str, username: str, inviter_username: str) -> bool:
     """Invite a user to a group"""
     try:
-        groups = load_groups()
-        users = load_users()
-        
-        if (group_id not in groups or 
-            username not in users or 
-            inviter_username not in groups[group_id]["members"]):
-            return False
-        
-        if username not in groups[group_id]["invites_pending"] and username not in groups[group_id]["members"]:
-            groups[group_id]["invites_pending"].append(username)
-            save_groups(groups)
-            return True
-        return False
+        return accounts.invite_to_group(group_id, username, inviter_username)
     except Exception as e:
         st.error(f"Error inviting to group: {str(e)}")
         return False
 
+@instrumented
 def accept_group_invite(group_id: str, username: str) -> bool:
     """Accept a group invitation"""
     try:
-        groups = load_groups()
-        users = load_users()
-        
-        if (group_id not in groups or 
-            username not in groups[group_id]["invites_pending"]):
-            return False
-        
-        # Add user to group
-        groups[group_id]["members"].append(username)
-        groups[group_id]["invites_pending"].remove(username)
-        
-        # Add group to user's groups
-        if "groups" not in users[username]:
-            users[username]["groups"] = []
-        users[username]["groups"].append(group_id)
-        
-        save_groups(groups)
-        save_users(users)
-        return True
+        return accounts.accept_group_invite(group_id, username)
     except Exception as e:
         st.error(f"Error accepting invite: {str(e)}")
         return False
 
+@instrumented
 def get_user_groups(username: str) -> List[Dict]:
     """Get all groups a user belongs to"""
     try:
-        users = load_users()
-        groups = load_groups()
-        
-        if username not in users:
-            return []
-        
-        if "groups" not in users[username]:
-            users[username]["groups"] = []
-            save_users(users)
-            return []
-        
-        user_groups = []
-        for group_id in users[username]["groups"]:
-            if group_id in groups:
-                group_info = groups[group_id].copy()
-                group_info["id"] = group_id
-                user_groups.append(group_info)
-        
-        return user_groups
+        return accounts.get_user_groups(username)
     except Exception as e:
         st.error(f"Error getting user groups: {str(e)}")
         return []
 
+@instrumented
+def get_user_group(username: str, group_id: str) -> Optional[Dict]:
+    """A single group, if the user belongs to it"""
+    try:
+        return accounts.get_user_group(username, group_id)
+    except Exception as e:
+        st.error(f"Error getting group: {str(e)}")
+        return None
+
+@instrumented
 def get_user_pending_invites(username: str) -> List[Dict]:
     """Get all pending group invites for a user"""
     try:
-        groups = load_groups()
-        
-        pending_invites = []
-        for group_id, group_info in groups.items():
-            if username in group_info.get("invites_pending", []):
-                invite_info = {
-                    "group_id": group_id,
-                    "group_name": group_info["name"],
-                    "creator": group_info["creator"],
-                    "description": group_info.get("description", "")
-                }
-                pending_invites.append(invite_info)
-        
-        return pending_invites
+        return accounts.get_user_pending_invites(username)
     except Exception as e:
         st.error(f"Error getting pending invites: {str(e)}")
         return []
 
+@instrumented
 def login_page():
     """Display and handle login page"""
     # Initialize session state variables if they don't exist
@@ -408,12 +281,17 @@ def login_page():
                 signup_clicked = st.button("Sign Up", type="secondary", key="signup_btn")
             st.markdown('</div>', unsafe_allow_html=True)
             if login_clicked:
-                if authenticate_user(username, password):
-                    st.session_state.user_logged_in = True
-                    st.session_state.username = username
-                    st.rerun()
+                try:
+                    authenticated = authenticate_user(username, password)
+                except TooManyAttempts as e:
+                    st.error(str(e))
                 else:
-                    st.error("Invalid username or password")
+                    if authenticated:
+                        st.session_state.user_logged_in = True
+                        st.session_state.username = username
+                        st.rerun()
+                    else:
+                        st.error("Invalid username or password")
             if signup_clicked:
                 st.session_state.show_signup = True
                 st.rerun()
@@ -456,11 +334,11 @@ def login_page():
     
     return st.session_state.user_logged_in, st.session_state.username
 
+@instrumented
 def logout():
     """Log out the current user"""
     st.session_state.user_logged_in = False
     st.session_state.username = None
     st.rerun()
 
-# Initialize database when the module is imported
-init_db() 
\ No newline at end of file
+ 
@@ -0,0 +1,369 @@
+"""Benchmark the data layer: latency percentiles and peak RSS per operation
+
+    python benchmarks/bench_data_layer.py --expenses 100000 [--backend sqlite]
+    python benchmarks/bench_data_layer.py --data bench_data --compare benchmarks/results/old.json
+    python benchmarks/bench_data_layer.py --data bench_data --memory-budget 200 --memory-budget add_expense=20
+
+Runs each operation in a fresh process against a copy of a dataset made
+by generate_data.py (or generated on the fly from --expenses/--seed), so
+the first call pays for loading the store and building caches ("cold")
+and peak RSS belongs to that operation alone. Each operation is called
+with --samples users or groups drawn at random from the dataset; writes
+(add_expense) run last. The results are saved as JSON; --compare prints
+the change against an earlier results file and exits with 1 when an
+operation got slower or bigger than --tolerance allows.
+
+--tracemalloc also records, per operation, the peak Python memory each
+call allocated, the bytes the calls left allocated and the lines that
+allocated the most during the first call. --memory-budget (which implies
+--tracemalloc) fails the run when an operation's largest per-call peak
+exceeds it. tracemalloc slows every allocation, so such runs' timings are
+not comparable with plain ones.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+# Read-only operations first: add_expense changes the data the others read
+OPERATIONS = [
+    "get_expenses_user",
+    "get_expenses_group",
+    "get_expense_stats",
+    "calculate_group_balances",
+    "get_user_pending_invites",
+    "database_get_group_balance",
+    "add_expense",
+]
+# Operation -> which kind of key each call gets
+KEYS = {
+    "get_expenses_user": "users",
+    "get_expenses_group": "groups",
+    "get_expense_stats": "users",
+    "calculate_group_balances": "groups",
+    "get_user_pending_invites": "users",
+    "database_get_group_balance": "groups",
+    "add_expense": "groups",
+}
+METRICS = ["cold_ms", "p50_ms", "p90_ms", "p99_ms", "peak_rss_mb"]
+# Recorded with --tracemalloc only
+MEMORY_METRICS = ["alloc_peak_mb", "retained_mb"]
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _operation(name):
+    """The callable timed for ``name``; it takes one username or group ID"""
+    from tracker_core import accounts, expenses
+
+    if name == "get_expenses_user":
+        return lambda user: expenses.get_expenses(username=user)
+    if name == "get_expenses_group":
+        return lambda group_id: expenses.get_expenses(group_id=group_id)
+    if name == "get_expense_stats":
+        return lambda user: expenses.get_expense_stats(username=user)
+    if name == "calculate_group_balances":
+        return expenses.calculate_group_balances
+    if name == "get_user_pending_invites":
+        return accounts.get_user_pending_invites
+    if name == "database_get_group_balance":
+        import database
+        return database.get_group_balance
+    if name == "add_expense":
+        members = {group_id: group["members"] for group_id, group in accounts.load_groups().items()}
+
+        def add(group_id):
+            expenses.add_expense({
+                "Date": "2025-12-31", "Category": "Food", "Amount": 420.5, "Location": "Goa",
+                "Description": "Benchmark", "Username": members[group_id][0], "group_id": group_id
+            })
+        return add
+    raise ValueError(f"Unknown operation: {name}")
+
+
+def run_worker(name, workdir, keys_file, max_seconds, trace_memory=False):
+    """Time ``name`` once per key in this process and print the samples as JSON
+
+    With ``trace_memory``, also each call's peak traced allocation, the bytes
+    the calls retained, and the top allocation sites of the first call.
+    """
+    with open(keys_file) as f:
+        keys = json.load(f)
+    os.chdir(os.path.join(workdir, "legacy") if name == "database_get_group_balance" else workdir)
+    if trace_memory:
+        from instrumentation import top_sites
+        tracemalloc.start()
+    fn = _operation(name)
+    rss_start = _peak_rss_mb()
+    samples = []
+    peaks = []
+    sites = []
+    memory_start = tracemalloc.get_traced_memory()[0] if trace_memory else 0
+    started = time.perf_counter()
+    for key in keys:
+        if trace_memory:
+            before = tracemalloc.take_snapshot() if not peaks else None
+            tracemalloc.reset_peak()
+            call_memory = tracemalloc.get_traced_memory()[0]
+        call_started = time.perf_counter()
+        fn(key)
+        samples.append(time.perf_counter() - call_started)
+        if trace_memory:
+            peaks.append(tracemalloc.get_traced_memory()[1] - call_memory)
+            if before is not None:
+                sites = top_sites(before, tracemalloc.take_snapshot())
+        if time.perf_counter() - started > max_seconds:
+            break
+    result = {"samples": samples, "rss_start_mb": rss_start, "peak_rss_mb": _peak_rss_mb()}
+    if trace_memory:
+        result.update(alloc_peaks=peaks, retained=tracemalloc.get_traced_memory()[0] - memory_start, top_sites=sites)
+    print(json.dumps(result))
+
+
+def run_setup(workdir):
+    """Migrate the accounts and load expenses into the backend under test"""
+    from expense_store import get_store
+    from tracker_core import accounts, expenses
+
+    os.chdir(workdir)
+    accounts.init_db()
+    expenses.init_expenses_file()
+    get_store()
+
+
+def summarize(result):
+    """Percentiles of the warm calls; the first call is reported on its own"""
+    ms = np.array(result["samples"]) * 1000
+    warm = ms[1:] if len(ms) > 1 else ms
+    p50, p90, p99 = np.percentile(warm, [50, 90, 99])
+    summary = {
+        "calls": len(ms),
+        "cold_ms": round(float(ms[0]), 3),
+        "p50_ms": round(float(p50), 3),
+        "p90_ms": round(float(p90), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(warm.max()), 3),
+        "mean_ms": round(float(warm.mean()), 3),
+        "rss_start_mb": result["rss_start_mb"],
+        "peak_rss_mb": result["peak_rss_mb"]
+    }
+    if "alloc_peaks" in result:
+        peaks = np.array(result["alloc_peaks"]) / (1024 * 1024)
+        summary.update({
+            "alloc_peak_mb": round(float(peaks.max()), 3),
+            "alloc_peak_p50_mb": round(float(np.percentile(peaks, 50)), 3),
+            "retained_mb": round(result["retained"] / (1024 * 1024), 3),
+            "top_sites": result["top_sites"]
+        })
+    return summary
+
+
+def parse_budgets(values):
+    """--memory-budget values ("MB" for every operation or "operation=MB") as {operation or None: MB}"""
+    budgets = {}
+    for value in values or []:
+        name, _, limit = value.rpartition("=")
+        if name and name not in OPERATIONS:
+            raise ValueError(f"unknown operation in memory budget: {name}")
+        budgets[name or None] = float(limit)
+    return budgets
+
+
+def over_budget(results, budgets):
+    """(operation, peak MB, budget MB) for each operation whose per-call peak exceeded its budget"""
+    failures = []
+    for name, summary in results.items():
+        budget = budgets.get(name, budgets.get(None))
+        if budget is not None and summary.get("alloc_peak_mb", 0) > budget:
+            failures.append((name, summary["alloc_peak_mb"], budget))
+    return failures
+
+
+def _subprocess(args, env):
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__)] + args, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{' '.join(args[:2])} failed:\n{completed.stderr}")
+    return completed.stdout
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(data_dir, backend, operations, samples, max_seconds, seed=0, trace_memory=False):
+    """Run every operation against a scratch copy of ``data_dir``; returns the results document"""
+    with open(os.path.join(data_dir, "dataset.json")) as f:
+        dataset = json.load(f)
+    with open(os.path.join(data_dir, "users.json")) as f:
+        usernames = sorted(json.load(f))
+    with open(os.path.join(data_dir, "groups.json")) as f:
+        group_ids = sorted(json.load(f))
+    if "database_get_group_balance" in operations and not dataset.get("legacy"):
+        print("Skipping database_get_group_balance: dataset has no legacy/ files (generate with --legacy)")
+        operations = [op for op in operations if op != "database_get_group_balance"]
+
+    rng = np.random.default_rng(seed)
+    keys = {
+        "users": [usernames[i] for i in rng.integers(len(usernames), size=samples)],
+        "groups": [group_ids[i] for i in rng.integers(len(group_ids), size=samples)],
+    }
+    env = dict(os.environ, EXPENSE_STORE_BACKEND=backend)
+    workdir = tempfile.mkdtemp(prefix="bench-data-")
+    try:
+        shutil.copytree(data_dir, workdir, dirs_exist_ok=True)
+        for kind, names in keys.items():
+            with open(os.path.join(workdir, f"keys-{kind}.json"), "w") as f:
+                json.dump(names, f)
+        started = time.perf_counter()
+        _subprocess(["--setup", workdir], env)
+        setup_seconds = time.perf_counter() - started
+
+        results = {}
+        for name in operations:
+            keys_file = os.path.join(workdir, f"keys-{KEYS[name]}.json")
+            output = _subprocess(["--worker", name, "--workdir", workdir, "--keys", keys_file,
+                                  "--max-seconds", str(max_seconds)] + (["--tracemalloc"] if trace_memory else []),
+                                 env)
+            results[name] = summarize(json.loads(output.splitlines()[-1]))
+            shown = METRICS + (MEMORY_METRICS if trace_memory else [])
+            print(f"{name:>28} " + " ".join(f"{metric}={results[name][metric]}" for metric in shown))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "commit": _commit(),
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "backend": backend,
+        "tracemalloc": trace_memory,
+        "dataset": dataset,
+        "setup_s": round(setup_seconds, 3),
+        "operations": results
+    }
+
+
+def compare(baseline, current, tolerance):
+    """Print each metric's change from ``baseline``; returns the regressions"""
+    regressions = []
+    print(f"\n{'operation':>28} {'metric':>12} {'before':>10} {'after':>10} {'change':>8}")
+    for name, after in current["operations"].items():
+        before = baseline["operations"].get(name)
+        if before is None:
+            continue
+        for metric in METRICS + MEMORY_METRICS:
+            if metric not in before or metric not in after:
+                continue
+            old, new = before[metric], after[metric]
+            change = (new - old) / old if old else 0.0
+            flag = ""
+            if change > tolerance:
+                flag = "  REGRESSION"
+                regressions.append((name, metric, old, new))
+            print(f"{name:>28} {metric:>12} {old:>10} {new:>10} {change:>+8.0%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", help="Dataset directory from generate_data.py (default: generate one)")
+    parser.add_argument("--expenses", type=int, default=100_000, help="Expenses to generate without --data")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated data and the sampled keys")
+    parser.add_argument("--backend", default="json", choices=["json", "sqlite", "sharded"])
+    parser.add_argument("--ops", default=",".join(OPERATIONS), help="Comma-separated operations to run")
+    parser.add_argument("--samples", type=int, default=200, help="Calls per operation")
+    parser.add_argument("--max-seconds", type=float, default=60.0, help="Stop an operation's calls after this long")
+    parser.add_argument("--out", help="Results file (default: benchmarks/results/<commit>-<backend>-<expenses>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative increase before flagging")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also record traced allocations per operation")
+    parser.add_argument("--memory-budget", action="append", metavar="[OPERATION=]MB",
+                        help="Fail when a call allocates more than MB at its peak (repeatable; implies --tracemalloc)")
+    parser.add_argument("--setup", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--keys", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.setup:
+        run_setup(args.setup)
+        return 0
+    if args.worker:
+        run_worker(args.worker, args.workdir, args.keys, args.max_seconds, args.tracemalloc)
+        return 0
+
+    operations = [op.strip() for op in args.ops.split(",") if op.strip()]
+    unknown = set(operations) - set(OPERATIONS)
+    if unknown:
+        parser.error(f"unknown operations: {', '.join(sorted(unknown))}")
+    try:
+        budgets = parse_budgets(args.memory_budget)
+    except ValueError as e:
+        parser.error(str(e))
+    trace_memory = args.tracemalloc or bool(budgets)
+
+    generated = None
+    data_dir = args.data
+    if data_dir is None:
+        from generate_data import generate
+        generated = data_dir = tempfile.mkdtemp(prefix="bench-dataset-")
+        print(f"Generating {args.expenses} expenses (seed {args.seed})...")
+        generate(data_dir, args.expenses, seed=args.seed, legacy="database_get_group_balance" in operations)
+    try:
+        results = run_suite(data_dir, args.backend, operations, args.samples, args.max_seconds, args.seed,
+                            trace_memory)
+    finally:
+        if generated:
+            shutil.rmtree(generated, ignore_errors=True)
+
+    out = args.out or os.path.join(BENCH_DIR, "results", f"{results['commit'] or 'unknown'}-{args.backend}-"
+                                                         f"{results['dataset']['expenses']}.json")
+    failures = over_budget(results["operations"], budgets)
+    if budgets:
+        results["memory_budgets"] = {name or "*": limit for name, limit in budgets.items()}
+        results["over_budget"] = [name for name, _, _ in failures]
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=4)
+    print(f"Results written to {out}")
+
+    status = 0
+    for name, peak, budget in failures:
+        print(f"{name}: a call allocated {peak} MB at its peak, over the {budget:g} MB budget")
+        status = 1
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Benchmark database.get_group_balance: per-member loop vs one groupby
+
+    python benchmarks/bench_group_balance.py [--members 1000] [--expenses 100000]
+
+Builds a synthetic group in memory, checks both versions agree to the
+paisa (the new one splits the total in whole paise), and prints
+the time of each at increasing sizes up to the given one.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import balance_from_expenses  # noqa: E402
+
+
+def loop_balance(expenses, members):
+    """The previous implementation: re-filters the frame once per member"""
+    total = expenses["amount"].sum()
+    fair_share = total / len(members)
+    balances = []
+    for member in members:
+        member_expenses = expenses[expenses["username"] == member]["amount"].sum()
+        balances.append({
+            "Username": member,
+            "Total Spent": member_expenses,
+            "Fair Share": fair_share,
+            "Net Balance": member_expenses - fair_share
+        })
+    return pd.DataFrame(balances)
+
+
+def make_group(num_members, num_expenses, seed=0):
+    rng = np.random.default_rng(seed)
+    members = [f"member{i}" for i in range(num_members)]
+    # A tenth of the members never pay for anything
+    spenders = members[: max(1, num_members - num_members // 10)]
+    expenses = pd.DataFrame({
+        "username": rng.choice(spenders, size=num_expenses),
+        "amount": rng.integers(100, 500000, size=num_expenses) / 100,
+        "group_id": "1",
+    })
+    return expenses, members
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, default=1000)
+    parser.add_argument("--expenses", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    sizes = sorted({(min(m, args.members), min(e, args.expenses))
+                    for m, e in [(10, 1000), (100, 10000), (1000, 100000)]}
+                   | {(args.members, args.expenses)})
+    print(f"{'members':>8} {'expenses':>9} {'loop s':>9} {'groupby s':>10} {'speedup':>8}")
+    for num_members, num_expenses in sizes:
+        expenses, members = make_group(num_members, num_expenses)
+        expected = loop_balance(expenses, members)
+        actual = balance_from_expenses(expenses, members)
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False, check_exact=False, atol=0.01)
+
+        loop_time = best_of(lambda: loop_balance(expenses, members), args.repeat)
+        groupby_time = best_of(lambda: balance_from_expenses(expenses, members), args.repeat)
+        print(f"{num_members:>8} {num_expenses:>9} {loop_time:>9.4f} {groupby_time:>10.4f} "
+              f"{loop_time / groupby_time:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Benchmark password verification: logins per second per core at each KDF cost
+
+    python benchmarks/bench_password_kdf.py [--seconds 2] [--threads 1,4]
+
+For legacy SHA-256 and each scrypt N / PBKDF2 iteration count, times
+verify_password on one thread (logins/s per core) and with several
+threads at once (total logins/s, which shows the hash releasing the GIL).
+Use it to pick PASSWORD_SCRYPT_N / PASSWORD_PBKDF2_ROUNDS: the login cap
+is roughly PASSWORD_HASH_WORKERS times the single-thread rate.
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from passwords import hash_password, verify_password  # noqa: E402
+
+PASSWORD = "Bus-traveller-42!"
+SETTINGS = [("sha256", None)] + [("scrypt", 2 ** k) for k in (12, 14, 15, 16)] + \
+           [("pbkdf2", rounds) for rounds in (100_000, 300_000, 600_000)]
+
+
+def logins_per_second(stored, threads, seconds):
+    """Verifications per second with ``threads`` threads verifying at once"""
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        count = 0
+        while time.perf_counter() < deadline:
+            assert verify_password(PASSWORD, stored)
+            count += 1
+        return count
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        total = sum(pool.map(lambda _: worker(), range(threads)))
+    return total / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=2.0, help="Time spent on each measurement")
+    parser.add_argument("--threads", default=f"1,{os.cpu_count() or 1}",
+                        help="Comma-separated thread counts (default: 1 and every core)")
+    args = parser.parse_args(argv)
+    thread_counts = sorted({int(t) for t in args.threads.split(",")})
+
+    header = f"{'kdf':>8} {'cost':>8} {'ms/login':>9}" + "".join(f" {f'{t} thr/s':>10}" for t in thread_counts)
+    print(header)
+    for kdf, cost in SETTINGS:
+        if kdf == "sha256":
+            stored = hashlib.sha256(PASSWORD.encode()).hexdigest()
+        else:
+            stored = hash_password(PASSWORD, kdf, cost)
+        rates = [logins_per_second(stored, t, args.seconds) for t in thread_counts]
+        print(f"{kdf:>8} {cost or '-':>8} {1000 / rates[0]:>9.2f}" + "".join(f" {r:>10.0f}" for r in rates))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""Write a seeded synthetic dataset: users.json, groups.json and expenses.json
+
+    python benchmarks/generate_data.py --out bench_data --expenses 1000000 [--seed 0]
+
+Sizes follow the shape of real use rather than a uniform spread: a few
+users account for most expenses, most groups have two to five members
+while a long tail has hundreds, and bigger groups log more expenses. The
+same seed and sizes always produce the same files. Expenses are streamed
+to disk, so 10M of them need no more memory than 10k.
+
+Every user's password is "password". --legacy also writes
+legacy/expenses.json and legacy/groups.json in the layout database.py
+reads, for benchmarking database.get_group_balance on the same data.
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from passwords import hash_password  # noqa: E402
+
+PASSWORD = "password"
+CATEGORIES = ["Food", "Transport", "Stay", "Shopping", "Activities", "Other"]
+CATEGORY_WEIGHTS = [0.35, 0.2, 0.15, 0.12, 0.1, 0.08]
+LOCATIONS = ["Bengaluru", "Mumbai", "Delhi", "Goa", "Hubli", "Mysuru", "Chennai", "Jaipur", "Pune", "Manali"]
+CHUNK = 100_000
+
+
+def _zipf_weights(n, exponent, rng):
+    """Probabilities falling off as rank ** -exponent, ranks shuffled"""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def _group_sizes(num_groups, num_users, max_size, rng):
+    """Mostly 2-5 members, with a power-law tail up to max_size"""
+    sizes = 1 + rng.zipf(1.8, size=num_groups)
+    return np.minimum(sizes, min(max_size, num_users))
+
+
+def make_accounts(num_users, num_groups, max_group_size, invite_rate, rng, created_at):
+    """users.json and groups.json contents, plus the activity weight of each user"""
+    usernames = [f"user{i}" for i in range(num_users)]
+    activity = _zipf_weights(num_users, 0.8, rng)
+    stored = hash_password(PASSWORD, salt=rng.bytes(16))
+    users = {name: {"password": stored, "created_at": created_at, "groups": []} for name in usernames}
+
+    sizes = _group_sizes(num_groups, num_users, max_group_size, rng)
+    # Active users are also the ones in many groups
+    picks = rng.choice(num_users, size=int(sizes.sum()), p=activity)
+    groups = {}
+    start = 0
+    for g, size in enumerate(sizes):
+        members = [usernames[i] for i in dict.fromkeys(picks[start:start + size].tolist())]
+        start += size
+        pending = []
+        if rng.random() < invite_rate:
+            invited = rng.choice(num_users, size=int(rng.integers(1, 4)))
+            pending = [usernames[i] for i in dict.fromkeys(invited.tolist()) if usernames[i] not in members]
+        group_id = f"group_{g}"
+        groups[group_id] = {
+            "name": f"Trip {g}",
+            "description": "",
+            "creator": members[0],
+            "members": members,
+            "created_at": created_at,
+            "invites_pending": pending
+        }
+        for member in members:
+            users[member]["groups"].append(group_id)
+    return users, groups, activity
+
+
+def iter_expenses(num_expenses, users, groups, activity, group_share, split_share, end, days, rng):
+    """Expense records in the app's format, drawn CHUNK at a time"""
+    usernames = list(users)
+    group_ids = list(groups)
+    members = [groups[g]["members"] for g in group_ids]
+    # Bigger groups log more expenses
+    group_weights = np.array([len(m) for m in members], dtype=float)
+    group_weights /= group_weights.sum()
+
+    for offset in range(0, num_expenses, CHUNK):
+        n = min(CHUNK, num_expenses - offset)
+        in_group = rng.random(n) < group_share if group_ids else np.zeros(n, dtype=bool)
+        owners = rng.choice(len(usernames), size=n, p=activity)
+        group_picks = rng.choice(len(group_ids), size=n, p=group_weights) if group_ids else owners
+        paise = np.clip(np.round(rng.lognormal(11.5, 1.2, size=n)), 1000, 10_000_000).astype(np.int64)
+        day_offsets = rng.integers(0, days, size=n)
+        categories = rng.choice(len(CATEGORIES), size=n, p=CATEGORY_WEIGHTS)
+        locations = rng.integers(0, len(LOCATIONS), size=n)
+        ids = rng.bytes(16 * n).hex()
+        for i in range(n):
+            record = {
+                "id": ids[32 * i:32 * i + 32],
+                "Date": (end - timedelta(days=int(day_offsets[i]))).isoformat(),
+                "Category": CATEGORIES[categories[i]],
+                "Amount": int(paise[i]) / 100,
+                "amount_paise": int(paise[i]),
+                "Location": LOCATIONS[locations[i]],
+                "Description": f"Expense {offset + i}",
+                "Username": usernames[owners[i]],
+                "group_id": None
+            }
+            if in_group[i]:
+                group_id = group_ids[group_picks[i]]
+                group_members = members[group_picks[i]]
+                record["group_id"] = group_id
+                record["Username"] = group_members[int(rng.integers(len(group_members)))]
+                if len(group_members) > 2 and rng.random() < split_share:
+                    share_count = int(rng.integers(2, len(group_members) + 1))
+                    sharers = rng.choice(group_members, size=share_count, replace=False)
+                    record["split"] = {"type": "equal", "shares": {str(m): 1 for m in sharers}}
+            record["timestamp"] = record["Date"] + "T12:00:00"
+            yield record
+
+
+def _legacy_record(record):
+    """An expense in database.py's layout, with lowercase keys"""
+    return {
+        "date": record["Date"],
+        "category": record["Category"],
+        "amount": record["Amount"],
+        "description": record["Description"],
+        "username": record["Username"],
+        "group_id": record["group_id"]
+    }
+
+
+def write_expenses(path, records, legacy_path=None):
+    """Stream ``records`` to ``path`` as one JSON array (and to ``legacy_path``
+    as {"expenses": [...]}); returns how many were written"""
+    count = 0
+    legacy = open(legacy_path, "w") if legacy_path else None
+    try:
+        with open(path + ".tmp", "w") as f:
+            f.write("[")
+            if legacy:
+                legacy.write('{"expenses": [')
+            for record in records:
+                separator = ",\n" if count else "\n"
+                f.write(separator + json.dumps(record))
+                if legacy:
+                    legacy.write(separator + json.dumps(_legacy_record(record)))
+                count += 1
+            f.write("\n]\n")
+            if legacy:
+                legacy.write("\n]}\n")
+    finally:
+        if legacy:
+            legacy.close()
+    os.replace(path + ".tmp", path)
+    return count
+
+
+def generate(out_dir, num_expenses, num_users=None, num_groups=None, seed=0, max_group_size=500,
+             group_share=0.7, split_share=0.1, invite_rate=0.05, end="2025-12-31", days=365, legacy=False):
+    """Write the dataset to ``out_dir`` and return its description (also saved as dataset.json)"""
+    num_users = num_users or max(10, num_expenses // 20)
+    num_groups = num_groups if num_groups is not None else max(1, num_users // 5)
+    rng = np.random.default_rng(seed)
+    end_date = date.fromisoformat(end)
+    os.makedirs(out_dir, exist_ok=True)
+
+    users, groups, activity = make_accounts(num_users, num_groups, max_group_size, invite_rate, rng,
+                                            f"{end_date - timedelta(days=days)}T00:00:00")
+    for name, data in (("users.json", users), ("groups.json", groups)):
+        with open(os.path.join(out_dir, name), "w") as f:
+            json.dump(data, f)
+    legacy_path = None
+    if legacy:
+        legacy_dir = os.path.join(out_dir, "legacy")
+        os.makedirs(legacy_dir, exist_ok=True)
+        with open(os.path.join(legacy_dir, "groups.json"), "w") as f:
+            json.dump(groups, f)
+        legacy_path = os.path.join(legacy_dir, "expenses.json")
+    records = iter_expenses(num_expenses, users, groups, activity, group_share, split_share, end_date, days, rng)
+    write_expenses(os.path.join(out_dir, "expenses.json"), records, legacy_path)
+
+    sizes = np.array([len(g["members"]) for g in groups.values()]) if groups else np.zeros(1)
+    description = {
+        "seed": seed,
+        "users": num_users,
+        "groups": num_groups,
+        "expenses": num_expenses,
+        "group_share": group_share,
+        "split_share": split_share,
+        "group_size": {"median": float(np.median(sizes)), "p99": float(np.percentile(sizes, 99)),
+                       "max": int(sizes.max())},
+        "date_range": [str(end_date - timedelta(days=days - 1)), str(end_date)],
+        "legacy": legacy
+    }
+    with open(os.path.join(out_dir, "dataset.json"), "w") as f:
+        json.dump(description, f, indent=4)
+    return description
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", required=True, help="Directory to write the data files to")
+    parser.add_argument("--expenses", type=int, default=100_000, help="Number of expenses (default 100000)")
+    parser.add_argument("--users", type=int, help="Number of users (default: expenses / 20)")
+    parser.add_argument("--groups", type=int, help="Number of groups (default: users / 5)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-group-size", type=int, default=500)
+    parser.add_argument("--group-share", type=float, default=0.7, help="Fraction of expenses made in a group")
+    parser.add_argument("--split-share", type=float, default=0.1,
+                        help="Fraction of group expenses split between only some members")
+    parser.add_argument("--legacy", action="store_true", help="Also write database.py's layout under legacy/")
+    args = parser.parse_args(argv)
+
+    description = generate(args.out, args.expenses, args.users, args.groups, args.seed, args.max_group_size,
+                           args.group_share, args.split_share, legacy=args.legacy)
+    print(json.dumps(description, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
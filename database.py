@@ -1,24 +1,30 @@
 import json
 import os
 from datetime import datetime, date
+import numpy as np
 import pandas as pd
+from instrumentation import instrumented
+from money import paise_column, split_equal
 
 # File paths
 USERS_FILE = "users.json"
 EXPENSES_FILE = "expenses.json"
 GROUPS_FILE = "groups.json"
 
+@instrumented
 def load_json_file(filename):
     if os.path.exists(filename):
         with open(filename, 'r') as f:
             return json.load(f)
     return {}
 
+@instrumented
 def save_json_file(filename, data):
     with open(filename, 'w') as f:
         json.dump(data, f, indent=4)
 
 # User management
+@instrumented
 def create_user(username, password):
     users = load_json_file(USERS_FILE)
     if username in users:
@@ -27,11 +33,13 @@ def create_user(username, password):
     save_json_file(USERS_FILE, users)
     return True
 
+@instrumented
 def verify_user(username, password):
     users = load_json_file(USERS_FILE)
     return username in users and users[username]["password"] == password
 
 # Expense management
+@instrumented
 def add_expense(expense):
     expenses = load_json_file(EXPENSES_FILE)
     if "expenses" not in expenses:
@@ -39,6 +47,7 @@ def add_expense(expense):
     expenses["expenses"].append(expense)
     save_json_file(EXPENSES_FILE, expenses)
 
+@instrumented
 def load_expenses(username=None, group_id=None):
     expenses = load_json_file(EXPENSES_FILE)
     if "expenses" not in expenses:
@@ -54,6 +63,7 @@ def load_expenses(username=None, group_id=None):
     return df
 
 # Group management
+@instrumented
 def create_group(name, creator, description=""):
     groups = load_json_file(GROUPS_FILE)
     group_id = str(len(groups) + 1)
@@ -67,6 +77,7 @@ def create_group(name, creator, description=""):
     save_json_file(GROUPS_FILE, groups)
     return group_id
 
+@instrumented
 def get_user_groups(username):
     groups = load_json_file(GROUPS_FILE)
     return [
@@ -75,6 +86,7 @@ def get_user_groups(username):
         if username in group_data["members"]
     ]
 
+@instrumented
 def get_user_pending_invites(username):
     groups = load_json_file(GROUPS_FILE)
     invites = []
@@ -88,6 +100,7 @@ def get_user_pending_invites(username):
             })
     return invites
 
+@instrumented
 def accept_group_invite(group_id, username):
     groups = load_json_file(GROUPS_FILE)
     if group_id in groups and username in groups[group_id].get("invites", []):
@@ -97,6 +110,7 @@ def accept_group_invite(group_id, username):
         return True
     return False
 
+@instrumented
 def add_group_expense(group_id, expense):
     expenses = load_json_file(EXPENSES_FILE)
     if "expenses" not in expenses:
@@ -105,33 +119,40 @@ def add_group_expense(group_id, expense):
     expenses["expenses"].append(expense)
     save_json_file(EXPENSES_FILE, expenses)
 
+@instrumented
 def get_group_expenses(group_id):
     return load_expenses(group_id=group_id)
 
+@instrumented
 def get_group_members(group_id):
     groups = load_json_file(GROUPS_FILE)
     if group_id in groups:
         return groups[group_id]["members"]
     return []
 
+@instrumented
+def balance_from_expenses(expenses, members):
+    if expenses.empty or not members:
+        return pd.DataFrame()
+    
+    # Integer paise, so the shares add up to the total exactly
+    paise = paise_column(expenses["amount"])
+    fair_share = np.array(split_equal(int(paise.sum()), len(members)), dtype=np.int64)
+    
+    # One pass over the expenses; members who spent nothing get 0
+    spent = paise.groupby(expenses["username"]).sum().reindex(members, fill_value=0).to_numpy()
+    
+    return pd.DataFrame({
+        "Username": members,
+        "Total Spent": spent / 100,
+        "Fair Share": fair_share / 100,
+        "Net Balance": (spent - fair_share) / 100
+    })
+
+@instrumented
 def get_group_balance(group_id):
     expenses = get_group_expenses(group_id)
     if expenses.empty:
         return pd.DataFrame()
     
-    total = expenses["amount"].sum()
-    members = get_group_members(group_id)
-    fair_share = total / len(members)
-    
-    balances = []
-    for member in members:
-        member_expenses = expenses[expenses["username"] == member]["amount"].sum()
-        net_balance = member_expenses - fair_share
-        balances.append({
-            "Username": member,
-            "Total Spent": member_expenses,
-            "Fair Share": fair_share,
-            "Net Balance": net_balance
-        })
-    
-    return pd.DataFrame(balances) 
\ No newline at end of file
+    return balance_from_expenses(expenses, get_group_members(group_id))
@@ -0,0 +1,67 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+import pandas as pd
+
+
+class FrameCache:
+    """Process-wide LRU cache of parsed expense DataFrames
+
+    Entries are stored together with the store version they were built
+    from; a lookup with a different version counts as a miss, so writes by
+    this process or by another one are never served stale. With
+    ``copy=False`` values are shared as-is and must be treated as read-only.
+    """
+
+    def __init__(self, maxsize: int = 32, copy: bool = True):
+        self.maxsize = maxsize
+        self.copy = copy
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[pd.DataFrame]:
+        """Return a copy of the cached frame for ``key`` if it is still current"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            frame = entry[1]
+        # Callers are free to modify what they get back
+        return frame.copy() if self.copy else frame
+
+    def put(self, key: Hashable, version: Hashable, frame: pd.DataFrame):
+        """Cache ``frame`` for ``key`` as built from store ``version``"""
+        with self._lock:
+            self._entries[key] = (version, frame.copy() if self.copy else frame)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Drop every cached frame"""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
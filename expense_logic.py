@@ -1,231 +1,199 @@
 import pandas as pd
-import json
-import os
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Tuple
 import streamlit as st
+from instrumentation import instrumented
+from tracker_core import NotFoundError
+from tracker_core import expenses as core
+from tracker_core.expenses import (
+    CATEGORICAL_COLUMNS, DATE_FORMAT, expenses_between, get_cache_stats, month_bounds, split_from_form
+)
 
-# File to store expenses
-EXPENSES_FILE = "expenses.json"
+# Streamlit adapters over tracker_core.expenses: the same functions, with
+# failures shown through st.error and a fallback value returned.
 
+@instrumented
 def init_expenses_file():
-    """Initialize expenses file if it doesn't exist"""
+    """Initialize the expense store if it doesn't exist"""
     try:
-        if not os.path.exists(EXPENSES_FILE):
-            with open(EXPENSES_FILE, "w") as f:
-                json.dump([], f)
+        core.init_expenses_file()
     except Exception as e:
         st.error(f"Error initializing expenses file: {str(e)}")
 
+@instrumented
 def load_expenses():
-    """Load expenses from JSON file"""
+    """Load every expense record from the expense store"""
     try:
-        with open(EXPENSES_FILE, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+        return core.load_expenses()
     except Exception as e:
         st.error(f"Error loading expenses: {str(e)}")
         return []
 
+@instrumented
 def save_expenses(expenses):
-    """Save expenses to JSON file"""
+    """Replace the contents of the expense store"""
     try:
-        with open(EXPENSES_FILE, "w") as f:
-            json.dump(expenses, f)
+        core.save_expenses(expenses)
     except Exception as e:
         st.error(f"Error saving expenses: {str(e)}")
 
+@instrumented
 def add_expense(expense_data: Dict) -> bool:
-    """Add a new expense"""
-    try:
-        expenses = load_expenses()
-        # Add timestamp to expense
-        expense_data["timestamp"] = datetime.now().isoformat()
-        
-        # Ensure group_id is None for personal expenses
-        if "group_id" not in expense_data:
-            expense_data["group_id"] = None
-            
-        expenses.append(expense_data)
-        save_expenses(expenses)
+    """Add a new expense to the expense store"""
+    try:
+        core.add_expense(expense_data)
         return True
     except Exception as e:
         st.error(f"Error adding expense: {str(e)}")
         return False
 
-def get_expenses(username: str = None, group_id: str = None) -> pd.DataFrame:
-    """Get expenses as a pandas DataFrame
-    
-    Args:
-        username: If provided, get personal expenses for this user
-        group_id: If provided, get expenses for this group
-    """
+@instrumented
+def get_frame_memory_report(username: str = None, group_id: str = None) -> Dict:
+    """Compare the memory of a plain object-dtype frame with the compact one get_expenses builds"""
+    try:
+        return core.get_frame_memory_report(username, group_id)
+    except Exception as e:
+        st.error(f"Error building memory report: {str(e)}")
+        return {}
+
+@instrumented
+def get_expenses(username: str = None, group_id: str = None,
+                 start_date=None, end_date=None) -> pd.DataFrame:
+    """Get expenses as a pandas DataFrame (see tracker_core.expenses.get_expenses)"""
     try:
-        expenses = load_expenses()
-        if not expenses:
-            return pd.DataFrame()
-        
-        df = pd.DataFrame(expenses)
-        if df.empty:
-            return df
-            
-        # Convert date strings to datetime
-        df["Date"] = pd.to_datetime(df["Date"])
-        
-        # Handle group_id field
-        if "group_id" not in df.columns:
-            df["group_id"] = None
-        
-        if username and group_id:
-            # Get expenses that are either personal or from the specified group
-            mask = ((df["Username"] == username) & df["group_id"].isna()) | (df["group_id"] == group_id)
-            df = df[mask]
-        elif username:
-            # Get only personal expenses
-            df = df[(df["Username"] == username) & df["group_id"].isna()]
-        elif group_id:
-            # Get only group expenses
-            df = df[df["group_id"] == group_id]
-        
-        return df
+        return core.get_expenses(username, group_id, start_date, end_date)
     except Exception as e:
         st.error(f"Error getting expenses: {str(e)}")
         return pd.DataFrame()
 
+@instrumented
+def personal_metrics(df: pd.DataFrame) -> Dict:
+    """Figures behind the personal dashboard cards (see tracker_core.expenses.personal_metrics)"""
+    try:
+        return core.personal_metrics(df)
+    except Exception as e:
+        st.error(f"Error calculating expense metrics: {str(e)}")
+        return core.personal_metrics(df.iloc[0:0])
+
+@instrumented
 def calculate_summary(df: pd.DataFrame) -> Tuple[float, pd.DataFrame]:
     """Calculate summary statistics from expenses"""
     try:
-        if df.empty:
-            return 0, pd.DataFrame()
-        
-        total = df["Amount"].sum()
-        summary = df.groupby("Category")["Amount"].sum().sort_values(ascending=False)
-        summary_df = pd.DataFrame({
-            "Total Amount": summary,
-            "Percentage": (summary / total * 100).round(2)
-        })
-        return total, summary_df
+        return core.calculate_summary(df)
     except Exception as e:
         st.error(f"Error calculating summary: {str(e)}")
         return 0, pd.DataFrame()
 
+@instrumented
 def get_group_member_summary(group_id: str) -> pd.DataFrame:
     """Calculate how much each member has spent in the group"""
     try:
-        df = get_expenses(group_id=group_id)
-        if df.empty:
-            return pd.DataFrame()
-        
-        member_summary = df.groupby("Username")["Amount"].agg([
-            ("Total Spent", "sum"),
-            ("Number of Expenses", "count"),
-            ("Average Expense", "mean")
-        ]).round(2)
-        
-        # Calculate percentage of total
-        total_spent = member_summary["Total Spent"].sum()
-        if total_spent > 0:
-            member_summary["Percentage of Total"] = (member_summary["Total Spent"] / total_spent * 100).round(2)
-        else:
-            member_summary["Percentage of Total"] = 0
-        
-        return member_summary
+        return core.get_group_member_summary(group_id)
     except Exception as e:
         st.error(f"Error calculating member summary: {str(e)}")
         return pd.DataFrame()
 
+@instrumented
+def get_group_participants(group_id: str) -> List[str]:
+    """Everyone who paid for or shares in a group expense, in name order"""
+    try:
+        return core.get_group_participants(group_id)
+    except Exception as e:
+        st.error(f"Error loading group participants: {str(e)}")
+        return []
+
+@instrumented
+def get_friend_balances(username: str) -> pd.DataFrame:
+    """What each person owes ``username`` (positive) or is owed by them (negative), across all groups"""
+    try:
+        return core.get_friend_balances(username)
+    except Exception as e:
+        st.error(f"Error calculating friend balances: {str(e)}")
+        return pd.DataFrame(columns=["Friend", "Net Balance", "net_paise"])
+
+@instrumented
+def friend_totals(friends: pd.DataFrame) -> Tuple[float, float]:
+    """(owed to the user, owed by the user) in rupees, from get_friend_balances"""
+    try:
+        return core.friend_totals(friends)
+    except Exception as e:
+        st.error(f"Error totalling friend balances: {str(e)}")
+        return 0.0, 0.0
+
+@instrumented
 def calculate_group_balances(group_id: str) -> pd.DataFrame:
     """Calculate who owes what to whom in the group"""
     try:
-        df = get_expenses(group_id=group_id)
-        if df.empty:
-            return pd.DataFrame()
-        
-        member_summary = get_group_member_summary(group_id)
-        total_spent = member_summary["Total Spent"].sum()
-        num_members = len(member_summary)
-        
-        if num_members == 0:
-            return pd.DataFrame()
-        
-        # Calculate how much each person should have paid
-        fair_share = total_spent / num_members
-        
-        # Calculate how much each person owes or is owed
-        balances = pd.DataFrame({
-            "Username": member_summary.index,
-            "Total Spent": member_summary["Total Spent"],
-            "Fair Share": fair_share,
-            "Net Balance": member_summary["Total Spent"] - fair_share
-        })
-        
-        return balances
+        return core.calculate_group_balances(group_id)
     except Exception as e:
         st.error(f"Error calculating group balances: {str(e)}")
         return pd.DataFrame()
 
+@instrumented
+def get_settlement_plan(group_id: str) -> pd.DataFrame:
+    """Transfers that settle the group's outstanding balances"""
+    try:
+        return core.get_settlement_plan(group_id)
+    except Exception as e:
+        st.error(f"Error calculating settlements: {str(e)}")
+        return pd.DataFrame(columns=["From", "To", "Amount"])
+
+@instrumented
+def record_settlements(group_id: str, transfers: pd.DataFrame) -> bool:
+    """Record transfers (From, To, Amount) as paid so they count in future balances"""
+    try:
+        return core.record_settlements(group_id, transfers) > 0
+    except Exception as e:
+        st.error(f"Error recording settlements: {str(e)}")
+        return False
+
+@instrumented
+def get_settlement_history(group_id: str) -> pd.DataFrame:
+    """Settlements recorded for the group, newest first"""
+    try:
+        return core.get_settlement_history(group_id)
+    except Exception as e:
+        st.error(f"Error loading settlements: {str(e)}")
+        return pd.DataFrame(columns=["Date", "From", "To", "Amount"])
+
+@instrumented
 def get_expense_stats(username: str = None, group_id: str = None) -> Dict:
     """Get statistics about expenses"""
     try:
-        df = get_expenses(username, group_id)
-        if df.empty:
-            return {
-                "total_spent": 0,
-                "avg_expense": 0,
-                "num_transactions": 0,
-                "top_category": "N/A",
-                "this_month_total": 0,
-                "last_month_total": 0
-            }
-        
-        # Get current month's start and end dates
-        today = pd.Timestamp.now()
-        this_month_start = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        next_month_start = (this_month_start + pd.DateOffset(months=1))
-        last_month_start = (this_month_start - pd.DateOffset(months=1))
-        
-        stats = {
-            "total_spent": df["Amount"].sum(),
-            "avg_expense": df["Amount"].mean(),
-            "num_transactions": len(df),
-            "top_category": df.groupby("Category")["Amount"].sum().idxmax() if not df.empty else "N/A",
-            "this_month_total": df[(df["Date"] >= this_month_start) & (df["Date"] < next_month_start)]["Amount"].sum(),
-            "last_month_total": df[(df["Date"] >= last_month_start) & (df["Date"] < this_month_start)]["Amount"].sum()
-        }
-        
-        return stats
+        return core.get_expense_stats(username, group_id)
     except Exception as e:
         st.error(f"Error calculating expense stats: {str(e)}")
-        return {
-            "total_spent": 0,
-            "avg_expense": 0,
-            "num_transactions": 0,
-            "top_category": "N/A",
-            "this_month_total": 0,
-            "last_month_total": 0
-        }
+        return dict(core.EMPTY_STATS)
 
-def remove_expenses_by_indices(indices: List[int]) -> bool:
-    """Remove expenses at specified indices"""
-    try:
-        expenses = load_expenses()
-        if not expenses:
-            return False
-        
-        # Sort indices in descending order to avoid index shifting
-        indices = sorted(indices, reverse=True)
-        
-        # Remove expenses at specified indices
-        for index in indices:
-            if 0 <= index < len(expenses):
-                expenses.pop(index)
-        
-        save_expenses(expenses)
-        return True
+@instrumented
+def remove_expenses(expense_ids: List[str]) -> bool:
+    """Remove expenses by their stable IDs"""
+    try:
+        return core.remove_expenses(expense_ids) > 0
     except Exception as e:
         st.error(f"Error removing expenses: {str(e)}")
         return False
 
-# Initialize expenses file when module is imported
-init_expenses_file()
+@instrumented
+def update_expense(expense_id: str, **fields) -> bool:
+    """Change fields of an existing expense, e.g. update_expense(id, Amount=250.0)"""
+    try:
+        core.update_expense(expense_id, **fields)
+        return True
+    except NotFoundError:
+        return False
+    except Exception as e:
+        st.error(f"Error updating expense: {str(e)}")
+        return False
+
+@instrumented
+def remove_expenses_by_indices(indices: List[int]) -> bool:
+    """Remove expenses at specified positions in load_expenses() order
+
+    Prefer remove_expenses with IDs: positions shift when another session
+    writes between reading the list and deleting from it.
+    """
+    try:
+        return core.remove_expenses_by_indices(indices) > 0
+    except Exception as e:
+        st.error(f"Error removing expenses: {str(e)}")
+        return False
@@ -0,0 +1,1245 @@
+import hashlib
+import json
+import os
+import queue
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+from metrics import STORE_READ_BYTES, STORE_WRITTEN_BYTES
+
+# Expense storage backends. The JSON backend keeps a snapshot plus an
+# append-only JSON-Lines log; the SQLite backend keeps one indexed table.
+# EXPENSE_STORE_BACKEND selects the backend used by get_store().
+EXPENSES_FILE = "expenses.json"
+EXPENSES_LOG_FILE = "expenses.log.jsonl"
+EXPENSES_DB_FILE = "expenses.db"
+EXPENSES_SHARD_DIR = "expense_shards"
+COMPACT_THRESHOLD = 500
+# How long the writer waits for more appends before committing a batch
+GROUP_COMMIT_WINDOW = 0.002
+GROUP_COMMIT_MAX_BATCH = 1000
+STORE_BACKEND_ENV = "EXPENSE_STORE_BACKEND"
+# Index locations pack (offset, length, file slot) into one int
+_SLOT_BITS = 2
+_LENGTH_BITS = 24
+
+
+def new_expense_id() -> str:
+    """Generate a stable unique ID for a new expense"""
+    return uuid.uuid4().hex
+
+
+def _legacy_id(record: Dict, seen: Dict[str, int]) -> str:
+    # Records written before IDs existed get an ID derived from their
+    # content, so it stays the same across loads until compaction stores it
+    digest = hashlib.sha1(json.dumps(record, sort_keys=True).encode()).hexdigest()[:16]
+    occurrence = seen.get(digest, 0)
+    seen[digest] = occurrence + 1
+    return f"legacy-{digest}-{occurrence}"
+
+
+def _apply_log(entries: Iterable[Dict]) -> Tuple[List[Optional[Dict]], Dict[str, int]]:
+    """Replay log entries into records plus an ID -> offset index
+
+    Plain entries are added records; ``{"_op": "delete"}`` entries are
+    tombstones and ``{"_op": "update"}`` entries carry changed fields.
+    Deleted records leave a ``None`` hole so offsets stay valid.
+    """
+    records = []
+    offsets = {}
+    seen = {}
+    for entry in entries:
+        op = entry.get("_op")
+        if op is None:
+            if "id" not in entry:
+                entry["id"] = _legacy_id(entry, seen)
+            offsets[entry["id"]] = len(records)
+            records.append(entry)
+        elif op == "delete":
+            offset = offsets.pop(entry["id"], None)
+            if offset is not None:
+                records[offset] = None
+        elif op == "update":
+            offset = offsets.get(entry["id"])
+            if offset is not None:
+                records[offset] = {**records[offset], **entry["fields"], "id": entry["id"]}
+    return records, offsets
+
+
+def _pack(slot: int, start: int, length: int) -> Optional[int]:
+    """Location of a line: byte offset and length in the file of index slot ``slot``"""
+    if length >= 1 << _LENGTH_BITS:
+        return None
+    return (start << (_LENGTH_BITS + _SLOT_BITS)) | (length << _SLOT_BITS) | slot
+
+
+def _unpack(location: int) -> Tuple[int, int, int]:
+    """(slot, offset, length) of a location made by _pack"""
+    return (location & ((1 << _SLOT_BITS) - 1), location >> (_LENGTH_BITS + _SLOT_BITS),
+            (location >> _SLOT_BITS) & ((1 << _LENGTH_BITS) - 1))
+
+
+def _locate(entries: List[Dict], locations: List[Optional[int]]) -> Dict[str, object]:
+    """ID -> location of each live record's line, or a list of it and the
+    lines of its updates, after _apply_log has given every entry its ID"""
+    where = {}
+    for entry, location in zip(entries, locations):
+        op = entry.get("_op")
+        if op is None:
+            where[entry["id"]] = location
+        elif op == "delete":
+            where.pop(entry["id"], None)
+        elif op == "update" and entry["id"] in where:
+            base = where[entry["id"]]
+            where[entry["id"]] = (base if isinstance(base, list) else [base]) + [location]
+    return where
+
+
+def _matches(record: Dict, username: Optional[str], group_id: Optional[str],
+             start_date: Optional[str] = None, end_date: Optional[str] = None) -> bool:
+    """Filter used by get_expenses: personal expenses of a user and/or a group's
+    expenses, optionally limited to ``start_date <= Date < end_date``"""
+    date = record.get("Date") or ""
+    if (start_date and date < start_date) or (end_date and date >= end_date):
+        return False
+    record_group = record.get("group_id")
+    personal = username is not None and record.get("Username") == username and record_group is None
+    if username and group_id:
+        return personal or record_group == group_id
+    if username:
+        return personal
+    if group_id:
+        return record_group == group_id
+    return True
+
+
+class WriteCoalescer:
+    """Single writer thread that commits concurrent appends in batches
+
+    Callers of ``submit`` block until their record is durable. The writer
+    takes everything queued within ``window`` seconds of the first request
+    and hands it to ``write_batch`` as one write, so N concurrent sessions
+    share one fsync or one transaction instead of taking turns.
+    """
+
+    def __init__(self, write_batch: Callable[[List[Dict]], None],
+                 window: float = GROUP_COMMIT_WINDOW, max_batch: int = GROUP_COMMIT_MAX_BATCH):
+        self.write_batch = write_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.records = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="expense-writer", daemon=True)
+                    self._thread.start()
+
+    def submit(self, record: Dict):
+        """Queue ``record`` and wait until it has been written"""
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((record, future))
+        future.result()
+
+    def _collect(self) -> List[Tuple[Dict, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self.write_batch([record for record, _ in batch])
+                self.batches += 1
+                self.records += len(batch)
+                for _, future in batch:
+                    future.set_result(None)
+            except Exception:
+                # Retry one by one so a single bad record only fails its own caller;
+                # append_records leaves nothing behind from the failed batch, or
+                # (sharded) skips the records it already wrote
+                for record, future in batch:
+                    try:
+                        self.write_batch([record])
+                        future.set_result(None)
+                    except Exception as e:
+                        future.set_exception(e)
+
+    def stats(self) -> Dict:
+        """Number of batches and records written so far"""
+        return {
+            "batches": self.batches,
+            "records": self.records,
+            "avg_batch": round(self.records / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+_writer_lock = threading.Lock()
+
+
+class ExpenseStore:
+    """Interface shared by the expense storage backends"""
+
+    # Bumped on every write made through this store object
+    generation = 0
+    # True if query_version() of one owner is unaffected by writes to another
+    scoped_versions = False
+    _writer = None
+
+    def data_files(self) -> List[str]:
+        """Files whose size and mtime change when another process writes"""
+        return []
+
+    def fingerprint(self) -> tuple:
+        """Size and mtime of the data files; stable across processes"""
+        stats = []
+        for path in self.data_files():
+            try:
+                st = os.stat(path)
+                stats.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stats.append(None)
+        return tuple(stats)
+
+    def version(self) -> tuple:
+        """Token that changes whenever the stored expenses may have changed"""
+        return (self.generation, self.fingerprint())
+
+    def query_version(self, username: str = None, group_id: str = None,
+                      start_date: str = None, end_date: str = None) -> tuple:
+        """Like version(), but only has to cover the records query() would return"""
+        return self.version()
+
+    def query_fingerprint(self, username: str = None, group_id: str = None) -> tuple:
+        """Like fingerprint(), but only has to cover the records query() would return"""
+        return self.fingerprint()
+
+    def _bump_generation(self):
+        self.generation += 1
+
+    def load_records(self) -> List[Dict]:
+        """Return every expense record in insertion order"""
+        raise NotImplementedError
+
+    def query(self, username: str = None, group_id: str = None,
+              start_date: str = None, end_date: str = None) -> List[Dict]:
+        """Return the records get_expenses would keep for these filters
+
+        Dates are ``YYYY-MM-DD`` strings; ``start_date`` is inclusive and
+        ``end_date`` exclusive.
+        """
+        return [r for r in self.load_records() if _matches(r, username, group_id, start_date, end_date)]
+
+    def get_records(self, ids: List[str]) -> List[Dict]:
+        """Return the stored records with these IDs"""
+        wanted = set(ids)
+        return [r for r in self.load_records() if r["id"] in wanted]
+
+    def user_group_ids(self, username: str) -> List[str]:
+        """IDs of the groups in which ``username`` has recorded expenses"""
+        group_ids = {r.get("group_id") for r in self.load_records() if r.get("Username") == username}
+        return sorted(g for g in group_ids if g is not None)
+
+    def writer(self) -> WriteCoalescer:
+        """Group-commit writer shared by every session using this store"""
+        if self._writer is None:
+            with _writer_lock:
+                if self._writer is None:
+                    self._writer = WriteCoalescer(self.append_records)
+        return self._writer
+
+    def append_record(self, record: Dict):
+        """Durably store one new expense record, assigning it an ``id``"""
+        record.setdefault("id", new_expense_id())
+        self.writer().submit(record)
+
+    def append_records(self, records: List[Dict]):
+        """Store a batch of new records with a single durable write"""
+        raise NotImplementedError
+
+    def delete_records(self, ids: List[str]) -> int:
+        """Delete the records with these IDs and return how many existed"""
+        raise NotImplementedError
+
+    def update_record(self, expense_id: str, fields: Dict) -> bool:
+        """Change fields of one record; False if the ID is unknown"""
+        raise NotImplementedError
+
+    def replace_records(self, records: List[Dict]):
+        """Replace the whole store with ``records``"""
+        raise NotImplementedError
+
+    def recover(self):
+        """Bring the store to a consistent state after an unclean shutdown"""
+
+
+class JsonLogExpenseStore(ExpenseStore):
+    """Snapshot file plus an append-only JSON-Lines log
+
+    Adding an expense appends one line to the log, and deletes and updates
+    append tombstone or update entries keyed by expense ID, so none of them
+    rewrite the file. Once the log grows past ``compact_threshold`` entries
+    a background thread folds it back into the snapshot.
+
+    The snapshot holds one record per line, and the ID index records where
+    each record's line (and the lines of its updates) start, so
+    get_records() seeks to the k lines it needs instead of parsing the
+    whole history.
+    """
+
+    def __init__(self, snapshot_file: str = EXPENSES_FILE, log_file: str = EXPENSES_LOG_FILE,
+                 compact_threshold: int = COMPACT_THRESHOLD, metrics_label: str = "expenses"):
+        self.snapshot_file = snapshot_file
+        self.log_file = log_file
+        # The store label of its bytes in the read/write metrics
+        self.metrics_label = metrics_label
+        self.compact_threshold = compact_threshold
+        self._write_lock = threading.Lock()
+        self._compaction_lock = threading.Lock()
+        self._compaction_running = False
+        self._log_records = None
+        # Even while the on-disk layout is stable, odd while files are being swapped
+        self._layout_generation = 0
+        # (version, ID -> location, slot -> file), built by the last full
+        # read or compaction and kept up to date by our own writes
+        self._index = None
+
+    @property
+    def compacting_log_file(self) -> str:
+        return self.log_file + ".compacting"
+
+    @property
+    def next_snapshot_file(self) -> str:
+        return self.snapshot_file + ".next"
+
+    def data_files(self) -> List[str]:
+        return [self.snapshot_file, self.next_snapshot_file, self.compacting_log_file, self.log_file]
+
+    def _begin_layout_change(self):
+        self._layout_generation += 1
+
+    def _end_layout_change(self):
+        self._layout_generation += 1
+
+    @staticmethod
+    def _read_snapshot(path: str, store: str = "expenses") -> List[Dict]:
+        try:
+            with open(path, "r") as f:
+                STORE_READ_BYTES.inc(store, amount=os.fstat(f.fileno()).st_size)
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+
+    @staticmethod
+    def _read_snapshot_lines(path: str, store: str = "expenses") -> Tuple[List[Dict], List[Optional[int]]]:
+        """Snapshot records and the location of each one's line (slot 0)
+
+        Snapshots from before _write_snapshot (a single line) have no
+        locations until the next compaction rewrites them.
+        """
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return [], []
+        STORE_READ_BYTES.inc(store, amount=len(data))
+        try:
+            records = json.loads(data)
+        except json.JSONDecodeError:
+            return [], []
+        lines = data.split(b"\n")
+        if not data.startswith(b"[\n") or len(lines) != len(records) + 3:
+            return records, [None] * len(records)
+        locations = []
+        position = 2
+        for line in lines[1:-2]:
+            locations.append(_pack(0, position, len(line) - line.endswith(b",")))
+            position += len(line) + 1
+        return records, locations
+
+    @staticmethod
+    def _read_log(path: str, store: str = "expenses", slot: int = 0,
+                  locations: List[Optional[int]] = None) -> List[Dict]:
+        """Entries of a log file; appends their locations to ``locations`` if given"""
+        records = []
+        size = 0
+        try:
+            with open(path, "rb") as f:
+                for line in f:
+                    start = size
+                    size += len(line)
+                    if not line.endswith(b"\n"):
+                        # A torn final line from an interrupted append is ignored
+                        break
+                    if line.strip():
+                        records.append(json.loads(line))
+                        if locations is not None:
+                            locations.append(_pack(slot, start, len(line) - 1))
+        except FileNotFoundError:
+            pass
+        STORE_READ_BYTES.inc(store, amount=size)
+        return records
+
+    @staticmethod
+    def _write_json_atomic(path: str, data, store: str = "expenses"):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+            STORE_WRITTEN_BYTES.inc(store, amount=os.fstat(f.fileno()).st_size)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _write_snapshot(path: str, records: List[Dict], store: str = "expenses") -> List[Optional[int]]:
+        """Atomically write ``records`` as a JSON array, one record per line
+
+        Returns the location of each record's line (slot 0).
+        """
+        locations = []
+        position = 2
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(b"[\n" if records else b"[")
+            for i, record in enumerate(records):
+                line = json.dumps(record).encode()
+                f.write(b",\n" + line if i else line)
+                locations.append(_pack(0, position, len(line)))
+                position += len(line) + 2
+            f.write(b"\n]\n" if records else b"]\n")
+            f.flush()
+            os.fsync(f.fileno())
+            STORE_WRITTEN_BYTES.inc(store, amount=f.tell())
+        os.replace(tmp_path, path)
+        return locations
+
+    @staticmethod
+    def _remove_if_exists(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _current_snapshot_file(self) -> str:
+        # Once the compacting log is gone the pending snapshot is authoritative
+        if os.path.exists(self.next_snapshot_file) and not os.path.exists(self.compacting_log_file):
+            return self.next_snapshot_file
+        return self.snapshot_file
+
+    def _read_entries(self, locate: bool = False) -> Tuple[List[Dict], Optional[List[Optional[int]]], List[str]]:
+        """Snapshot and log entries, their locations (if ``locate``) and the file of each slot"""
+        while True:
+            generation = self._layout_generation
+            if generation % 2:
+                time.sleep(0.001)
+                continue
+            files = [self._current_snapshot_file(), self.compacting_log_file, self.log_file]
+            locations = None
+            if locate:
+                entries, locations = self._read_snapshot_lines(files[0], self.metrics_label)
+            else:
+                entries = self._read_snapshot(files[0], self.metrics_label)
+            for slot in (1, 2):
+                entries.extend(self._read_log(files[slot], self.metrics_label, slot, locations))
+            if generation == self._layout_generation:
+                return entries, locations, files
+
+    def load_records(self) -> List[Dict]:
+        version = self.version()
+        # Line locations are only worked out when the index needs rebuilding
+        locate = self._index is None or self._index[0] != version
+        entries, locations, files = self._read_entries(locate)
+        records, _ = _apply_log(entries)
+        if locate:
+            self._index = (version, _locate(entries, locations), files)
+        return [r for r in records if r is not None]
+
+    def _valid_index(self) -> Optional[Tuple[Dict[str, object], List[str]]]:
+        """(ID -> location, slot -> file) if it still matches the files, without reading them"""
+        index = self._index
+        if index is None or index[0] != self.version():
+            return None
+        return index[1], index[2]
+
+    def _current_index(self) -> Tuple[Dict[str, object], List[str]]:
+        """(ID -> location, slot -> file), rebuilt only if someone else changed the files"""
+        index = self._valid_index()
+        if index is None:
+            self.load_records()
+            index = self._index[1], self._index[2]
+        return index
+
+    def _read_located(self, wanted: List[Tuple[str, object]], files: List[str]) -> Optional[List[Dict]]:
+        """Records read from their indexed lines; None if a line is not what the index says"""
+        handles = {}
+        records = []
+        try:
+            for expense_id, location in wanted:
+                record = None
+                for packed in location if isinstance(location, list) else [location]:
+                    slot, start, length = _unpack(packed)
+                    f = handles.get(slot)
+                    if f is None:
+                        f = handles[slot] = open(files[slot], "rb")
+                    f.seek(start)
+                    entry = json.loads(f.read(length))
+                    STORE_READ_BYTES.inc(self.metrics_label, amount=length)
+                    if not isinstance(entry, dict) or entry.get("id", expense_id) != expense_id:
+                        return None
+                    if record is None:
+                        record = {**entry, "id": expense_id}
+                    else:
+                        record = {**record, **entry["fields"], "id": expense_id}
+                records.append(record)
+        except (OSError, ValueError, KeyError):
+            return None
+        finally:
+            for f in handles.values():
+                f.close()
+        return records
+
+    def get_records(self, ids: List[str]) -> List[Dict]:
+        while True:
+            generation = self._layout_generation
+            if generation % 2:
+                time.sleep(0.001)
+                continue
+            where, files = self._current_index()
+            wanted = [(expense_id, where[expense_id]) for expense_id in dict.fromkeys(ids) if expense_id in where]
+            unlocated = any(None in (loc if isinstance(loc, list) else [loc]) for _, loc in wanted)
+            records = None if unlocated else self._read_located(wanted, files)
+            if generation == self._layout_generation:
+                break
+        if records is None:
+            if unlocated:
+                # A single-line snapshot from before line locations: rewrite it
+                self.schedule_compaction(force=True)
+            # Fall back to a full read, e.g. when another process changed the files
+            wanted_ids = set(ids)
+            return [r for r in self.load_records() if r["id"] in wanted_ids]
+        return records
+
+    def _append_entries(self, entries: List[Dict]) -> List[Tuple[int, int]]:
+        """Append entries with one write and one fsync; caller holds the write lock
+
+        All or none of the entries are appended. Returns the (offset,
+        length) of each entry's line in the log.
+        """
+        if self._log_records is None:
+            self._log_records = len(self._read_log(self.log_file, self.metrics_label))
+        lines = [json.dumps(entry).encode() for entry in entries]
+        payload = b"".join(line + b"\n" for line in lines)
+        with open(self.log_file, "ab+") as f:
+            start = f.seek(0, os.SEEK_END)
+            if start:
+                f.seek(start - 1)
+                if f.read(1) != b"\n":
+                    # Drop a torn line left by a crashed append so it cannot
+                    # run into this one
+                    f.seek(0)
+                    start = f.read().rfind(b"\n") + 1
+                    f.truncate(start)
+            try:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            except BaseException:
+                # Roll back a partial write so a retry cannot duplicate entries
+                f.truncate(start)
+                raise
+        STORE_WRITTEN_BYTES.inc(self.metrics_label, amount=len(payload))
+        self._log_records += len(entries)
+        self._bump_generation()
+        spans = []
+        for line in lines:
+            spans.append((start, len(line)))
+            start += len(line) + 1
+        return spans
+
+    def _after_append(self):
+        if self._log_records is not None and self._log_records >= self.compact_threshold:
+            self.schedule_compaction()
+
+    def append_records(self, records: List[Dict]):
+        for record in records:
+            record.setdefault("id", new_expense_id())
+        with self._write_lock:
+            # Appends do not need the index; it is only kept if already current,
+            # and otherwise rebuilt when a read by ID, delete or update needs it
+            index = self._valid_index()
+            spans = self._append_entries(records)
+            if index is None:
+                self._index = None
+            else:
+                where, files = index
+                slot = files.index(self.log_file)
+                for record, (start, length) in zip(records, spans):
+                    where[record["id"]] = _pack(slot, start, length)
+                self._index = (self.version(), where, files)
+        self._after_append()
+
+    def delete_records(self, ids: List[str]) -> int:
+        with self._write_lock:
+            where, files = self._current_index()
+            known = [expense_id for expense_id in dict.fromkeys(ids) if expense_id in where]
+            if known:
+                self._append_entries([{"_op": "delete", "id": expense_id} for expense_id in known])
+                for expense_id in known:
+                    del where[expense_id]
+                self._index = (self.version(), where, files)
+        self._after_append()
+        return len(known)
+
+    def update_record(self, expense_id: str, fields: Dict) -> bool:
+        fields = {k: v for k, v in fields.items() if k != "id"}
+        with self._write_lock:
+            where, files = self._current_index()
+            if expense_id not in where:
+                return False
+            (start, length), = self._append_entries([{"_op": "update", "id": expense_id, "fields": fields}])
+            location = where[expense_id]
+            where[expense_id] = (location if isinstance(location, list) else [location]) + [
+                _pack(files.index(self.log_file), start, length)
+            ]
+            self._index = (self.version(), where, files)
+        self._after_append()
+        return True
+
+    def replace_records(self, records: List[Dict]):
+        for record in records:
+            record.setdefault("id", new_expense_id())
+        with self._compaction_lock, self._write_lock:
+            self._begin_layout_change()
+            try:
+                locations = self._write_snapshot(self.snapshot_file, records, self.metrics_label)
+                self._remove_if_exists(self.next_snapshot_file)
+                self._remove_if_exists(self.compacting_log_file)
+                self._remove_if_exists(self.log_file)
+                self._log_records = 0
+                self._bump_generation()
+                self._index = (self.version(), _locate(records, locations),
+                               [self.snapshot_file, self.compacting_log_file, self.log_file])
+            finally:
+                self._end_layout_change()
+
+    def recover(self):
+        """Finish or roll back a compaction interrupted by a crash"""
+        if not os.path.exists(self.snapshot_file):
+            self._write_json_atomic(self.snapshot_file, [], self.metrics_label)
+        with self._compaction_lock:
+            if not os.path.exists(self.next_snapshot_file):
+                return
+            with self._write_lock:
+                self._begin_layout_change()
+                try:
+                    if os.path.exists(self.compacting_log_file):
+                        # Crashed before the commit point: the log still holds the records
+                        os.remove(self.next_snapshot_file)
+                    else:
+                        os.replace(self.next_snapshot_file, self.snapshot_file)
+                finally:
+                    self._end_layout_change()
+
+    def compact(self, force: bool = False):
+        """Fold the log into the snapshot
+
+        New appends keep going to a fresh log while the old one is folded.
+        The commit point is the removal of the compacting log, after which
+        the pending snapshot is authoritative and only has to be renamed
+        into place. ``force`` rewrites the snapshot even with an empty log.
+        """
+        self.recover()
+        with self._compaction_lock:
+            with self._write_lock:
+                if not os.path.exists(self.compacting_log_file):
+                    if not os.path.exists(self.log_file) and not force:
+                        return
+                    index = self._valid_index()
+                    self._begin_layout_change()
+                    try:
+                        if os.path.exists(self.log_file):
+                            os.replace(self.log_file, self.compacting_log_file)
+                        else:
+                            open(self.compacting_log_file, "a").close()
+                        self._log_records = 0
+                        if index is not None:
+                            # Indexed log lines now live in the compacting log
+                            where, files = index
+                            swap = {self.log_file: self.compacting_log_file, self.compacting_log_file: self.log_file}
+                            self._index = (self.version(), where, [swap.get(f, f) for f in files])
+                    finally:
+                        self._end_layout_change()
+
+            entries = self._read_snapshot(self.snapshot_file, self.metrics_label)
+            entries.extend(self._read_log(self.compacting_log_file, self.metrics_label))
+            # Tombstoned records are dropped and updates folded in
+            records, _ = _apply_log(entries)
+            records = [r for r in records if r is not None]
+            locations = self._write_snapshot(self.next_snapshot_file, records, self.metrics_label)
+
+            with self._write_lock:
+                self._begin_layout_change()
+                try:
+                    os.remove(self.compacting_log_file)
+                    os.replace(self.next_snapshot_file, self.snapshot_file)
+                    # The index follows from what was just written plus the
+                    # (short) log of appends made while compacting
+                    log_locations = []
+                    entries = records + self._read_log(self.log_file, self.metrics_label, 2, log_locations)
+                    _apply_log(entries)
+                    self._index = (self.version(), _locate(entries, locations + log_locations),
+                                   [self.snapshot_file, self.compacting_log_file, self.log_file])
+                finally:
+                    self._end_layout_change()
+
+    def _run_compaction(self, force: bool = False):
+        try:
+            self.compact(force)
+        except Exception:
+            # The log stays authoritative; the next append retries compaction
+            pass
+        finally:
+            self._compaction_running = False
+
+    def schedule_compaction(self, force: bool = False):
+        """Start a background compaction unless one is already running"""
+        with self._write_lock:
+            if self._compaction_running:
+                return
+            self._compaction_running = True
+        threading.Thread(target=self._run_compaction, args=(force,), name="expense-compaction",
+                         daemon=True).start()
+
+
+class SqliteExpenseStore(ExpenseStore):
+    """Expenses in a SQLite table indexed on the columns get_expenses filters by
+
+    The full record is kept as JSON next to the indexed ``id``,
+    ``Username``, ``group_id`` and ``Date`` columns, so filters run in SQL
+    and only the matching rows are ever decoded.
+    """
+
+    TABLE = """CREATE TABLE IF NOT EXISTS expenses (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        id TEXT,
+        Username TEXT,
+        group_id TEXT,
+        Date TEXT,
+        record TEXT NOT NULL
+    )"""
+    INDEXES = [
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_expenses_id ON expenses (id)",
+        "CREATE INDEX IF NOT EXISTS idx_expenses_user_group ON expenses (Username, group_id)",
+        "CREATE INDEX IF NOT EXISTS idx_expenses_group_date ON expenses (group_id, Date)",
+        "CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (Date)",
+    ]
+
+    def __init__(self, db_file: str = EXPENSES_DB_FILE, import_from: str = EXPENSES_FILE):
+        self.db_file = db_file
+        self.import_from = import_from
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def data_files(self) -> List[str]:
+        return [self.db_file, self.db_file + "-wal"]
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections may only be used on the thread that opened them
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        if not self._schema_ready:
+            self._ensure_schema(conn)
+        return conn
+
+    def _ensure_schema(self, conn: sqlite3.Connection):
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            with conn:
+                exists = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'expenses'"
+                ).fetchone()
+                conn.execute(self.TABLE)
+                self._add_id_column(conn)
+                for statement in self.INDEXES:
+                    conn.execute(statement)
+                if not exists and self.import_from and os.path.exists(self.import_from):
+                    # First use: carry over the existing JSON history
+                    self._insert(conn, JsonLogExpenseStore(self.import_from).load_records())
+            self._schema_ready = True
+
+    @staticmethod
+    def _add_id_column(conn: sqlite3.Connection):
+        """Give tables created before expense IDs existed an ``id`` column"""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(expenses)")]
+        if "id" in columns:
+            return
+        conn.execute("ALTER TABLE expenses ADD COLUMN id TEXT")
+        updates = []
+        for seq, raw in conn.execute("SELECT seq, record FROM expenses").fetchall():
+            record = json.loads(raw)
+            record.setdefault("id", new_expense_id())
+            updates.append((record["id"], json.dumps(record), seq))
+        conn.executemany("UPDATE expenses SET id = ?, record = ? WHERE seq = ?", updates)
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, records: List[Dict]):
+        for record in records:
+            record.setdefault("id", new_expense_id())
+        rows = [(r["id"], r.get("Username"), r.get("group_id"), r.get("Date"), json.dumps(r)) for r in records]
+        conn.executemany(
+            "INSERT INTO expenses (id, Username, group_id, Date, record) VALUES (?, ?, ?, ?, ?)", rows
+        )
+        STORE_WRITTEN_BYTES.inc("expenses", amount=sum(len(row[4]) for row in rows))
+
+    def _select(self, where: str = "", params: tuple = ()) -> List[Dict]:
+        rows = self._connection().execute(
+            f"SELECT record FROM expenses {where} ORDER BY seq", params
+        ).fetchall()
+        STORE_READ_BYTES.inc("expenses", amount=sum(len(row[0]) for row in rows))
+        return [json.loads(row[0]) for row in rows]
+
+    def load_records(self) -> List[Dict]:
+        return self._select()
+
+    def query(self, username: str = None, group_id: str = None,
+              start_date: str = None, end_date: str = None) -> List[Dict]:
+        clauses = []
+        params = []
+        if username and group_id:
+            clauses.append("((Username = ? AND group_id IS NULL) OR group_id = ?)")
+            params += [username, group_id]
+        elif username:
+            clauses.append("Username = ? AND group_id IS NULL")
+            params.append(username)
+        elif group_id:
+            clauses.append("group_id = ?")
+            params.append(group_id)
+        if start_date:
+            clauses.append("Date >= ?")
+            params.append(start_date)
+        if end_date:
+            clauses.append("Date < ?")
+            params.append(end_date)
+        where = "WHERE " + " AND ".join(clauses) if clauses else ""
+        return self._select(where, tuple(params))
+
+    def get_records(self, ids: List[str]) -> List[Dict]:
+        records = []
+        for expense_id in dict.fromkeys(ids):
+            records.extend(self._select("WHERE id = ?", (expense_id,)))
+        return records
+
+    def append_records(self, records: List[Dict]):
+        conn = self._connection()
+        with conn:
+            self._insert(conn, records)
+        self._bump_generation()
+
+    def delete_records(self, ids: List[str]) -> int:
+        conn = self._connection()
+        deleted = 0
+        with conn:
+            for expense_id in dict.fromkeys(ids):
+                deleted += conn.execute("DELETE FROM expenses WHERE id = ?", (expense_id,)).rowcount
+        self._bump_generation()
+        return deleted
+
+    def update_record(self, expense_id: str, fields: Dict) -> bool:
+        conn = self._connection()
+        with conn:
+            row = conn.execute("SELECT record FROM expenses WHERE id = ?", (expense_id,)).fetchone()
+            if row is None:
+                return False
+            record = {**json.loads(row[0]), **fields, "id": expense_id}
+            raw = json.dumps(record)
+            conn.execute(
+                "UPDATE expenses SET Username = ?, group_id = ?, Date = ?, record = ? WHERE id = ?",
+                (record.get("Username"), record.get("group_id"), record.get("Date"), raw, expense_id)
+            )
+        STORE_READ_BYTES.inc("expenses", amount=len(row[0]))
+        STORE_WRITTEN_BYTES.inc("expenses", amount=len(raw))
+        self._bump_generation()
+        return True
+
+    def replace_records(self, records: List[Dict]):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM expenses")
+            self._insert(conn, records)
+        self._bump_generation()
+
+    def recover(self):
+        self._connection()
+
+
+class ShardedExpenseStore(ExpenseStore):
+    """Expenses partitioned by owner and month so queries read only what they need
+
+    Personal expenses (``group_id`` null) belong to their user and group
+    expenses to their group. Each owner's expenses are split into monthly
+    segments, each a JsonLogExpenseStore under ``<kind>/<owner>/<YYYY-MM>``.
+    ``manifest.json`` lists every segment with the min/max Date it holds and,
+    per user, the groups they have spent in, so owner and date-range
+    queries open only the segments they touch and "all my groups" needs no
+    scan. The manifest only changes when a segment appears or its date
+    range widens.
+    """
+
+    LAYOUT = 2
+    scoped_versions = True
+
+    def __init__(self, root: str = EXPENSES_SHARD_DIR, import_from: str = EXPENSES_FILE):
+        self.root = root
+        self.import_from = import_from
+        self._lock = threading.RLock()
+        self._segments = {}
+        # Segment of every expense ID seen so far, for deletes and updates
+        self._locations = {}
+        self._manifest = None
+        self._manifest_stat = None
+        self._ready = False
+
+    @property
+    def manifest_file(self) -> str:
+        return os.path.join(self.root, "manifest.json")
+
+    def _owner_base(self, kind: str, key: str) -> str:
+        return os.path.join(self.root, kind, quote(key, safe=""))
+
+    def _ensure_ready(self):
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            if not os.path.exists(self.manifest_file):
+                os.makedirs(self.root, exist_ok=True)
+                records = []
+                if self.import_from and os.path.exists(self.import_from):
+                    # First use: split the existing JSON history into segments
+                    records = JsonLogExpenseStore(self.import_from).load_records()
+                self._write_segments(records)
+            elif self._read_manifest().get("layout", 1) < self.LAYOUT:
+                self._migrate_owner_shards()
+            self._ready = True
+
+    def _migrate_owner_shards(self):
+        """Split the one-file-per-owner layout into monthly segments"""
+        manifest = self._read_manifest()
+        old_shards = [("users", u) for u in manifest["personal"]] + [("groups", g) for g in manifest["groups"]]
+        records = []
+        for kind, key in old_shards:
+            base = self._owner_base(kind, key)
+            records.extend(JsonLogExpenseStore(base + ".json", base + ".log.jsonl").load_records())
+        # Segments live in per-owner directories, so the old files can stay
+        # until the new manifest is committed
+        self._write_segments(records)
+        for kind, key in old_shards:
+            base = self._owner_base(kind, key)
+            for suffix in (".json", ".log.jsonl"):
+                JsonLogExpenseStore._remove_if_exists(base + suffix)
+
+    @staticmethod
+    def _route(record: Dict) -> Tuple[str, str, str]:
+        month = (record.get("Date") or "")[:7]
+        if record.get("group_id") is not None:
+            return ("groups", record["group_id"], month)
+        return ("users", record.get("Username") or "", month)
+
+    def _segment(self, kind: str, key: str, month: str) -> JsonLogExpenseStore:
+        segment = self._segments.get((kind, key, month))
+        if segment is None:
+            with self._lock:
+                segment = self._segments.get((kind, key, month))
+                if segment is None:
+                    os.makedirs(self._owner_base(kind, key), exist_ok=True)
+                    base = os.path.join(self._owner_base(kind, key), month or "undated")
+                    segment = JsonLogExpenseStore(base + ".json", base + ".log.jsonl")
+                    if os.path.exists(segment.next_snapshot_file):
+                        segment.recover()
+                    self._segments[(kind, key, month)] = segment
+        return segment
+
+    @staticmethod
+    def _empty_manifest() -> Dict:
+        return {"layout": ShardedExpenseStore.LAYOUT, "personal": [], "groups": {}, "user_groups": {},
+                "segments": {"users": {}, "groups": {}}}
+
+    def _read_manifest(self) -> Dict:
+        try:
+            st = os.stat(self.manifest_file)
+            stat = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            stat = None
+        if self._manifest is None or stat != self._manifest_stat:
+            manifest = JsonLogExpenseStore._read_snapshot(self.manifest_file) if stat else {}
+            if not isinstance(manifest, dict):
+                manifest = {}
+            for field, default in self._empty_manifest().items():
+                if field != "layout":
+                    manifest.setdefault(field, default)
+            self._manifest, self._manifest_stat = manifest, stat
+        return self._manifest
+
+    def _write_manifest(self, manifest: Dict):
+        JsonLogExpenseStore._write_json_atomic(self.manifest_file, manifest)
+        st = os.stat(self.manifest_file)
+        self._manifest, self._manifest_stat = manifest, (st.st_mtime_ns, st.st_size)
+
+    @staticmethod
+    def _note_in(manifest: Dict, records: List[Dict]) -> bool:
+        changed = False
+        for record in records:
+            kind, key, month = ShardedExpenseStore._route(record)
+            username = record.get("Username")
+            if kind == "users":
+                if username not in manifest["personal"]:
+                    manifest["personal"].append(username)
+                    changed = True
+            else:
+                spenders = manifest["groups"].setdefault(key, [])
+                if username not in spenders:
+                    spenders.append(username)
+                    manifest["user_groups"].setdefault(username, []).append(key)
+                    changed = True
+            date = record.get("Date") or ""
+            bounds = manifest["segments"][kind].setdefault(key, {}).get(month)
+            if bounds is None:
+                manifest["segments"][kind][key][month] = [date, date]
+                changed = True
+            elif date < bounds[0] or date > bounds[1]:
+                bounds[0], bounds[1] = min(bounds[0], date), max(bounds[1], date)
+                changed = True
+        return changed
+
+    def _note_records(self, records: List[Dict]):
+        """Add new segments, date bounds and spenders to the manifest; caller holds the lock"""
+        manifest = self._read_manifest()
+        if self._note_in(manifest, records):
+            self._write_manifest(manifest)
+
+    def _owner_segments(self, kind: str, key: str, start_date: str = None,
+                        end_date: str = None) -> List[Tuple[str, str, str]]:
+        """Segments of one owner whose date range overlaps [start_date, end_date)"""
+        months = self._read_manifest()["segments"][kind].get(key, {})
+        return [
+            (kind, key, month) for month, (low, high) in sorted(months.items())
+            if (not start_date or high >= start_date) and (not end_date or low < end_date)
+        ]
+
+    def _query_segments(self, username: str = None, group_id: str = None, start_date: str = None,
+                        end_date: str = None) -> List[Tuple[str, str, str]]:
+        manifest = self._read_manifest()
+        if username or group_id:
+            owners = []
+            if username:
+                owners.append(("users", username))
+            if group_id:
+                owners.append(("groups", group_id))
+        else:
+            owners = [(kind, key) for kind in ("users", "groups") for key in manifest["segments"][kind]]
+        segments = []
+        for kind, key in owners:
+            segments.extend(self._owner_segments(kind, key, start_date, end_date))
+        return segments
+
+    def _read_segment(self, kind: str, key: str, month: str) -> List[Dict]:
+        records = self._segment(kind, key, month).load_records()
+        for record in records:
+            self._locations[record["id"]] = (kind, key, month)
+        return records
+
+    def data_files(self) -> List[str]:
+        self._ensure_ready()
+        files = [self.manifest_file]
+        for segment in self._query_segments():
+            files.extend(self._segment(*segment).data_files())
+        return files
+
+    def query_version(self, username: str = None, group_id: str = None,
+                      start_date: str = None, end_date: str = None) -> tuple:
+        self._ensure_ready()
+        segments = self._query_segments(username, group_id, start_date, end_date)
+        # Per-segment versions, so writes to other owners leave this one alone;
+        # the manifest stat covers segments created by other processes
+        versions = [self._segment(*segment).version() for segment in segments]
+        return (self._manifest_stat, tuple(versions))
+
+    def query_fingerprint(self, username: str = None, group_id: str = None) -> tuple:
+        self._ensure_ready()
+        segments = self._query_segments(username, group_id)
+        return (self._manifest_stat, tuple(self._segment(*segment).fingerprint() for segment in segments))
+
+    def load_records(self) -> List[Dict]:
+        return self.query()
+
+    def query(self, username: str = None, group_id: str = None,
+              start_date: str = None, end_date: str = None) -> List[Dict]:
+        self._ensure_ready()
+        records = []
+        for segment in self._query_segments(username, group_id, start_date, end_date):
+            segment_records = self._read_segment(*segment)
+            if start_date or end_date:
+                # Boundary months can still hold rows outside the range
+                segment_records = [r for r in segment_records if _matches(r, None, None, start_date, end_date)]
+            records.extend(segment_records)
+        return records
+
+    def get_records(self, ids: List[str]) -> List[Dict]:
+        self._ensure_ready()
+        records = []
+        for segment, segment_ids in self._locate(ids).items():
+            records.extend(self._segment(*segment).get_records(segment_ids))
+        return records
+
+    def user_group_ids(self, username: str) -> List[str]:
+        self._ensure_ready()
+        return sorted(self._read_manifest()["user_groups"].get(username, []))
+
+    def append_records(self, records: List[Dict]):
+        self._ensure_ready()
+        by_segment = {}
+        for record in records:
+            record.setdefault("id", new_expense_id())
+            # Records already written by an earlier, partly failed call are
+            # skipped, so retrying a batch cannot duplicate them
+            if record["id"] not in self._locations:
+                by_segment.setdefault(self._route(record), []).append(record)
+        with self._lock:
+            self._note_records(records)
+        for segment, batch in by_segment.items():
+            self._segment(*segment).append_records(batch)
+            for record in batch:
+                self._locations[record["id"]] = segment
+        self._bump_generation()
+
+    def _locate(self, ids: List[str]) -> Dict[Tuple[str, str, str], List[str]]:
+        if any(expense_id not in self._locations for expense_id in ids):
+            # IDs not seen yet: read every segment once to learn where they live
+            self.load_records()
+        by_segment = {}
+        for expense_id in dict.fromkeys(ids):
+            location = self._locations.get(expense_id)
+            if location is not None:
+                by_segment.setdefault(location, []).append(expense_id)
+        return by_segment
+
+    def delete_records(self, ids: List[str]) -> int:
+        self._ensure_ready()
+        deleted = 0
+        for segment, segment_ids in self._locate(ids).items():
+            deleted += self._segment(*segment).delete_records(segment_ids)
+            for expense_id in segment_ids:
+                self._locations.pop(expense_id, None)
+        self._bump_generation()
+        return deleted
+
+    def update_record(self, expense_id: str, fields: Dict) -> bool:
+        self._ensure_ready()
+        location = self._locate([expense_id])
+        if not location:
+            return False
+        segment_key = next(iter(location))
+        segment = self._segment(*segment_key)
+        current = segment.get_records([expense_id])
+        if not current:
+            return False
+        current = current[0]
+        updated = {**current, **fields, "id": expense_id}
+        if self._route(updated) == segment_key:
+            result = segment.update_record(expense_id, fields)
+        else:
+            # A new owner or month moves the record to that segment
+            segment.delete_records([expense_id])
+            self._locations.pop(expense_id, None)
+            self.append_records([updated])
+            result = True
+        self._bump_generation()
+        return result
+
+    def _write_segments(self, records: List[Dict]):
+        by_segment = {}
+        for record in records:
+            record.setdefault("id", new_expense_id())
+            by_segment.setdefault(self._route(record), []).append(record)
+        for kind in ("users", "groups"):
+            os.makedirs(os.path.join(self.root, kind), exist_ok=True)
+        for segment, batch in by_segment.items():
+            self._segment(*segment).replace_records(batch)
+        manifest = self._empty_manifest()
+        self._note_in(manifest, records)
+        self._write_manifest(manifest)
+
+    def replace_records(self, records: List[Dict]):
+        self._ensure_ready()
+        with self._lock:
+            for kind in ("users", "groups"):
+                shutil.rmtree(os.path.join(self.root, kind), ignore_errors=True)
+            self._segments.clear()
+            self._locations.clear()
+            self._write_segments(records)
+        self._bump_generation()
+
+    def recover(self):
+        self._ensure_ready()
+
+
+BACKENDS = {
+    "json": JsonLogExpenseStore,
+    "sqlite": SqliteExpenseStore,
+    "sharded": ShardedExpenseStore,
+}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ExpenseStore:
+    """Return the process-wide expense store, creating it on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = os.environ.get(STORE_BACKEND_ENV, "json").lower()
+                if backend not in BACKENDS:
+                    raise ValueError(f"Unknown expense store backend: {backend}")
+                store = BACKENDS[backend]()
+                # Creates missing files and finishes interrupted work, on
+                # first access rather than at import
+                store.recover()
+                _store = store
+    return _store
+
+
+def set_store(store: ExpenseStore):
+    """Install ``store`` as the process-wide expense store"""
+    global _store
+    with _store_lock:
+        _store = store
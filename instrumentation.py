@@ -0,0 +1,343 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import sysconfig
+import threading
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import Callable, Dict, List, Optional
+
+# Per-rerun timing of the data layer and the page. Functions decorated with
+# @instrumented and blocks wrapped in span() record their wall time, the
+# bytes the script thread read and wrote meanwhile, and the rows they
+# returned, into the trace of the current Streamlit rerun. Tracing is off
+# unless a rerun starts one (the sidebar Diagnostics panel, or
+# TRACKER_TRACE=1 for every rerun); while it is off a decorated call costs
+# one context variable lookup. Each finished trace is appended to a
+# rotating JSON Lines file.
+#
+# TRACKER_MEMORY_PROFILE=1 also traces every rerun with tracemalloc: each
+# span records the peak and retained bytes allocated under it, and the
+# rerun reports its top allocation sites and what each session has retained
+# so far. TRACKER_MEMORY_PROFILE=sites adds the top sites of every top-level
+# span; each snapshot costs time in proportion to the live allocations, so
+# either mode is for profiling, not production. tracemalloc counts every
+# thread, so the numbers are exact only with one session running.
+TRACE_ENV = "TRACKER_TRACE"
+MEMORY_ENV = "TRACKER_MEMORY_PROFILE"
+MEMORY_TOP_SITES = int(os.environ.get("TRACKER_MEMORY_TOP_SITES", 10))
+TRACE_FILE = os.environ.get("TRACKER_TRACE_FILE", "diagnostics.trace.jsonl")
+TRACE_MAX_BYTES = int(os.environ.get("TRACKER_TRACE_MAX_BYTES", 5 * 1024 * 1024))
+TRACE_BACKUPS = 3
+# Per-thread I/O counters (Linux); elsewhere bytes are not recorded
+THREAD_IO_FILE = "/proc/thread-self/io"
+
+_current: contextvars.ContextVar = contextvars.ContextVar("rerun_trace", default=None)
+_trace_logger = None
+# Session ID -> net bytes its traced reruns left allocated
+_session_retained: Dict[str, int] = {}
+_session_lock = threading.Lock()
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+STDLIB_DIR = sysconfig.get_paths()["stdlib"]
+# Leave the profiler's own allocations out of the reported sites
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, os.path.abspath(__file__)),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+]
+
+
+def _rows(value) -> int:
+    """Rows in a returned frame or list (summed over a tuple of them)"""
+    if isinstance(value, tuple):
+        return sum(_rows(item) for item in value)
+    if isinstance(value, list):
+        return len(value)
+    shape = getattr(value, "shape", None)
+    return shape[0] if shape else 0
+
+
+def _site(frame) -> str:
+    """file:line of an allocation, relative to site-packages, the repo or the standard library"""
+    filename = frame.filename
+    if "site-packages" in filename:
+        filename = filename.split("site-packages" + os.sep, 1)[-1]
+    elif filename.startswith(REPO_DIR):
+        filename = os.path.relpath(filename, REPO_DIR)
+    elif filename.startswith(STDLIB_DIR):
+        filename = os.path.relpath(filename, STDLIB_DIR)
+    return f"{filename}:{frame.lineno}"
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+
+def top_sites(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, limit: int = MEMORY_TOP_SITES) -> List[Dict]:
+    """Lines that allocated the most between two snapshots, still alive at the second"""
+    sites = []
+    for stat in after.compare_to(before, "lineno")[:limit]:
+        if stat.size_diff <= 0:
+            break
+        sites.append({"site": _site(stat.traceback[0]), "bytes": stat.size_diff, "blocks": stat.count_diff})
+    return sites
+
+
+class _Span:
+    __slots__ = ("name", "started", "io", "probe_bytes", "child_seconds", "rows",
+                 "mem_start", "mem_peak", "snapshot")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.child_seconds = 0.0
+        self.rows = 0
+        self.snapshot = None
+
+
+class RerunTrace:
+    """Operations timed during one rerun, aggregated by name
+
+    ``memory`` is None, "calls" (peak and retained bytes per span) or
+    "sites" (also the top allocation sites of each top-level span).
+    """
+
+    def __init__(self, memory: str = None):
+        self.operations: Dict[str, Dict] = {}
+        self._stack = []
+        # Bytes read from THREAD_IO_FILE itself, left out of the counts
+        self._probe_bytes = 0
+        self.memory = memory
+        # Stands for the whole rerun as the parent of top-level spans
+        self._root = _Span("rerun")
+        # The open top-level section(), closed by the next one
+        self._section = None
+        if memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._enter_memory(self._root, None, True)
+        self.started = time.perf_counter()
+        self._io_start = self._thread_io()
+
+    @staticmethod
+    def _enter_memory(frame: _Span, parent: Optional[_Span], snapshot: bool):
+        if parent is not None:
+            # Resetting the peak for ``frame`` must not lose the parent's
+            parent.mem_peak = max(parent.mem_peak, tracemalloc.get_traced_memory()[1])
+        if snapshot:
+            frame.snapshot = _snapshot()
+        # Reset after the snapshot so that its allocations are not counted
+        tracemalloc.reset_peak()
+        frame.mem_start = frame.mem_peak = tracemalloc.get_traced_memory()[0]
+
+    @staticmethod
+    def _exit_memory(frame: _Span, parent: Optional[_Span]) -> tuple:
+        """(peak, retained, top sites) of what ``frame`` allocated"""
+        current, peak = tracemalloc.get_traced_memory()
+        frame.mem_peak = max(frame.mem_peak, peak)
+        if parent is not None:
+            parent.mem_peak = max(parent.mem_peak, frame.mem_peak)
+        sites = None
+        if frame.snapshot is not None:
+            sites = top_sites(frame.snapshot, _snapshot())
+            frame.snapshot = None
+            tracemalloc.reset_peak()
+        return frame.mem_peak - frame.mem_start, current - frame.mem_start, sites
+
+    def _thread_io(self) -> Optional[tuple]:
+        try:
+            with open(THREAD_IO_FILE, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        self._probe_bytes += len(data)
+        counters = dict(line.split(b": ") for line in data.splitlines())
+        return int(counters[b"rchar"]), int(counters[b"wchar"])
+
+    def _io_since(self, start: Optional[tuple], probe_bytes: int) -> tuple:
+        """Bytes read and written since ``start``, which was probed when
+        ``_probe_bytes`` was ``probe_bytes``"""
+        # A probe's counters do not include its own read, so the probes to
+        # leave out are ``start`` and any nested ones, but not this one
+        probes = self._probe_bytes - probe_bytes
+        end = self._thread_io()
+        if start is None or end is None:
+            return 0, 0
+        return max(end[0] - start[0] - probes, 0), max(end[1] - start[1], 0)
+
+    @contextmanager
+    def span(self, name: str):
+        frame = _Span(name)
+        parent = self._stack[-1] if self._stack else self._root
+        if self.memory:
+            self._enter_memory(frame, parent, self.memory == "sites" and not self._stack)
+        frame.probe_bytes = self._probe_bytes
+        frame.io = self._thread_io()
+        frame.started = time.perf_counter()
+        self._stack.append(frame)
+        try:
+            yield frame
+        finally:
+            self._stack.pop()
+            seconds = time.perf_counter() - frame.started
+            read, written = self._io_since(frame.io, frame.probe_bytes)
+            parent.child_seconds += seconds
+            stats = self.operations.setdefault(name, {
+                "calls": 0, "seconds": 0.0, "self_seconds": 0.0,
+                "bytes_read": 0, "bytes_written": 0, "rows": 0
+            })
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["self_seconds"] += seconds - frame.child_seconds
+            stats["bytes_read"] += read
+            stats["bytes_written"] += written
+            stats["rows"] += frame.rows
+            if self.memory:
+                peak, retained, sites = self._exit_memory(frame, parent)
+                if peak >= stats.get("peak_alloc_bytes", -1):
+                    stats["peak_alloc_bytes"] = peak
+                    if sites is not None:
+                        # Sites of the call with the highest peak
+                        stats["top_sites"] = sites
+                stats["retained_bytes"] = stats.get("retained_bytes", 0) + retained
+
+    def section(self, name: str):
+        """End the current top-level section, if any, and start timing ``name``"""
+        if self._section is not None:
+            self._section.close()
+        self._section = ExitStack()
+        self._section.enter_context(self.span(name))
+
+    def summary(self) -> Dict:
+        """Totals of the rerun so far and its operations, slowest first"""
+        if self._section is not None:
+            self._section.close()
+            self._section = None
+        read, written = self._io_since(self._io_start, 0)
+        operations = []
+        for name, stats in sorted(self.operations.items(), key=lambda item: -item[1]["seconds"]):
+            operations.append(dict(stats, name=name, seconds=round(stats["seconds"], 6),
+                                   self_seconds=round(stats["self_seconds"], 6)))
+        summary = {
+            "seconds": round(time.perf_counter() - self.started, 6),
+            "bytes_read": read,
+            "bytes_written": written,
+            "operations": operations
+        }
+        if self.memory:
+            peak, retained, sites = self._exit_memory(self._root, None)
+            summary["memory"] = {"peak_alloc_bytes": peak, "retained_bytes": retained, "top_sites": sites}
+        return summary
+
+
+def current_trace() -> Optional[RerunTrace]:
+    return _current.get()
+
+
+def tracing_forced() -> bool:
+    """True when TRACKER_TRACE or TRACKER_MEMORY_PROFILE asks for every rerun to be traced"""
+    return os.environ.get(TRACE_ENV, "").lower() in ("1", "true", "yes") or memory_profiling() is not None
+
+
+def memory_profiling() -> Optional[str]:
+    """The TRACKER_MEMORY_PROFILE mode: None, "calls" or "sites" """
+    value = os.environ.get(MEMORY_ENV, "").lower()
+    if value == "sites":
+        return "sites"
+    return "calls" if value in ("1", "true", "yes", "calls") else None
+
+
+def instrumented(fn: Callable) -> Callable:
+    """Record each call of ``fn`` in the active rerun trace, if there is one"""
+    name = f"{fn.__module__}.{fn.__qualname__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        trace = _current.get()
+        if trace is None:
+            return fn(*args, **kwargs)
+        with trace.span(name) as frame:
+            result = fn(*args, **kwargs)
+            frame.rows = _rows(result)
+            return result
+    return wrapper
+
+
+@contextmanager
+def span(name: str):
+    """Time a block (figure building, rendering) in the active rerun trace"""
+    trace = _current.get()
+    if trace is None:
+        yield None
+        return
+    with trace.span(name) as frame:
+        yield frame
+
+
+def section(name: str):
+    """Mark the start of a top-level part of the script (login, sidebar, a view)
+
+    The section lasts until the next section() or the end of the trace, so
+    long blocks of the Streamlit script can be timed without re-indenting
+    them under span().
+    """
+    trace = _current.get()
+    if trace is not None:
+        trace.section(name)
+
+
+def begin_rerun_trace(enabled: bool = False) -> Optional[RerunTrace]:
+    """Start tracing this rerun if ``enabled`` or TRACKER_TRACE is set; otherwise stop tracing
+
+    Like begin_unit_of_work, meant for the top of the Streamlit script.
+    """
+    trace = RerunTrace(memory_profiling()) if enabled or tracing_forced() else None
+    _current.set(trace)
+    return trace
+
+
+def _logger() -> logging.Logger:
+    global _trace_logger
+    if _trace_logger is None:
+        logger = logging.getLogger("tracker.trace")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        if not logger.handlers:
+            handler = RotatingFileHandler(TRACE_FILE, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUPS,
+                                          delay=True)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+        _trace_logger = logger
+    return _trace_logger
+
+
+def end_rerun_trace(extra: Dict = None, session_id: str = None) -> Dict:
+    """Close the active trace, append it (with ``extra``) to TRACE_FILE and return it
+
+    Under memory profiling, the rerun's retained bytes are added to
+    ``session_id``'s running total, reported as session_retained_bytes.
+    """
+    trace = _current.get()
+    _current.set(None)
+    if trace is None:
+        return {}
+    summary = trace.summary()
+    if "memory" in summary and session_id is not None:
+        with _session_lock:
+            retained = _session_retained.get(session_id, 0) + summary["memory"]["retained_bytes"]
+            _session_retained[session_id] = retained
+        summary["memory"]["session_retained_bytes"] = retained
+    summary["at"] = datetime.now().isoformat()
+    summary.update(extra or {})
+    _logger().info(json.dumps(summary, default=str))
+    return summary
+
+
+def session_memory() -> Dict[str, int]:
+    """Net bytes retained by each session's traced reruns (memory profiling only)"""
+    with _session_lock:
+        return dict(_session_retained)
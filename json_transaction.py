@@ -0,0 +1,226 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from metrics import STORE_READ_BYTES, STORE_WRITTEN_BYTES
+from unit_of_work import invalidate, trace_read
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of this process are serialised
+    fcntl = None
+
+# Atomic commits across several JSON files (users.json and groups.json).
+#
+# A transaction reads files without any lock and remembers each file's
+# version. On commit it takes a short commit lock, checks the versions are
+# unchanged (else ConflictError, and run_transaction retries), writes every
+# new file to a temp file, records the temp -> target pairs in a journal,
+# renames them into place and removes the journal. A crash after the
+# journal is written is rolled forward by the next commit or by recover();
+# a crash before it leaves only stray temp files. Readers never wait: each
+# file is replaced atomically, so they see a whole old or a whole new file.
+JOURNAL_FILE = "json_transaction.journal"
+LOCK_FILE = "json_transaction.lock"
+MAX_RETRIES = 5
+
+Version = Optional[Tuple[int, int, int]]
+
+_commit_lock = threading.Lock()
+
+
+class ConflictError(Exception):
+    """Another writer committed one of the files since the transaction read it"""
+
+
+def file_version(path: str) -> Version:
+    """Identity of the file's current contents; None if it does not exist
+
+    Every commit replaces the file, so the inode changes even when the
+    size and modification time happen to match.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class ObjectStream:
+    """(key, value) pairs written out one at a time as a JSON object"""
+
+    def __init__(self, items: Iterable[Tuple[str, object]]):
+        self.items = items
+
+    def dump(self, f):
+        f.write("{")
+        for i, (key, value) in enumerate(self.items):
+            f.write(", " if i else "")
+            f.write(json.dumps(key))
+            f.write(": ")
+            json.dump(value, f)
+        f.write("}")
+
+
+def _write_temp(path: str, data) -> str:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        if isinstance(data, ObjectStream):
+            data.dump(f)
+        else:
+            json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+        STORE_WRITTEN_BYTES.inc(os.path.basename(path), amount=os.fstat(f.fileno()).st_size)
+    return tmp_path
+
+
+def _fsync_dir(path: str):
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _roll_forward():
+    """Finish a commit whose journal was written; caller holds the commit lock"""
+    try:
+        with open(JOURNAL_FILE, "r") as f:
+            journal = json.load(f)
+    except FileNotFoundError:
+        return
+    except json.JSONDecodeError:
+        # Torn journal: the commit never reached its renames
+        journal = {"files": {}}
+    for target, tmp_path in journal["files"].items():
+        if os.path.exists(tmp_path):
+            os.replace(tmp_path, target)
+    if journal["files"]:
+        _fsync_dir(JOURNAL_FILE)
+    os.remove(JOURNAL_FILE)
+
+
+@contextmanager
+def _locked():
+    with _commit_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(LOCK_FILE, "a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def recover():
+    """Roll forward an interrupted commit, if there is one"""
+    if os.path.exists(JOURNAL_FILE):
+        with _locked():
+            _roll_forward()
+
+
+class Transaction:
+    """Reads and pending writes of one optimistic multi-file transaction"""
+
+    def __init__(self):
+        self.versions: Dict[str, Version] = {}
+        self.writes: Dict[str, object] = {}
+        self.committed_versions: Dict[str, Version] = {}
+
+    def read(self, path: str, default=None):
+        """Current contents of ``path`` (``default`` if missing), remembering its version"""
+        if path in self.writes:
+            return self.writes[path]
+        while True:
+            version = file_version(path)
+            if version is None:
+                self.versions[path] = None
+                return default() if callable(default) else default
+            trace_read(path)
+            with open(path, "r") as f:
+                STORE_READ_BYTES.inc(os.path.basename(path), amount=os.fstat(f.fileno()).st_size)
+                data = json.load(f)
+            # Re-read if a commit replaced the file while we were reading it
+            if file_version(path) == version:
+                self.versions[path] = version
+                return data
+
+    def write(self, path: str, data):
+        """Stage new contents for ``path``; nothing touches disk before commit
+
+        Only files read through this transaction are version checked, so
+        writing a file without reading it first replaces it unconditionally.
+        """
+        self.writes[path] = data
+
+    def write_records(self, path: str, items: Iterable[Tuple[str, object]]):
+        """Stage a JSON object produced entry by entry at commit time"""
+        self.writes[path] = ObjectStream(items)
+
+    def commit(self):
+        """Check versions and replace every written file, all or nothing"""
+        if not self.writes:
+            return
+        try:
+            with _locked():
+                _roll_forward()
+                for path, version in self.versions.items():
+                    if file_version(path) != version:
+                        raise ConflictError(f"{path} changed since it was read")
+                tmp_paths = {}
+                try:
+                    for path, data in self.writes.items():
+                        tmp_paths[path] = _write_temp(path, data)
+                    if len(tmp_paths) > 1:
+                        journal_tmp = _write_temp(JOURNAL_FILE, {"files": tmp_paths})
+                        os.replace(journal_tmp, JOURNAL_FILE)
+                        _fsync_dir(JOURNAL_FILE)
+                except Exception:
+                    # Nothing was renamed yet, so the old files stay in place
+                    for tmp_path in tmp_paths.values():
+                        if os.path.exists(tmp_path):
+                            os.remove(tmp_path)
+                    raise
+                # From here on the journal lets a later commit finish the job
+                for path, tmp_path in tmp_paths.items():
+                    os.replace(tmp_path, path)
+                _fsync_dir(JOURNAL_FILE)
+                if len(tmp_paths) > 1:
+                    os.remove(JOURNAL_FILE)
+                self.committed_versions = {path: file_version(path) for path in tmp_paths}
+        finally:
+            for path in self.writes:
+                invalidate(path)
+
+
+def run_transaction(work: Callable[[Transaction], object], retries: int = MAX_RETRIES):
+    """Run ``work(tx)`` and commit it, retrying from scratch on conflicts
+
+    ``work`` reads through ``tx.read``, stages changes with ``tx.write``
+    and returns the result handed back to the caller. It may run more than
+    once, so it should have no side effects besides the staged writes.
+    Returns ``(result, tx)``.
+    """
+    for attempt in range(retries + 1):
+        tx = Transaction()
+        result = work(tx)
+        try:
+            tx.commit()
+            return result, tx
+        except ConflictError:
+            if attempt == retries:
+                raise
+
+
+def write_json(path: str, data):
+    """Atomically replace one JSON file"""
+    tx = Transaction()
+    tx.write(path, data)
+    tx.commit()
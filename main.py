@@ -1,12 +1,19 @@
 import streamlit as st
 import pandas as pd
 from expense_logic import (
-    add_expense, get_expenses, calculate_summary,
-    get_group_member_summary, calculate_group_balances, get_expense_stats
+    add_expense, get_expenses, calculate_summary, personal_metrics,
+    get_group_member_summary, calculate_group_balances, get_expense_stats,
+    month_bounds, expenses_between, get_settlement_plan, record_settlements, get_settlement_history,
+    get_group_participants, get_friend_balances, friend_totals, split_from_form, get_cache_stats
 )
+from unit_of_work import begin_unit_of_work, end_unit_of_work
+from instrumentation import begin_rerun_trace, end_rerun_trace, section, span
+from metrics import record_rerun, start_metrics_server, touch_session
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from auth import (
     login_page, logout, create_group, invite_to_group,
-    accept_group_invite, get_user_groups, get_user_pending_invites
+    accept_group_invite, get_user_groups, get_user_group, get_user_pending_invites,
+    get_user_directory
 )
 import datetime
 import plotly.express as px
@@ -348,7 +355,18 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# Read users, groups and expenses at most once during this rerun
+begin_unit_of_work()
+# Time this rerun when the sidebar Diagnostics panel is open
+begin_rerun_trace(st.session_state.get("show_diagnostics", False))
+# Serve /metrics when TRACKER_METRICS_PORT is set (once per process)
+start_metrics_server()
+script_run_ctx = get_script_run_ctx()
+if script_run_ctx is not None:
+    touch_session(script_run_ctx.session_id)
+
 # Handle authentication
+section("main.login")
 is_logged_in, username = login_page()
 
 if is_logged_in:
@@ -359,16 +377,17 @@ if is_logged_in:
         st.session_state.current_group = None
 
     # Sidebar for navigation
+    section("main.sidebar")
     with st.sidebar:
         st.title("📱 Navigation")
         
         # View selection
         view = st.radio(
             "Select View",
-            ["Personal Expenses", "Group Expenses"],
+            ["Personal Expenses", "Group Expenses", "Friends"],
             key="view_selection"
         )
-        st.session_state.current_view = "personal" if view == "Personal Expenses" else "group"
+        st.session_state.current_view = {"Personal Expenses": "personal", "Group Expenses": "group", "Friends": "friends"}[view]
         
         st.divider()
         
@@ -451,6 +470,7 @@ if is_logged_in:
 
     # Main content based on current view
     if st.session_state.current_view == "personal":
+        section("main.personal_view")
         # Personal expense tracking interface
         with st.form("expense_form", clear_on_submit=True):
             date_input = st.date_input(
@@ -485,27 +505,18 @@ if is_logged_in:
         # Analytics section
         expenses = get_expenses(username)
         if not expenses.empty:
-            # Convert Date column to datetime
-            expenses['Date'] = pd.to_datetime(expenses['Date'])
-            
-            # Calculate metrics
-            total_spent = expenses['Amount'].sum()
-            current_month = datetime.date.today().month
-            current_year = datetime.date.today().year
-            last_month = current_month - 1 if current_month > 1 else 12
-            last_month_year = current_year if current_month > 1 else current_year - 1
-            
-            this_month_expenses = expenses[(expenses['Date'].dt.month == current_month) & 
-                                        (expenses['Date'].dt.year == current_year)]
-            last_month_expenses = expenses[(expenses['Date'].dt.month == last_month) & 
-                                        (expenses['Date'].dt.year == last_month_year)]
-            top_category = expenses['Category'].mode()[0]
-            top_category_amount = expenses[expenses['Category'] == top_category]['Amount'].sum()
+            with span("main.personal_metrics"):
+                metrics = personal_metrics(expenses)
+                total_spent = metrics["total_spent"]
+                this_month_expenses = metrics["this_month"]
+                last_month_expenses = metrics["last_month"]
+                top_category = metrics["top_category"]
+                top_category_amount = metrics["top_category_amount"]
             
             # Create four columns for metrics
             col1, col2, col3, col4 = st.columns(4)
 
-            with col1:
+            with col1, span("main.render_metric_cards"):
                 st.markdown(f"""
                     <div class="metric-box">
                         <div class="metric-title">💰 TOTAL SPENT</div>
@@ -536,11 +547,11 @@ if is_logged_in:
                             </div>
                         """, unsafe_allow_html=True)
 
-            with col2:
+            with col2, span("main.render_metric_cards"):
                 st.markdown(f"""
                     <div class="metric-box">
                         <div class="metric-title">📅 THIS MONTH</div>
-                        <div class="metric-value">₹{this_month_expenses['Amount'].sum():.2f}</div>
+                        <div class="metric-value">₹{metrics['this_month_total']:.2f}</div>
                         <div class="metric-subtitle">Expenses</div>
                     </div>
                 """, unsafe_allow_html=True)
@@ -567,11 +578,11 @@ if is_logged_in:
                             </div>
                         """, unsafe_allow_html=True)
 
-            with col3:
+            with col3, span("main.render_metric_cards"):
                 st.markdown(f"""
                     <div class="metric-box">
                         <div class="metric-title">📅 LAST MONTH</div>
-                        <div class="metric-value">₹{last_month_expenses['Amount'].sum():.2f}</div>
+                        <div class="metric-value">₹{metrics['last_month_total']:.2f}</div>
                         <div class="metric-subtitle">Expenses</div>
                     </div>
                 """, unsafe_allow_html=True)
@@ -598,7 +609,7 @@ if is_logged_in:
                             </div>
                         """, unsafe_allow_html=True)
 
-            with col4:
+            with col4, span("main.render_metric_cards"):
                 st.markdown(f"""
                     <div class="metric-box">
                         <div class="metric-title">🏆 TOP CATEGORY</div>
@@ -608,7 +619,7 @@ if is_logged_in:
                 """, unsafe_allow_html=True)
                 with st.expander("📊 View Details", expanded=False):
                     st.write("### Top Category Expenses")
-                    top_category_expenses = expenses[expenses['Category'] == top_category]
+                    top_category_expenses = metrics["top_category_expenses"]
                     for _, expense in top_category_expenses.iterrows():
                         st.markdown(f"""
                             <div class="expense-details">
@@ -632,10 +643,12 @@ if is_logged_in:
 
             # Single distribution graph for all expenses
             st.markdown('<div class="distribution-graph">', unsafe_allow_html=True)
-            fig = px.pie(expenses, values='Amount', names='Category', 
-                        title='Overall Expense Distribution',
-                        color_discrete_sequence=['#800020', '#355E3B', '#1C39BB', '#CD7F32', '#808080', '#FF0000', '#006B54', '#8E4585', '#9400D3', '#9932CC'])  # Added more violet colors
-            st.plotly_chart(fig, use_container_width=True)
+            with span("main.build_category_pie"):
+                fig = px.pie(expenses, values='Amount', names='Category', 
+                            title='Overall Expense Distribution',
+                            color_discrete_sequence=['#800020', '#355E3B', '#1C39BB', '#CD7F32', '#808080', '#FF0000', '#006B54', '#8E4585', '#9400D3', '#9932CC'])  # Added more violet colors
+            with span("main.render_category_pie"):
+                st.plotly_chart(fig, use_container_width=True)
             st.markdown('</div>', unsafe_allow_html=True)
 
             # Expense Table in expander
@@ -650,13 +663,27 @@ if is_logged_in:
                 )
                 st.markdown('</div>', unsafe_allow_html=True)
 
+    elif st.session_state.current_view == "friends":
+        section("main.friends_view")
+        # Net balances with everyone, across all groups and recorded settlements
+        st.markdown("### 🤝 Friends")
+        friends = get_friend_balances(username)
+        if friends.attrs.get("stale"):
+            st.caption("⏳ Updating with the latest expenses, refresh in a moment.")
+        if friends.empty:
+            st.info("No balances with anyone yet.")
+        else:
+            owed_col, owe_col = st.columns(2)
+            owed, owe = friend_totals(friends)
+            owed_col.metric("You are owed", f"₹{owed:,.2f}")
+            owe_col.metric("You owe", f"₹{owe:,.2f}")
+            st.caption("Positive: they owe you. Negative: you owe them.")
+            st.dataframe(friends[["Friend", "Net Balance"]], hide_index=True, use_container_width=True)
+
     else:  # Group expense view
+        section("main.group_view")
         if st.session_state.current_group:
-            group_info = None
-            for group in get_user_groups(username):
-                if group["id"] == st.session_state.current_group:
-                    group_info = group
-                    break
+            group_info = get_user_group(username, st.session_state.current_group)
             
             if group_info:
                 # Group header
@@ -664,14 +691,23 @@ if is_logged_in:
                 st.markdown(f"_{group_info['description']}_")
                 
                 # Tabs for different group features (Add Expense first, then Overview)
-                tab2, tab1 = st.tabs([
+                tab2, tab1, tab3 = st.tabs([
                     "💰 Add Expense",
-                    "📊 Overview"
+                    "📊 Overview",
+                    "🤝 Settle Up"
                 ])
                 
                 with tab2:
                     # Add group expense form
                     st.markdown("### 📝 Add Group Expense")
+                    split_options = {
+                        "Equally among everyone": None,
+                        "Equally among selected people": "equal",
+                        "By weights": "weights",
+                        "By percentage": "percent",
+                        "Exact amounts": "exact"
+                    }
+                    people = sorted(set(group_info["members"]) | set(get_group_participants(st.session_state.current_group)))
                     with st.form("group_expense_form", clear_on_submit=True):
                         spender = st.text_input("Name of Spender", help="Enter the name of the person who spent")
                         date = st.date_input("Date", datetime.date.today(), max_value=datetime.date.today(), help="Select the date of your expense (up to today)")
@@ -679,10 +715,13 @@ if is_logged_in:
                         amount = st.number_input("Amount (₹)", min_value=0.0, step=0.5, help="Enter the amount spent")
                         location = st.text_input("Location", placeholder="Enter the location", help="Where did you spend this amount?")
                         description = st.text_area("Description", placeholder="Add any additional notes...", help="Optional: Add more details about the expense")
+                        split_label = st.selectbox("Split", list(split_options), help="Everyone means everyone who has paid for something in this group")
+                        split_with = st.multiselect("Split between", people, help="For an equal split among selected people")
+                        shares_text = st.text_area("Shares", placeholder="asha: 2, ravi: 1", help="For weights, percentages or exact amounts (₹): one 'name: value' per person")
                         submitted = st.form_submit_button("💰 Add Group Expense")
                         if submitted:
                             if amount > 0 and location and spender:
-                                add_expense({
+                                expense = {
                                     "Date": date.strftime("%Y-%m-%d"),
                                     "Category": category,
                                     "Amount": amount,
@@ -690,9 +729,17 @@ if is_logged_in:
                                     "Description": description,
                                     "Username": spender,
                                     "group_id": st.session_state.current_group
-                                })
-                                st.success("✅ Group expense added successfully!")
-                                st.balloons()
+                                }
+                                try:
+                                    split = split_from_form(split_options[split_label], split_with, shares_text, amount)
+                                except ValueError as e:
+                                    st.error(f"❌ {str(e)}")
+                                else:
+                                    if split:
+                                        expense["split"] = split
+                                    add_expense(expense)
+                                    st.success("✅ Group expense added successfully!")
+                                    st.balloons()
                             else:
                                 st.error("❌ Please fill all required fields.")
                 
@@ -705,7 +752,7 @@ if is_logged_in:
                     titles = ["Group Total", "This Month", "Last Month", "Top Category"]
                     values = [stats['total_spent'], stats['this_month_total'], stats['last_month_total'], stats['top_category']]
                     for i, col in enumerate(metric_cols):
-                        with col:
+                        with col, span("main.render_group_metric_cards"):
                             col.markdown(f"""
                                 <div style='border: 5px solid #2a3439; border-radius: 16px; padding: 1.2rem; text-align: center; margin-bottom: 1rem;'>
                                     <div style='font-size: 2rem;'>{icons[i]}</div>
@@ -720,16 +767,14 @@ if is_logged_in:
                                     st.dataframe(df, hide_index=True)
                                 elif i == 1:
                                     st.write("This month's group expenses:")
-                                    df = get_expenses(group_id=st.session_state.current_group)
-                                    this_month = datetime.date.today().month
-                                    this_year = datetime.date.today().year
-                                    st.dataframe(df[(df['Date'].dt.month == this_month) & (df['Date'].dt.year == this_year)], hide_index=True)
+                                    last_month_start, this_month_start, next_month_start = month_bounds()
+                                    df = expenses_between(get_expenses(group_id=st.session_state.current_group), this_month_start, next_month_start)
+                                    st.dataframe(df, hide_index=True)
                                 elif i == 2:
                                     st.write("Last month's group expenses:")
-                                    df = get_expenses(group_id=st.session_state.current_group)
-                                    last_month = datetime.date.today().month - 1 if datetime.date.today().month > 1 else 12
-                                    last_month_year = datetime.date.today().year if datetime.date.today().month > 1 else datetime.date.today().year - 1
-                                    st.dataframe(df[(df['Date'].dt.month == last_month) & (df['Date'].dt.year == last_month_year)], hide_index=True)
+                                    last_month_start, this_month_start, next_month_start = month_bounds()
+                                    df = expenses_between(get_expenses(group_id=st.session_state.current_group), last_month_start, this_month_start)
+                                    st.dataframe(df, hide_index=True)
                                 elif i == 3:
                                     st.write("Top category group expenses:")
                                     df = get_expenses(group_id=st.session_state.current_group)
@@ -739,21 +784,47 @@ if is_logged_in:
                     if not member_summary.empty:
                         # Reset index and rename the index column to 'Username'
                         member_summary = member_summary.reset_index().rename(columns={'index': 'Username'})
-                        fig_members = px.bar(
-                            member_summary,
-                            x='Username',
-                            y='Total Spent',
-                            title="Member Contributions",
-                            template="plotly_white",
-                            color_discrete_sequence=["#48BF91"]  # Ocean green
-                        )
-                        fig_members.update_layout(
-                            xaxis_title="Members",
-                            yaxis_title="Amount Spent (₹)"
-                        )
-                        st.plotly_chart(fig_members, use_container_width=True)
+                        with span("main.build_member_chart"):
+                            fig_members = px.bar(
+                                member_summary,
+                                x='Username',
+                                y='Total Spent',
+                                title="Member Contributions",
+                                template="plotly_white",
+                                color_discrete_sequence=["#48BF91"]  # Ocean green
+                            )
+                            fig_members.update_layout(
+                                xaxis_title="Members",
+                                yaxis_title="Amount Spent (₹)"
+                            )
+                        with span("main.render_member_chart"):
+                            st.plotly_chart(fig_members, use_container_width=True)
                     else:
                         st.info("No expenses recorded in this group yet.")
+                
+                with tab3:
+                    # Who pays whom to even out the group
+                    st.markdown("### 🤝 Settle Up")
+                    balances = calculate_group_balances(st.session_state.current_group)
+                    if balances.empty:
+                        st.info("No expenses recorded in this group yet.")
+                    else:
+                        st.dataframe(balances.drop(columns=["net_paise"]), hide_index=True, use_container_width=True)
+                        plan = get_settlement_plan(st.session_state.current_group)
+                        if plan.empty:
+                            st.success("✅ Everyone is settled up!")
+                        else:
+                            st.markdown(f"**{len(plan)} payment(s) settle every balance:**")
+                            st.dataframe(plan, hide_index=True, use_container_width=True)
+                            if st.button("✅ Mark these payments as done"):
+                                if record_settlements(st.session_state.current_group, plan):
+                                    st.success("✅ Settlements recorded!")
+                                    st.rerun()
+                    
+                    history = get_settlement_history(st.session_state.current_group)
+                    if not history.empty:
+                        with st.expander("Settlement history"):
+                            st.dataframe(history[["Date", "From", "To", "Amount"]], hide_index=True)
             
             else:
                 st.error("Group not found!")
@@ -763,3 +834,56 @@ if is_logged_in:
     # Add some space at the bottom
     st.markdown("<br><br><br><br>", unsafe_allow_html=True)
 
+# Physical reads this rerun performed, for diagnostics
+st.session_state.last_render_trace = end_unit_of_work()
+record_rerun(st.session_state.current_view if is_logged_in else "login", st.session_state.last_render_trace.get("seconds", 0.0))
+
+# Timings of this rerun (when traced), also appended to the trace file
+rerun_trace = end_rerun_trace({
+    "view": st.session_state.get("current_view"),
+    "reads": st.session_state.last_render_trace,
+    "frame_cache": get_cache_stats(),
+    "user_directory": get_user_directory().stats()
+}, script_run_ctx.session_id if script_run_ctx is not None else None)
+with st.sidebar:
+    if st.toggle("🩺 Diagnostics", key="show_diagnostics", help="Time the data loading and rendering of each run"):
+        if rerun_trace:
+            st.caption(
+                f"This run: {rerun_trace['seconds'] * 1000:.0f} ms, "
+                f"{rerun_trace['reads'].get('physical_reads', 0)} data reads, "
+                f"{rerun_trace['bytes_read'] / 1024:.0f} KB read, "
+                f"{rerun_trace['bytes_written'] / 1024:.0f} KB written"
+            )
+            memory = rerun_trace.get("memory")
+            ops_rows = []
+            for op in rerun_trace["operations"]:
+                row = {
+                    "Operation": op["name"],
+                    "Calls": op["calls"],
+                    "Total ms": round(op["seconds"] * 1000, 1),
+                    "Self ms": round(op["self_seconds"] * 1000, 1),
+                    "KB read": round(op["bytes_read"] / 1024, 1),
+                    "KB written": round(op["bytes_written"] / 1024, 1),
+                    "Rows": op["rows"]
+                }
+                if memory:
+                    row["Peak KB"] = round(op["peak_alloc_bytes"] / 1024, 1)
+                    row["Retained KB"] = round(op["retained_bytes"] / 1024, 1)
+                ops_rows.append(row)
+            st.dataframe(pd.DataFrame(ops_rows), hide_index=True, use_container_width=True)
+            cache = rerun_trace["frame_cache"]
+            st.caption(f"Frame cache: {cache.get('hits', 0)} hits, {cache.get('misses', 0)} misses")
+            if memory:
+                st.caption(
+                    f"Memory: {memory['peak_alloc_bytes'] / 1024:.0f} KB peak, "
+                    f"{memory['retained_bytes'] / 1024:+.0f} KB retained this run, "
+                    f"{memory.get('session_retained_bytes', 0) / 1024:+.0f} KB by this session"
+                )
+                with st.expander("Top allocation sites"):
+                    st.dataframe(pd.DataFrame([{
+                        "Site": site["site"],
+                        "KB": round(site["bytes"] / 1024, 1),
+                        "Blocks": site["blocks"]
+                    } for site in memory["top_sites"]]), hide_index=True, use_container_width=True)
+        else:
+            st.caption("Timings appear from the next run.")
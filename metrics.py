@@ -0,0 +1,280 @@
+import bisect
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Process-wide metrics for scraping, in the Prometheus text format. The hot
+# paths update counters and histograms directly (a lock and a dict update
+# per call, so they stay on in production); values that already live
+# elsewhere, such as cache hit counts, are read by callbacks at scrape time.
+# With TRACKER_METRICS_PORT set, start_metrics_server() serves them at
+# http://TRACKER_METRICS_HOST:TRACKER_METRICS_PORT/metrics from a daemon thread.
+METRICS_PORT_ENV = "TRACKER_METRICS_PORT"
+METRICS_HOST_ENV = "TRACKER_METRICS_HOST"
+# A session counts as active while it reran within this many seconds
+SESSION_IDLE_SECONDS = 300
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if isinstance(value, float):
+        if value == float("inf"):
+            return "+Inf"
+        return repr(value)
+    return str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, float] = {}
+        self._function = None
+
+    def set_function(self, function: Callable):
+        """Read the value(s) at scrape time: a number, or {label values: number}"""
+        self._function = function
+
+    def _samples(self) -> List[Tuple[str, Tuple, float]]:
+        if self._function is not None:
+            value = self._function()
+            items = value.items() if isinstance(value, dict) else [((), value)]
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [("", labels, value) for labels, value in sorted(items)]
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self._samples():
+            if suffix == "_bucket":
+                label_text = _labels(self.labelnames, labels[:-1], f'le="{_number(labels[-1])}"')
+            else:
+                label_text = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}{suffix}{label_text} {_number(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket counts (last one is +Inf), sum, count
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = [(labels, (list(state[0]), state[1], state[2])) for labels, state in self._values.items()]
+        samples = []
+        for labels, (counts, total, count) in sorted(items):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", labels + (bound,), cumulative))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def expose(self) -> str:
+        """Every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.expose())
+            except Exception:
+                # One failing callback must not hide the other metrics
+                logger.exception("Could not collect metric %s", metric.name)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+RERUNS = REGISTRY.register(Counter("tracker_reruns_total", "Streamlit script runs", ["view"]))
+RERUN_SECONDS = REGISTRY.register(Histogram("tracker_rerun_duration_seconds",
+                                            "Time to run the Streamlit script once", ["view"]))
+OPERATION_SECONDS = REGISTRY.register(Histogram("tracker_operation_duration_seconds",
+                                                "Time spent in data-layer operations", ["operation"]))
+OPERATION_ERRORS = REGISTRY.register(Counter("tracker_operation_errors_total",
+                                             "Data-layer operations that raised", ["operation"]))
+STORE_READ_BYTES = REGISTRY.register(Counter("tracker_store_read_bytes_total",
+                                             "Bytes read from the data files and database", ["store"]))
+STORE_WRITTEN_BYTES = REGISTRY.register(Counter("tracker_store_written_bytes_total",
+                                                "Bytes written to the data files and database", ["store"]))
+LOGINS = REGISTRY.register(Counter("tracker_logins_total", "Login attempts by outcome", ["result"]))
+CACHE_HITS = REGISTRY.register(Counter("tracker_cache_hits_total", "Cache lookups answered from memory", ["cache"]))
+CACHE_LOOKUPS = REGISTRY.register(Counter("tracker_cache_lookups_total", "Cache lookups", ["cache"]))
+CACHE_HIT_RATIO = REGISTRY.register(Gauge("tracker_cache_hit_ratio", "Share of cache lookups that hit", ["cache"]))
+ACTIVE_SESSIONS = REGISTRY.register(Gauge("tracker_active_sessions",
+                                          f"Sessions that ran the script in the last {SESSION_IDLE_SECONDS}s"))
+
+# Cache name -> function returning (hits, lookups)
+_caches: Dict[str, Callable[[], Tuple[int, int]]] = {}
+_sessions: Dict[str, float] = {}
+_sessions_lock = threading.Lock()
+
+
+def register_cache(name: str, counts: Callable[[], Tuple[int, int]]):
+    """Report a cache's (hits, lookups), read at scrape time"""
+    _caches[name] = counts
+
+
+def _cache_counts() -> Dict[Tuple, Tuple[int, int]]:
+    return {(name,): counts() for name, counts in list(_caches.items())}
+
+
+CACHE_HITS.set_function(lambda: {labels: hits for labels, (hits, _) in _cache_counts().items()})
+CACHE_LOOKUPS.set_function(lambda: {labels: lookups for labels, (_, lookups) in _cache_counts().items()})
+CACHE_HIT_RATIO.set_function(lambda: {labels: round(hits / lookups, 4) if lookups else 0.0
+                                      for labels, (hits, lookups) in _cache_counts().items()})
+
+
+def touch_session(session_id: str):
+    """Mark a session as active now"""
+    with _sessions_lock:
+        _sessions[session_id] = time.monotonic()
+
+
+def _active_sessions() -> int:
+    cutoff = time.monotonic() - SESSION_IDLE_SECONDS
+    with _sessions_lock:
+        for session_id in [s for s, seen in _sessions.items() if seen < cutoff]:
+            del _sessions[session_id]
+        return len(_sessions)
+
+
+ACTIVE_SESSIONS.set_function(_active_sessions)
+
+
+def record_rerun(view: str, seconds: float):
+    RERUNS.inc(view)
+    RERUN_SECONDS.observe(seconds, view)
+
+
+def timed(operation: str):
+    """Decorator: observe each call's duration, and count the calls that raise"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                OPERATION_ERRORS.inc(operation)
+                raise
+            finally:
+                OPERATION_SECONDS.observe(time.perf_counter() - started, operation)
+        return wrapper
+    return decorator
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = REGISTRY.expose().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_attempted = False
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = None, host: str = None):
+    """Serve /metrics from a daemon thread, once per process
+
+    Without a port argument, uses TRACKER_METRICS_PORT and does nothing if
+    it is unset. Returns the server, or None if it is not running.
+    """
+    global _server, _server_attempted
+    if _server_attempted:
+        return _server
+    if port is None:
+        port = os.environ.get(METRICS_PORT_ENV)
+        if not port:
+            return None
+    with _server_lock:
+        if not _server_attempted:
+            _server_attempted = True
+            host = host or os.environ.get(METRICS_HOST_ENV, "127.0.0.1")
+            try:
+                server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            except OSError as e:
+                logger.warning("Metrics server not started on %s:%s: %s", host, port, e)
+                return None
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+            _server = server
+    return _server
@@ -0,0 +1,111 @@
+import argparse
+import os
+import sys
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, NamedTuple
+
+from json_transaction import Transaction, file_version, recover, run_transaction
+
+# Versioned schema migrations for the JSON data files. SCHEMA_FILE records
+# the version the files were last brought to; each migration upgrades one
+# record (key, value) of one file to its version. Migrations run once,
+# either explicitly (python migrations.py) or lazily on first access, in a
+# single transaction that rewrites the files record by record and moves
+# the marker with them, so a crash leaves either the old or the new schema.
+#
+#   python migrations.py           bring every file to the current schema
+#   python migrations.py --status  print the stored and current versions
+SCHEMA_FILE = "schema_version.json"
+
+
+class Migration(NamedTuple):
+    version: int
+    path: str
+    description: str
+    upgrade: Callable[[str, Dict], Dict]
+
+
+_current = set()
+_lock = threading.Lock()
+
+
+def stored_version(tx: Transaction = None) -> int:
+    """Schema version the files are at; 0 before any migration ran"""
+    if tx is None:
+        tx = Transaction()
+    return tx.read(SCHEMA_FILE, dict).get("version", 0)
+
+
+def latest_version(migrations: List[Migration]) -> int:
+    return max((m.version for m in migrations), default=0)
+
+
+def _upgraded(data: Dict, upgrades: List[Callable]) -> Iterable:
+    for key, record in data.items():
+        for upgrade in upgrades:
+            record = upgrade(key, record)
+        yield key, record
+
+
+def migrate(migrations: List[Migration], create: Dict[str, Callable[[], Dict]] = None) -> List[Migration]:
+    """Create missing files and apply pending migrations; returns those applied
+
+    ``create`` maps a file to a function returning its initial contents.
+    """
+    create = create or {}
+    target = latest_version(migrations)
+
+    def work(tx):
+        steps = [m for m in sorted(migrations) if m.version > stored_version(tx)]
+        paths = {m.path for m in steps} | {p for p in create if file_version(p) is None}
+        if not paths:
+            return []
+        for path in sorted(paths):
+            data = tx.read(path, create.get(path, dict))
+            tx.write_records(path, _upgraded(data, [m.upgrade for m in steps if m.path == path]))
+        tx.write(SCHEMA_FILE, {"version": target, "migrated_at": datetime.now().isoformat()})
+        return steps
+
+    recover()
+    applied, _ = run_transaction(work)
+    return applied
+
+
+def ensure_schema(migrations: List[Migration], create: Dict[str, Callable[[], Dict]] = None):
+    """migrate() once per process and data directory; later calls return at once"""
+    key = os.path.abspath(SCHEMA_FILE)
+    if key in _current:
+        return
+    with _lock:
+        if key in _current:
+            return
+        target = latest_version(migrations)
+        if stored_version() < target or any(file_version(p) is None for p in create or {}):
+            migrate(migrations, create)
+        _current.add(key)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bring the data files to the current schema")
+    parser.add_argument("--status", action="store_true", help="Only print the stored and current versions")
+    args = parser.parse_args(argv)
+
+    from tracker_core.accounts import AUTH_MIGRATIONS, init_db
+    from tracker_core.expenses import init_expenses_file
+
+    if args.status:
+        print(f"Schema version {stored_version()} (current: {latest_version(AUTH_MIGRATIONS)})")
+        return 0
+    before = stored_version()
+    init_db()
+    init_expenses_file()
+    for migration in AUTH_MIGRATIONS:
+        if migration.version > before:
+            print(f"Applied {migration.version}: {migration.description}")
+    print(f"Schema version {stored_version()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, List, Sequence
+
+import pandas as pd
+
+# Money is handled as integer paise. Amounts entered in rupees are converted
+# once, and every sum, share and balance is computed on integers, so splits
+# add up exactly and balances always sum to zero.
+PAISE_PER_RUPEE = 100
+
+
+def to_paise(amount) -> int:
+    """Rupees (float, str or Decimal) to integer paise, rounding half up"""
+    if amount is None:
+        return 0
+    if isinstance(amount, (int, float)):
+        # Whole paise (the usual case) need no Decimal; only values that
+        # are not, e.g. 0.285, need half-up rounding of their decimal form
+        scaled = amount * PAISE_PER_RUPEE
+        nearest = round(scaled)
+        if abs(scaled - nearest) < 1e-6:
+            return int(nearest)
+    return int((Decimal(str(amount)) * PAISE_PER_RUPEE).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_rupees(paise: int) -> float:
+    """Integer paise to rupees for display"""
+    return paise / PAISE_PER_RUPEE
+
+
+def record_paise(record: Dict) -> int:
+    """Amount of an expense record in paise, using the stored value when there is one"""
+    if record.get("amount_paise") is not None:
+        return int(record["amount_paise"])
+    return to_paise(record.get("Amount") or 0)
+
+
+def paise_column(amounts: pd.Series) -> pd.Series:
+    """Rupee amounts to an int64 paise column, rounded like to_paise"""
+    amounts = pd.to_numeric(amounts)
+    scaled = amounts * PAISE_PER_RUPEE
+    paise = scaled.round()
+    # Only the rare values that are not whole paise go through to_paise
+    # for its half-up rounding
+    inexact = (scaled - paise).abs() >= 1e-6
+    if inexact.any():
+        paise[inexact] = amounts[inexact].map(to_paise)
+    return paise.fillna(0).astype("int64")
+
+
+def split_paise(total: int, weights: Sequence[int]) -> List[int]:
+    """Split ``total`` paise in proportion to ``weights``, exactly
+
+    Each part gets the floor of its share, and the remaining paise go one at
+    a time to the parts with the largest fractional remainders (earlier
+    parts first on ties), so the parts always add up to ``total`` and the
+    same input always gives the same split.
+    """
+    weights = [int(w) for w in weights]
+    weight_sum = sum(weights)
+    if not weights or weight_sum <= 0:
+        raise ValueError("split needs at least one positive weight")
+    sign = -1 if total < 0 else 1
+    total = abs(int(total))
+    parts = [total * w // weight_sum for w in weights]
+    remainders = [total * w % weight_sum for w in weights]
+    leftover = total - sum(parts)
+    for i in sorted(range(len(weights)), key=lambda i: -remainders[i])[:leftover]:
+        parts[i] += 1
+    return [sign * p for p in parts]
+
+
+def split_equal(total: int, count: int) -> List[int]:
+    """Split ``total`` paise into ``count`` parts differing by at most one paisa"""
+    return split_paise(total, [1] * count)
@@ -0,0 +1,161 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from hashlib import sha256
+from typing import Tuple
+
+# Password hashing: salted scrypt (or PBKDF2-SHA256 where OpenSSL has no
+# scrypt), stored as "scheme$params$salt$hash". Hashes run in a small
+# thread pool so at most HASH_WORKERS cores are ever busy hashing. At most
+# MAX_PENDING attempts are queued; a further one waits up to SLOT_WAIT
+# seconds for a place and is then turned away instead of piling up.
+# Hashes from before this module are bare SHA-256 hex digests; they still
+# verify and are flagged for rehashing.
+#
+#   PASSWORD_KDF            scrypt (default) or pbkdf2
+#   PASSWORD_SCRYPT_N       scrypt cost, a power of two (default 2**14, ~16 MiB)
+#   PASSWORD_PBKDF2_ROUNDS  PBKDF2 iterations (default 600000)
+#   PASSWORD_HASH_WORKERS   hashing threads (default half the cores)
+#   PASSWORD_MAX_PENDING    queued attempts before turning logins away
+KDF = os.environ.get("PASSWORD_KDF", "scrypt" if hasattr(hashlib, "scrypt") else "pbkdf2")
+SCRYPT_N = int(os.environ.get("PASSWORD_SCRYPT_N", 2 ** 14))
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ROUNDS = int(os.environ.get("PASSWORD_PBKDF2_ROUNDS", 600_000))
+SALT_BYTES = 16
+HASH_BYTES = 32
+HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+MAX_PENDING = int(os.environ.get("PASSWORD_MAX_PENDING", 8 * HASH_WORKERS))
+SLOT_WAIT = 2.0
+
+
+class TooManyAttempts(Exception):
+    """Every hashing slot is taken; the caller should try again shortly"""
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # OpenSSL refuses to allocate more than maxmem (32 MiB by default)
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r + (1 << 20), dklen=HASH_BYTES)
+
+
+def _pbkdf2(password: str, salt: bytes, rounds: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, rounds, dklen=HASH_BYTES)
+
+
+def hash_password(password: str, kdf: str = None, cost: int = None, salt: bytes = None) -> str:
+    """Salted hash of ``password`` in the "scheme$params$salt$hash" format
+
+    ``cost`` is the scrypt N or the PBKDF2 iteration count; both default
+    to the configured values. ``salt`` is random unless given (only
+    synthetic data should pass one).
+    """
+    kdf = kdf or KDF
+    salt = salt or os.urandom(SALT_BYTES)
+    if kdf == "scrypt":
+        n = cost or SCRYPT_N
+        digest = _scrypt(password, salt, n, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${n},{SCRYPT_R},{SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+    if kdf == "pbkdf2":
+        rounds = cost or PBKDF2_ROUNDS
+        digest = _pbkdf2(password, salt, rounds)
+        return f"pbkdf2_sha256${rounds}${_b64(salt)}${_b64(digest)}"
+    raise ValueError(f"Unknown password KDF: {kdf}")
+
+
+def needs_rehash(stored: str) -> bool:
+    """True for legacy hashes and hashes made with other settings than the current ones"""
+    if stored.startswith("scrypt$"):
+        return KDF != "scrypt" or stored.split("$")[1] != f"{SCRYPT_N},{SCRYPT_R},{SCRYPT_P}"
+    if stored.startswith("pbkdf2_sha256$"):
+        return KDF != "pbkdf2" or stored.split("$")[1] != str(PBKDF2_ROUNDS)
+    return True
+
+
+def verify_password(password: str, stored: str) -> bool:
+    """Check ``password`` against a stored hash of any supported scheme
+
+    A hash that cannot be parsed (corrupt or hand-edited) never matches.
+    """
+    if not stored:
+        return False
+    try:
+        if "$" not in stored:
+            # Legacy unsalted SHA-256 hex digest
+            return hmac.compare_digest(sha256(password.encode()).hexdigest(), stored)
+        scheme, params, salt, digest = stored.split("$")
+        salt, digest = base64.b64decode(salt, validate=True), base64.b64decode(digest, validate=True)
+        if scheme == "scrypt":
+            n, r, p = (int(x) for x in params.split(","))
+            return hmac.compare_digest(_scrypt(password, salt, n, r, p), digest)
+        if scheme == "pbkdf2_sha256":
+            return hmac.compare_digest(_pbkdf2(password, salt, int(params)), digest)
+    except (ValueError, TypeError):
+        # binascii.Error is a ValueError; TypeError is a non-ASCII legacy digest
+        pass
+    return False
+
+
+def _dummy_hash() -> str:
+    """A hash in the current format that no password matches, made without hashing"""
+    if KDF == "scrypt":
+        prefix = f"scrypt${SCRYPT_N},{SCRYPT_R},{SCRYPT_P}"
+    else:
+        prefix = f"pbkdf2_sha256${PBKDF2_ROUNDS}"
+    return f"{prefix}${_b64(os.urandom(SALT_BYTES))}${_b64(os.urandom(HASH_BYTES))}"
+
+
+# Compared against when a username does not exist, so unknown and known
+# users take the same time to reject. Checking it costs a full hash, but
+# building it costs none, so it is made once at import
+_DUMMY_HASH = _dummy_hash()
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_PENDING)
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+    return _pool
+
+
+def _submit(fn, *args) -> Future:
+    if not _slots.acquire(timeout=SLOT_WAIT):
+        raise TooManyAttempts("Too many login attempts right now, please try again in a moment")
+    try:
+        future = _get_pool().submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+def hash_in_pool(password: str) -> str:
+    """hash_password on the hashing pool; raises TooManyAttempts when it is full"""
+    return _submit(hash_password, password).result()
+
+
+def check_in_pool(password: str, stored: str = None) -> Tuple[bool, bool]:
+    """Verify on the hashing pool: (matches, should be rehashed)
+
+    With no stored hash (unknown user) a dummy hash is checked so the
+    answer takes as long as for a real user. Raises TooManyAttempts when
+    the pool is full.
+    """
+    if stored is None:
+        _submit(verify_password, password, _DUMMY_HASH).result()
+        return False, False
+    matches = _submit(verify_password, password, stored).result()
+    return matches, matches and needs_rehash(stored)
@@ -0,0 +1,362 @@
+import argparse
+import json
+import os
+import sys
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from expense_store import ExpenseStore, get_store
+from money import record_paise
+from unit_of_work import trace_read
+
+# Materialised rollups: sum, count, min and max of the amount in paise per
+# (Username, group_id, Category, month), one table per owner (a user's
+# personal expenses or one group). Tables are built from the store on first
+# use, updated incrementally on writes, rebuilt when the store changed
+# behind their back, and checkpointed to ROLLUPS_FILE for the next start.
+#
+#   python rollups.py rebuild   rebuild every table from the raw expenses
+#   python rollups.py check     compare the tables with the raw expenses
+ROLLUPS_FILE = "expense_rollups.json"
+# Seconds to wait after a change before writing the checkpoint file
+CHECKPOINT_DELAY = 1.0
+
+Owner = Tuple[str, str]
+CellKey = Tuple[Optional[str], Optional[str], Optional[str], str]
+
+
+def owner_of(record: Dict) -> Owner:
+    """The table a record belongs to: ("group", id) or ("user", name)"""
+    if record.get("group_id") is not None:
+        return ("group", record["group_id"])
+    return ("user", record.get("Username"))
+
+
+def cell_key(record: Dict) -> CellKey:
+    return (record.get("Username"), record.get("group_id"), record.get("Category"),
+            (record.get("Date") or "")[:7])
+
+
+class RollupTable:
+    """Rollup cells of one owner: key -> [sum, count, min, max]"""
+
+    def __init__(self, version=None):
+        self.cells: Dict[CellKey, List[int]] = {}
+        self.version = version
+        # Pending write IDs the build already saw, so their deltas are skipped
+        self.included = set()
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict], version=None) -> "RollupTable":
+        table = cls(version)
+        for record in records:
+            table.add(record)
+        return table
+
+    def add(self, record: Dict):
+        amount = record_paise(record)
+        cell = self.cells.get(cell_key(record))
+        if cell is None:
+            self.cells[cell_key(record)] = [amount, 1, amount, amount]
+        else:
+            cell[0] += amount
+            cell[1] += 1
+            cell[2] = min(cell[2], amount)
+            cell[3] = max(cell[3], amount)
+
+    def remove(self, record: Dict) -> bool:
+        """Subtract a record; False if the table has to be rebuilt instead"""
+        key = cell_key(record)
+        amount = record_paise(record)
+        cell = self.cells.get(key)
+        if cell is None:
+            return False
+        if cell[1] == 1:
+            del self.cells[key]
+            return True
+        if amount <= cell[2] or amount >= cell[3]:
+            # The removed value may have been the minimum or maximum
+            return False
+        cell[0] -= amount
+        cell[1] -= 1
+        return True
+
+    def to_rows(self) -> List[list]:
+        return [list(key) + cell for key, cell in self.cells.items()]
+
+    @classmethod
+    def from_rows(cls, rows: List[list], version=None) -> "RollupTable":
+        table = cls(version)
+        for row in rows:
+            table.cells[tuple(row[:4])] = list(row[4:])
+        return table
+
+
+class Rollups:
+    """Process-wide rollup tables kept in step with the expense store
+
+    Writers call ``begin_*`` before and ``end_*`` after touching the store.
+    A table built while a write is in flight records whether it already saw
+    that write, so the delta is never applied twice.
+    """
+
+    def __init__(self, store: ExpenseStore = None, checkpoint_file: str = ROLLUPS_FILE):
+        self._store = store
+        self.checkpoint_file = checkpoint_file
+        self._tables: Dict[Owner, RollupTable] = {}
+        self._pending_adds: Dict[str, Dict] = {}
+        self._pending_deletes: Dict[str, Dict] = {}
+        self._checkpoint = None
+        self._checkpoint_timer = None
+        self._lock = threading.RLock()
+        # Our writes in flight per owner (None: store-wide versions)
+        self._writes_in_flight: Dict[Optional[Owner], int] = {}
+        self.builds = 0
+
+    @property
+    def store(self) -> ExpenseStore:
+        return self._store or get_store()
+
+    @staticmethod
+    def _scope(owner: Owner) -> Tuple[Optional[str], Optional[str]]:
+        kind, key = owner
+        return (key, None) if kind == "user" else (None, key)
+
+    def _version(self, owner: Owner):
+        return self.store.query_version(*self._scope(owner))
+
+    def _fingerprint(self, owner: Owner) -> str:
+        return json.dumps(self.store.query_fingerprint(*self._scope(owner)))
+
+    def _load_checkpoint(self, owner: Owner, version) -> Optional[RollupTable]:
+        if self._checkpoint is None:
+            try:
+                with open(self.checkpoint_file, "r") as f:
+                    self._checkpoint = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._checkpoint = {}
+        saved = self._checkpoint.get(json.dumps(owner))
+        if saved is None or saved["fingerprint"] != self._fingerprint(owner):
+            return None
+        return RollupTable.from_rows(saved["cells"], version)
+
+    def _build(self, owner: Owner) -> RollupTable:
+        version = self._version(owner)
+        table = self._load_checkpoint(owner, version)
+        if table is None:
+            trace_read("expenses")
+            records = self.store.query(*self._scope(owner))
+            table = RollupTable.from_records(records, version)
+            seen = {r["id"] for r in records}
+            table.included = {i for i in self._pending_adds if i in seen}
+            table.included |= {
+                i for i, r in self._pending_deletes.items() if owner_of(r) == owner and i not in seen
+            }
+            self.builds += 1
+            self._schedule_checkpoint()
+        self._tables[owner] = table
+        return table
+
+    def table(self, owner: Owner) -> RollupTable:
+        """Current table for ``owner``, rebuilt if the store changed underneath"""
+        with self._lock:
+            table = self._tables.get(owner)
+            if table is None or table.version != self._version(owner):
+                table = self._build(owner)
+            return table
+
+    def _start_write(self, records: List[Dict]):
+        """Drop tables a foreign write already made stale before ours starts
+
+        _refresh_versions() moves tables to the version after our write,
+        so a table must be exactly current when the write begins, or
+        whatever another process wrote before it would be taken as applied.
+        While another of our writes is in flight the version already moved,
+        so the check is left to the first one.
+        """
+        owners = {owner_of(r) for r in records}
+        for key in owners if self.store.scoped_versions else {None}:
+            if not self._writes_in_flight.get(key):
+                for owner in [key] if key is not None else list(self._tables):
+                    table = self._tables.get(owner)
+                    if table is not None and table.version != self._version(owner):
+                        del self._tables[owner]
+            self._writes_in_flight[key] = self._writes_in_flight.get(key, 0) + 1
+
+    def _finish_write(self, records: List[Dict]):
+        owners = {owner_of(r) for r in records}
+        for key in owners if self.store.scoped_versions else {None}:
+            self._writes_in_flight[key] -= 1
+            if not self._writes_in_flight[key]:
+                del self._writes_in_flight[key]
+        self._refresh_versions(owners)
+
+    def _refresh_versions(self, owners: Iterable[Owner]):
+        """Record the store version after our own write so it is not mistaken for a foreign one"""
+        if self.store.scoped_versions:
+            for owner in owners:
+                if owner in self._tables:
+                    self._tables[owner].version = self._version(owner)
+        elif self._tables:
+            # Every table shares the store-wide version
+            version = self._version(next(iter(self._tables)))
+            for table in self._tables.values():
+                table.version = version
+
+    def begin_add(self, records: List[Dict]):
+        with self._lock:
+            self._start_write(records)
+            for record in records:
+                self._pending_adds[record["id"]] = record
+
+    def end_add(self, records: List[Dict], succeeded: bool = True):
+        with self._lock:
+            for record in records:
+                self._pending_adds.pop(record["id"], None)
+                table = self._tables.get(owner_of(record))
+                if table is None:
+                    continue
+                if record["id"] in table.included:
+                    table.included.discard(record["id"])
+                elif succeeded:
+                    table.add(record)
+            self._finish_write(records)
+            self._schedule_checkpoint()
+
+    def begin_delete(self, records: List[Dict]):
+        with self._lock:
+            self._start_write(records)
+            for record in records:
+                self._pending_deletes[record["id"]] = record
+
+    def end_delete(self, records: List[Dict], succeeded: bool = True):
+        with self._lock:
+            for record in records:
+                self._pending_deletes.pop(record["id"], None)
+                owner = owner_of(record)
+                table = self._tables.get(owner)
+                if table is None:
+                    continue
+                if record["id"] in table.included:
+                    table.included.discard(record["id"])
+                elif succeeded and not table.remove(record):
+                    del self._tables[owner]
+            self._finish_write(records)
+            self._schedule_checkpoint()
+
+    def invalidate(self, owners: Iterable[Owner] = None):
+        """Drop tables so they are rebuilt on next use"""
+        with self._lock:
+            if owners is None:
+                self._tables.clear()
+                self._checkpoint = {}
+            else:
+                for owner in owners:
+                    self._tables.pop(owner, None)
+                    if self._checkpoint:
+                        self._checkpoint.pop(json.dumps(owner), None)
+
+    def cells(self, owners: Iterable[Owner]) -> List[Tuple[CellKey, List[int]]]:
+        """All cells of the given owners"""
+        result = []
+        for owner in owners:
+            result.extend(self.table(owner).cells.items())
+        return result
+
+    def all_owners(self) -> List[Owner]:
+        return sorted({owner_of(r) for r in self.store.load_records()}, key=lambda o: (o[0], str(o[1])))
+
+    def rebuild(self, owners: Iterable[Owner] = None) -> int:
+        """Rebuild tables from the raw expenses, ignoring the checkpoint"""
+        owners = list(owners) if owners is not None else self.all_owners()
+        with self._lock:
+            self.invalidate(owners)
+            for owner in owners:
+                self._build(owner)
+            self.save()
+        return len(owners)
+
+    def check(self, owners: Iterable[Owner] = None) -> List[str]:
+        """Compare the maintained tables with a fresh computation; returns mismatches"""
+        owners = list(owners) if owners is not None else self.all_owners()
+        problems = []
+        for owner in owners:
+            with self._lock:
+                maintained = dict(self.table(owner).cells)
+            expected = RollupTable.from_records(self.store.query(*self._scope(owner))).cells
+            for key in sorted(set(maintained) | set(expected), key=str):
+                if maintained.get(key) != expected.get(key):
+                    problems.append(f"{owner[0]} {owner[1]} {key}: have {maintained.get(key)}, expected {expected.get(key)}")
+        return problems
+
+    def save(self):
+        """Write every current table to the checkpoint file"""
+        with self._lock:
+            if self._pending_adds or self._pending_deletes:
+                # Files may already hold writes the tables have not applied yet
+                self._checkpoint_timer = None
+                self._schedule_checkpoint()
+                return
+            checkpoint = dict(self._checkpoint or {})
+            for owner, table in self._tables.items():
+                if table.version == self._version(owner):
+                    checkpoint[json.dumps(owner)] = {
+                        "fingerprint": self._fingerprint(owner),
+                        "cells": table.to_rows()
+                    }
+            self._checkpoint = checkpoint
+            self._checkpoint_timer = None
+        tmp_path = self.checkpoint_file + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_file)
+
+    def _save_quietly(self):
+        try:
+            self.save()
+        except Exception:
+            # The checkpoint is only a start-up shortcut; tables rebuild without it
+            pass
+
+    def _schedule_checkpoint(self):
+        if self._checkpoint_timer is None:
+            self._checkpoint_timer = threading.Timer(CHECKPOINT_DELAY, self._save_quietly)
+            self._checkpoint_timer.daemon = True
+            self._checkpoint_timer.start()
+
+
+_rollups = Rollups()
+
+
+def get_rollups() -> Rollups:
+    """Return the process-wide rollup tables"""
+    return _rollups
+
+
+def _parse_owners(args) -> Optional[List[Owner]]:
+    owners = [("user", u) for u in args.user or []] + [("group", g) for g in args.group or []]
+    return owners or None
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Rebuild or check the materialised expense rollups")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--user", action="append", help="Only this user's personal expenses (repeatable)")
+    parser.add_argument("--group", action="append", help="Only this group (repeatable)")
+    args = parser.parse_args(argv)
+
+    rollups = get_rollups()
+    if args.command == "rebuild":
+        count = rollups.rebuild(_parse_owners(args))
+        print(f"Rebuilt {count} rollup tables into {rollups.checkpoint_file}")
+        return 0
+
+    problems = rollups.check(_parse_owners(args))
+    for problem in problems:
+        print(problem)
+    print("Rollups consistent" if not problems else f"{len(problems)} inconsistent cells")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+import heapq
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from expense_store import JsonLogExpenseStore, new_expense_id
+from money import to_rupees
+from unit_of_work import trace_read
+
+# Settlement engine: turns net balances (in paise, positive = is owed money)
+# into a short list of transfers, and keeps the transfers members actually
+# made in a ledger that is folded back into later balances.
+SETTLEMENTS_FILE = "settlements.json"
+SETTLEMENTS_LOG_FILE = "settlements.log.jsonl"
+# Up to this many non-zero balances the minimum number of transfers is
+# found exactly; larger groups use the greedy matcher (at most n - 1 transfers)
+EXACT_MAX_MEMBERS = 12
+
+Transfer = Tuple[str, str, int]
+
+
+def _greedy(balances: Dict[str, int]) -> List[Transfer]:
+    """Repeatedly let the largest debtor pay the largest creditor"""
+    transfers = []
+    creditors = []
+    debtors = []
+    # Opposite balances of the same size settle in a single transfer
+    waiting = {}
+    for user in sorted(balances, key=str):
+        amount = balances[user]
+        if amount == 0:
+            continue
+        partners = waiting.get(-amount)
+        if partners:
+            partner = partners.pop()
+            payer, payee = (user, partner) if amount < 0 else (partner, user)
+            transfers.append((payer, payee, abs(amount)))
+        else:
+            waiting.setdefault(amount, []).append(user)
+    for amount, users in waiting.items():
+        for user in users:
+            heapq.heappush(creditors if amount > 0 else debtors, (-abs(amount), str(user), user))
+
+    while creditors and debtors:
+        credit, _, creditor = heapq.heappop(creditors)
+        debt, _, debtor = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append((debtor, creditor, amount))
+        if -credit > amount:
+            heapq.heappush(creditors, (credit + amount, str(creditor), creditor))
+        if -debt > amount:
+            heapq.heappush(debtors, (debt + amount, str(debtor), debtor))
+    return transfers
+
+
+def _exact(balances: Dict[str, int]) -> List[Transfer]:
+    """Minimum number of transfers for a small group
+
+    k members whose balances sum to zero can always settle among
+    themselves in k - 1 transfers, so the minimum is n minus the largest
+    number of disjoint zero-sum subgroups. best[mask] holds that number for
+    the members in ``mask``; walking it back yields an order in which every
+    subgroup is contiguous.
+    """
+    users = sorted((u for u in balances if balances[u] != 0), key=str)
+    n = len(users)
+    full = (1 << n) - 1
+    sums = [0] * (full + 1)
+    best = [0] * (full + 1)
+    for mask in range(1, full + 1):
+        low = mask & -mask
+        sums[mask] = sums[mask ^ low] + balances[users[low.bit_length() - 1]]
+        best[mask] = max(best[mask ^ (1 << i)] for i in range(n) if mask >> i & 1) + (sums[mask] == 0)
+
+    order = []
+    mask = full
+    while mask:
+        bonus = sums[mask] == 0
+        i = next(i for i in range(n) if mask >> i & 1 and best[mask ^ (1 << i)] + bonus == best[mask])
+        order.append(users[i])
+        mask ^= 1 << i
+    order.reverse()
+
+    transfers = []
+    group = {}
+    running = 0
+    for user in order:
+        group[user] = balances[user]
+        running += balances[user]
+        if running == 0:
+            transfers.extend(_greedy(group))
+            group = {}
+    return transfers
+
+
+def settle(balances: Dict[str, int]) -> List[Transfer]:
+    """Transfers (payer, payee, paise) that bring every balance to zero
+
+    Balances are in integer paise, positive for members who are owed
+    money. A rounding residue (balances not summing to zero) is taken up by
+    the largest balance of the opposite sign.
+    """
+    balances = {user: int(amount) for user, amount in balances.items() if int(amount) != 0}
+    residue = sum(balances.values())
+    if residue:
+        candidates = [u for u in balances if (balances[u] > 0) == (residue < 0)] or list(balances)
+        target = max(candidates, key=lambda u: (abs(balances[u]), str(u)))
+        balances[target] -= residue
+    if len(balances) <= EXACT_MAX_MEMBERS:
+        return _exact(balances)
+    return _greedy(balances)
+
+
+class SettlementLedger:
+    """Settlements members recorded, one entry per transfer
+
+    Entries live in a snapshot plus append-only log like expenses, so
+    recording a settlement only appends a line. Net amounts per group are
+    cached against the ledger version.
+    """
+
+    def __init__(self, snapshot_file: str = SETTLEMENTS_FILE, log_file: str = SETTLEMENTS_LOG_FILE):
+        self.store = JsonLogExpenseStore(snapshot_file, log_file, metrics_label="settlements")
+        self._lock = threading.Lock()
+        self._net = {}
+
+    def record(self, group_id: str, transfers: List[Transfer], date: str = None) -> List[Dict]:
+        """Append one ledger entry per transfer and return them"""
+        now = datetime.now()
+        entries = [{
+            "id": new_expense_id(),
+            "group_id": group_id,
+            "Date": date or now.strftime("%Y-%m-%d"),
+            "From": payer,
+            "To": payee,
+            "Amount": to_rupees(amount),
+            "amount_paise": int(amount),
+            "timestamp": now.isoformat()
+        } for payer, payee, amount in transfers if amount > 0]
+        if entries:
+            self.store.append_records(entries)
+        return entries
+
+    def entries(self, group_id: str) -> List[Dict]:
+        trace_read(SETTLEMENTS_FILE)
+        return self.store.query(group_id=group_id)
+
+    def pairs(self) -> pd.DataFrame:
+        """Every recorded payment as (payer, beneficiary, paise): the receiver now owes the payer"""
+        trace_read(SETTLEMENTS_FILE)
+        entries = self.store.load_records()
+        return pd.DataFrame({
+            "payer": [entry["From"] for entry in entries],
+            "beneficiary": [entry["To"] for entry in entries],
+            "paise": np.array([int(entry["amount_paise"]) for entry in entries], dtype=np.int64)
+        })
+
+    def remove(self, entry_ids: List[str]) -> int:
+        return self.store.delete_records(entry_ids)
+
+    def net_paid(self, group_id: str) -> Dict[str, int]:
+        """Paise each member paid (positive) or received (negative) in settlements"""
+        version = self.store.version()
+        with self._lock:
+            cached = self._net.get(group_id)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+        net = {}
+        for entry in self.entries(group_id):
+            amount = int(entry["amount_paise"])
+            net[entry["From"]] = net.get(entry["From"], 0) + amount
+            net[entry["To"]] = net.get(entry["To"], 0) - amount
+        with self._lock:
+            self._net[group_id] = (version, net)
+        return net
+
+
+_ledger: Optional[SettlementLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger() -> SettlementLedger:
+    """Return the process-wide settlement ledger"""
+    global _ledger
+    if _ledger is None:
+        with _ledger_lock:
+            if _ledger is None:
+                _ledger = SettlementLedger()
+    return _ledger
@@ -0,0 +1,349 @@
+import math
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from money import record_paise, split_paise, to_paise
+
+# Split specs for group expenses, stored on the record as
+#
+#   "split": {"type": "equal",   "shares": {"asha": 1, "ravi": 1}}
+#   "split": {"type": "weights", "shares": {"asha": 2, "ravi": 1}}
+#   "split": {"type": "percent", "shares": {"asha": 60, "ravi": 40}}
+#   "split": {"type": "exact",   "shares": {"asha": 150000, "ravi": 50000}}  # paise
+#
+# Records without a split (everything written before splits existed) are
+# shared equally among everyone who has paid for something in the group,
+# as balances always were. Every type is a weighted split of the expense's
+# paise, so shares add up exactly; see money.split_paise.
+SPLIT_TYPES = ("equal", "weights", "percent", "exact")
+# Weights and percentages are kept to four decimal places
+WEIGHT_SCALE = 10000
+# Largest amount x weight product the int64 split can take without overflow
+_INT64_SAFE = 2 ** 62
+
+
+def _weight_units(split_type: str, values: List) -> List[int]:
+    """Integer split weights of a spec's share values"""
+    if split_type == "equal":
+        return [1] * len(values)
+    if split_type == "exact":
+        return [int(value) for value in values]
+    return [int(round(float(value) * WEIGHT_SCALE)) for value in values]
+
+
+def make_split(split_type: str, shares: Dict[str, float], amount_paise: int) -> Dict:
+    """Validated split spec; raises ValueError with a message for the user
+
+    ``shares`` maps member to weight, percentage or exact amount in rupees
+    (for "equal" the values are ignored).
+    """
+    if split_type not in SPLIT_TYPES:
+        raise ValueError(f"Unknown split type '{split_type}'")
+    shares = {str(name).strip(): value for name, value in shares.items() if str(name).strip()}
+    if not shares:
+        raise ValueError("Choose at least one person to split with")
+    if split_type == "equal":
+        return {"type": "equal", "shares": {name: 1 for name in shares}}
+    if split_type == "exact":
+        try:
+            exact = {name: to_paise(value) for name, value in shares.items()}
+        except (InvalidOperation, ValueError, OverflowError):
+            raise ValueError("Shares must be numbers")
+        if any(value < 0 for value in exact.values()):
+            raise ValueError("Exact amounts cannot be negative")
+        if sum(exact.values()) != amount_paise:
+            raise ValueError(
+                f"Exact amounts add up to ₹{sum(exact.values()) / 100:.2f}, not ₹{amount_paise / 100:.2f}"
+            )
+        return {"type": "exact", "shares": exact}
+    try:
+        values = {name: float(Decimal(str(value))) for name, value in shares.items()}
+    except InvalidOperation:
+        raise ValueError("Shares must be numbers")
+    # NaN passes every comparison below, and neither NaN nor inf has weight units
+    if not all(math.isfinite(value) for value in values.values()):
+        raise ValueError("Shares must be numbers")
+    if any(value < 0 for value in values.values()) or sum(values.values()) <= 0:
+        raise ValueError("Shares must be positive")
+    if sum(_weight_units(split_type, list(values.values()))) <= 0:
+        raise ValueError("Shares are too small: use at most four decimal places")
+    if split_type == "percent" and abs(sum(values.values()) - 100) > 0.01:
+        raise ValueError(f"Percentages add up to {sum(values.values()):g}, not 100")
+    return {"type": split_type, "shares": values}
+
+
+def describe_split(spec) -> str:
+    """Short text for tables, e.g. 'weights: asha 2, ravi 1' or 'equal: asha, ravi'"""
+    if not isinstance(spec, dict) or not spec.get("shares"):
+        return "equal: everyone"
+    shares = spec["shares"]
+    if spec["type"] == "equal":
+        return "equal: " + ", ".join(shares)
+    if spec["type"] == "exact":
+        return "exact: " + ", ".join(f"{name} ₹{value / 100:.2f}" for name, value in shares.items())
+    suffix = "%" if spec["type"] == "percent" else ""
+    return f"{spec['type']}: " + ", ".join(f"{name} {value:g}{suffix}" for name, value in shares.items())
+
+
+def parse_shares(text: str) -> Dict[str, str]:
+    """Parse "asha: 2, ravi: 1" (commas or new lines) into {"asha": "2", "ravi": "1"}"""
+    shares = {}
+    for part in re.split(r"[,\n]", text or ""):
+        if not part.strip():
+            continue
+        name, sep, value = part.rpartition(":")
+        if not sep or not name.strip():
+            raise ValueError(f"Expected 'name: value', got '{part.strip()}'")
+        shares[name.strip()] = value.strip()
+    return shares
+
+
+def _split_rows(totals: np.ndarray, rows: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Vectorised money.split_paise for many expenses at once
+
+    ``rows`` gives the expense (an index into ``totals``) of each
+    (beneficiary, weight) entry; it is sorted and every expense has at
+    least one entry.
+    """
+    position = np.arange(len(rows))
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    amounts = np.abs(totals)
+    weight_sums = np.add.reduceat(weights, starts)[rows]
+    parts = amounts[rows] * weights // weight_sums
+    remainders = amounts[rows] * weights % weight_sums
+    leftover = amounts - np.add.reduceat(parts, starts)
+    # Leftover paise go to the largest remainders, earlier entries first on ties
+    order = np.lexsort((position, -remainders, rows))
+    rank = position - starts[rows[order]]
+    parts[order] += rank < leftover[rows[order]]
+    return np.sign(totals)[rows] * parts
+
+
+class GroupLedger:
+    """Who paid and who owes, in paise, for one group's expenses
+
+    ``paid`` and ``owed`` are per user in ``users`` order; ``net`` is what
+    each user is owed (positive) or owes (negative) and sums to zero.
+    ``pairs()`` gives the sparse payer x beneficiary matrix.
+    """
+
+    def __init__(self, users: List[str]):
+        self.users = users
+        n = len(users)
+        self.paid = np.zeros(n, dtype=np.int64)
+        self.owed = np.zeros(n, dtype=np.int64)
+        # Entries of expenses with a split spec, one per beneficiary
+        self.split_payer = np.zeros(0, dtype=np.int64)
+        self.split_beneficiary = np.zeros(0, dtype=np.int64)
+        self.split_paise = np.zeros(0, dtype=np.int64)
+        # Expenses without a spec, shared by ``participants`` (user codes in name order)
+        self.legacy_payer = np.zeros(0, dtype=np.int64)
+        self.legacy_paise = np.zeros(0, dtype=np.int64)
+        self.participants = np.zeros(0, dtype=np.int64)
+        self._pairs = None
+
+    @property
+    def net(self) -> np.ndarray:
+        return self.paid - self.owed
+
+    def _legacy_matrix(self):
+        """Dense (legacy payers x participants) shares of the unspecified expenses"""
+        k = len(self.participants)
+        payers, payer_index = np.unique(self.legacy_payer, return_inverse=True)
+        signs = np.sign(self.legacy_paise)
+        amounts = np.abs(self.legacy_paise)
+        base = np.zeros(len(payers), dtype=np.int64)
+        np.add.at(base, payer_index, signs * (amounts // k))
+        # Participant j gets one extra paisa from every expense whose remainder exceeds j
+        histogram = np.zeros((len(payers), k + 1), dtype=np.int64)
+        np.add.at(histogram, (payer_index, amounts % k), signs)
+        extra = np.cumsum(histogram[:, ::-1], axis=1)[:, ::-1][:, 1:]
+        return payers, base[:, None] + extra
+
+    def raw_pairs(self):
+        """(payer, beneficiary, paise) arrays of user codes, not yet aggregated"""
+        payer = [self.split_payer]
+        beneficiary = [self.split_beneficiary]
+        paise = [self.split_paise]
+        if len(self.legacy_payer):
+            payers, matrix = self._legacy_matrix()
+            payer.append(np.repeat(payers, len(self.participants)))
+            beneficiary.append(np.tile(self.participants, len(payers)))
+            paise.append(matrix.ravel())
+        return np.concatenate(payer), np.concatenate(beneficiary), np.concatenate(paise).astype(np.int64)
+
+    def pairs(self) -> pd.DataFrame:
+        """Non-zero (payer, beneficiary, paise) totals, one row per pair, self-pairs left out
+
+        The beneficiary owes the payer ``paise``.
+        """
+        if self._pairs is not None:
+            return self._pairs
+        payer, beneficiary, paise = self.raw_pairs()
+        frame = pd.DataFrame({"payer": payer, "beneficiary": beneficiary, "paise": paise})
+        frame = frame[frame["payer"] != frame["beneficiary"]]
+        frame = frame.groupby(["payer", "beneficiary"], as_index=False, sort=True)["paise"].sum()
+        frame = frame[frame["paise"] != 0]
+        names = np.array(self.users, dtype=object)
+        self._pairs = pd.DataFrame({
+            "payer": names[frame["payer"].to_numpy()],
+            "beneficiary": names[frame["beneficiary"].to_numpy()],
+            "paise": frame["paise"].to_numpy()
+        })
+        return self._pairs
+
+
+def build_group_ledger(records: List[Dict]) -> GroupLedger:
+    """Expand a group's expenses and their split specs into a GroupLedger"""
+    codes = {}
+    payers = []
+    totals = []
+    spec_rows, spec_beneficiaries, spec_weights = [], [], []
+    spec_totals, spec_payers, fallback = [], [], []
+    legacy_payers, legacy_totals = [], []
+
+    for record in records:
+        payer = codes.setdefault(record.get("Username"), len(codes))
+        total = record_paise(record)
+        payers.append(payer)
+        totals.append(total)
+        spec = record.get("split")
+        shares = spec.get("shares") if spec else None
+        try:
+            weights = _weight_units(spec["type"], list(shares.values())) if shares else None
+        except (KeyError, TypeError, ValueError, OverflowError):
+            # A spec that cannot be turned into weights is treated as no spec,
+            # so one bad record cannot break every balance of the group
+            weights = None
+        if not weights or sum(weights) <= 0 or min(weights) < 0:
+            legacy_payers.append(payer)
+            legacy_totals.append(total)
+            continue
+        beneficiaries = [codes.setdefault(name, len(codes)) for name in shares]
+        if abs(total) * max(weights) >= _INT64_SAFE:
+            fallback.append((payer, total, beneficiaries, weights))
+            continue
+        spec_rows.extend([len(spec_totals)] * len(weights))
+        spec_totals.append(total)
+        spec_payers.append(payer)
+        spec_beneficiaries.extend(beneficiaries)
+        spec_weights.extend(weights)
+
+    # Unspecified expenses are shared by everyone who paid for something
+    payer_codes = set(payers)
+    spenders = sorted((name for name, code in codes.items() if code in payer_codes), key=str)
+    ledger = GroupLedger(list(codes))
+    if not codes:
+        return ledger
+    np.add.at(ledger.paid, np.asarray(payers, dtype=np.int64), np.asarray(totals, dtype=np.int64))
+
+    if spec_rows:
+        rows = np.asarray(spec_rows, dtype=np.int64)
+        shares = _split_rows(np.asarray(spec_totals, dtype=np.int64), rows, np.asarray(spec_weights, dtype=np.int64))
+        ledger.split_payer = np.asarray(spec_payers, dtype=np.int64)[rows]
+        ledger.split_beneficiary = np.asarray(spec_beneficiaries, dtype=np.int64)
+        ledger.split_paise = shares
+    for payer, total, beneficiaries, weights in fallback:
+        # Amounts too large for int64 products: split with Python integers
+        parts = split_paise(total, weights)
+        ledger.split_payer = np.append(ledger.split_payer, [payer] * len(parts))
+        ledger.split_beneficiary = np.append(ledger.split_beneficiary, beneficiaries)
+        ledger.split_paise = np.append(ledger.split_paise, parts)
+    np.add.at(ledger.owed, ledger.split_beneficiary, ledger.split_paise)
+
+    if legacy_payers:
+        ledger.legacy_payer = np.asarray(legacy_payers, dtype=np.int64)
+        ledger.legacy_paise = np.asarray(legacy_totals, dtype=np.int64)
+        ledger.participants = np.asarray([codes[name] for name in spenders], dtype=np.int64)
+        k = len(spenders)
+        signs = np.sign(ledger.legacy_paise)
+        amounts = np.abs(ledger.legacy_paise)
+        # Same shares as split_equal: everyone gets amount // k, the first amount % k one more
+        extra = np.zeros(k + 1, dtype=np.int64)
+        np.add.at(extra, amounts % k, signs)
+        extra = np.cumsum(extra[::-1])[::-1][1:]
+        ledger.owed[ledger.participants] += int((signs * (amounts // k)).sum()) + extra
+    return ledger
+
+
+class PairwiseBalances:
+    """Net balance between every pair of users, stored sparsely
+
+    One row per direction of every pair with a non-zero balance, sorted by
+    user, so one user's friends are a contiguous slice found by binary search.
+    """
+
+    def __init__(self, names: np.ndarray, user: np.ndarray, friend: np.ndarray, paise: np.ndarray):
+        self.names = names
+        self._codes = {name: code for code, name in enumerate(names)}
+        self.user = user
+        self.friend = friend
+        self.paise = paise
+
+    def __len__(self) -> int:
+        return len(self.paise) // 2
+
+    def for_user(self, name: str) -> pd.DataFrame:
+        """(friend, paise) rows for ``name``; positive paise means the friend owes them"""
+        code = self._codes.get(name)
+        if code is None:
+            return pd.DataFrame({"friend": pd.Series(dtype=object), "paise": pd.Series(dtype="int64")})
+        start, end = np.searchsorted(self.user, [code, code + 1])
+        return pd.DataFrame({
+            "friend": self.names[self.friend[start:end]],
+            "paise": self.paise[start:end]
+        })
+
+    def between(self, name: str, other: str) -> int:
+        """What ``other`` owes ``name`` in paise (negative if ``name`` owes ``other``)"""
+        rows = self.for_user(name)
+        match = rows.loc[rows["friend"] == other, "paise"]
+        return int(match.iloc[0]) if len(match) else 0
+
+
+def build_pairwise_balances(ledgers: List[GroupLedger], extra_pairs: pd.DataFrame = None) -> PairwiseBalances:
+    """Many groups' ledgers (plus extra payer/beneficiary/paise rows) into one user x user matrix"""
+    names = sorted({name for ledger in ledgers for name in ledger.users}
+                   | (set(extra_pairs["payer"]) | set(extra_pairs["beneficiary"]) if extra_pairs is not None else set()),
+                   key=str)
+    codes = {name: code for code, name in enumerate(names)}
+    payer, beneficiary, paise = [], [], []
+    for ledger in ledgers:
+        # Local user codes of each group mapped onto the global ones
+        to_global = np.array([codes[name] for name in ledger.users], dtype=np.int64)
+        local_payer, local_beneficiary, local_paise = ledger.raw_pairs()
+        payer.append(to_global[local_payer])
+        beneficiary.append(to_global[local_beneficiary])
+        paise.append(local_paise)
+    if extra_pairs is not None and len(extra_pairs):
+        payer.append(np.array([codes[name] for name in extra_pairs["payer"]], dtype=np.int64))
+        beneficiary.append(np.array([codes[name] for name in extra_pairs["beneficiary"]], dtype=np.int64))
+        paise.append(extra_pairs["paise"].to_numpy(dtype=np.int64))
+    names = np.array(names, dtype=object)
+    if not paise:
+        empty = np.zeros(0, dtype=np.int64)
+        return PairwiseBalances(names, empty, empty, empty)
+    payer, beneficiary, paise = np.concatenate(payer), np.concatenate(beneficiary), np.concatenate(paise)
+
+    # Fold both directions onto (low, high): positive means high owes low
+    low = np.minimum(payer, beneficiary)
+    high = np.maximum(payer, beneficiary)
+    signed = np.where(payer == low, paise, -paise)
+    pair_keys = low * len(names) + high
+    order = np.argsort(pair_keys, kind="stable")
+    pair_keys = pair_keys[order]
+    starts = np.flatnonzero(np.r_[True, pair_keys[1:] != pair_keys[:-1]])
+    keys = pair_keys[starts]
+    net = np.add.reduceat(signed[order], starts)
+    keep = (net != 0) & (keys // len(names) != keys % len(names))
+    keys, net = keys[keep], net[keep]
+    low, high = keys // len(names), keys % len(names)
+    user = np.concatenate([low, high])
+    friend = np.concatenate([high, low])
+    paise = np.concatenate([net, -net])
+    order = np.lexsort((friend, user))
+    return PairwiseBalances(names, user[order], friend[order], paise[order])
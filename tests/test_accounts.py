@@ -0,0 +1,59 @@
+import threading
+
+from tracker_core import accounts
+
+
+def test_group_index_updates_never_change_a_published_index(data_dir):
+    accounts.create_user("asha", "Secret#123")
+    accounts.create_user("ravi", "Secret#123")
+    group_id = accounts.create_group("Goa", "asha")
+
+    before_invite = accounts.get_group_index()
+    assert accounts.invite_to_group(group_id, "ravi", "asha")
+    invited = accounts.get_group_index()
+    assert invited is not before_invite
+    assert not before_invite.is_invited(group_id, "ravi")
+    assert before_invite.groups[group_id]["invites_pending"] == []
+    assert invited.is_invited(group_id, "ravi")
+
+    assert accounts.accept_group_invite(group_id, "ravi")
+    joined = accounts.get_group_index()
+    assert not invited.is_member(group_id, "ravi")
+    assert "ravi" not in invited.groups[group_id]["members"]
+    assert joined.is_member(group_id, "ravi") and not joined.is_invited(group_id, "ravi")
+    assert [g["id"] for g in accounts.get_user_groups("ravi")] == [group_id]
+    assert accounts.get_user_pending_invites("ravi") == []
+
+
+def test_user_directory_hits_until_users_json_changes(data_dir):
+    directory = accounts.UserDirectory()
+    accounts.init_db()
+    assert directory.get("nobody") is None
+    assert directory.stats()["hits"] == 0 and directory.stats()["reloads"] == 1
+
+    assert directory.get("nobody") is None
+    assert directory.stats()["hits"] == 1 and directory.stats()["reloads"] == 1
+
+    users = accounts.load_users()
+    users["asha"] = {"password": "x", "groups": []}
+    accounts.save_users(users)
+    assert directory.get("asha") == {"password": "x", "groups": []}
+    stats = directory.stats()
+    assert (stats["lookups"], stats["hits"], stats["reloads"]) == (3, 1, 2)
+
+
+def test_user_directory_counts_concurrent_lookups(data_dir):
+    directory = accounts.UserDirectory()
+    accounts.init_db()
+    directory.get("nobody")
+
+    def look_up():
+        for _ in range(2000):
+            directory.get("nobody")
+    threads = [threading.Thread(target=look_up) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert directory.stats()["lookups"] == 8001
+    assert directory.stats()["hits"] == 8000
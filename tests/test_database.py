@@ -0,0 +1,17 @@
+import pandas as pd
+
+from database import balance_from_expenses
+
+
+def test_group_balance_shares_add_up():
+    expenses = pd.DataFrame({"username": ["asha", "asha", "ravi"], "amount": [10.0, 0.01, 5.0]})
+    balances = balance_from_expenses(expenses, ["asha", "ravi", "meera"])
+    assert balances["Username"].tolist() == ["asha", "ravi", "meera"]
+    assert balances["Total Spent"].tolist() == [10.01, 5.0, 0.0]
+    assert round(balances["Fair Share"].sum(), 2) == 15.01
+    assert round(balances["Net Balance"].sum(), 2) == 0
+
+
+def test_group_without_members_has_no_balances():
+    expenses = pd.DataFrame({"username": ["asha"], "amount": [10.0]})
+    assert balance_from_expenses(expenses, []).empty
@@ -0,0 +1,35 @@
+import pandas as pd
+
+from expense_cache import FrameCache
+from expense_store import JsonLogExpenseStore
+from tracker_core import expenses as core
+
+
+def test_lookup_with_a_new_version_misses():
+    cache = FrameCache(maxsize=2)
+    cache.put("asha", 1, pd.DataFrame({"Amount": [1.0]}))
+    assert cache.get("asha", 1)["Amount"].tolist() == [1.0]
+    assert cache.get("asha", 2) is None
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+
+def test_cached_frames_are_copies_and_evicted_least_recent_first():
+    cache = FrameCache(maxsize=2)
+    cache.put("a", 1, pd.DataFrame({"Amount": [1.0]}))
+    cache.get("a", 1)["Amount"] = 99.0
+    assert cache.get("a", 1)["Amount"].tolist() == [1.0]
+    cache.put("b", 1, pd.DataFrame())
+    cache.get("a", 1)
+    cache.put("c", 1, pd.DataFrame())
+    assert cache.get("b", 1) is None and cache.get("a", 1) is not None
+    cache.invalidate()
+    assert cache.get("a", 1) is None and cache.stats()["size"] == 0
+
+
+def test_get_expenses_sees_writes_from_another_process(data_dir):
+    core.add_expense({"Date": "2025-06-01", "Category": "Food", "Amount": 10.0, "Username": "asha"})
+    assert core.get_expenses("asha")["Amount"].tolist() == [10.0]
+    # Same files, different store object: only the file versions change
+    JsonLogExpenseStore().append_records([{"Date": "2025-06-02", "Category": "Food", "Amount": 5.0,
+                                           "Username": "asha", "group_id": None}])
+    assert core.get_expenses("asha")["Amount"].tolist() == [10.0, 5.0]
@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from tracker_core import ValidationError
+from tracker_core.expenses import (
+    build_expense_frame, expenses_between, friend_totals, month_bounds, personal_metrics, split_from_form
+)
+
+
+def _frame():
+    return build_expense_frame([
+        {"id": str(n), "Date": date, "Category": "Food", "Amount": 10.0, "Username": "asha", "group_id": None}
+        for n, date in enumerate(["2025-05-31", "2025-06-01", "2025-06-30", "2025-07-01"])
+    ])
+
+
+def test_expenses_between_keeps_the_half_open_range():
+    last_month, this_month, next_month = month_bounds(pd.Timestamp("2025-06-15"))
+    assert list(expenses_between(_frame(), this_month, next_month)["id"]) == ["1", "2"]
+    assert list(expenses_between(_frame(), last_month, this_month)["id"]) == ["0"]
+    assert len(expenses_between(_frame())) == 4
+    assert expenses_between(build_expense_frame([]), this_month, next_month).empty
+
+
+def test_personal_metrics_slice_the_months_and_sum_in_paise():
+    df = build_expense_frame([
+        {"id": "1", "Date": "2025-06-02", "Category": "Food", "Amount": 0.1, "Username": "asha"},
+        {"id": "2", "Date": "2025-06-20", "Category": "Food", "Amount": 0.2, "Username": "asha"},
+        {"id": "3", "Date": "2025-05-05", "Category": "Travel", "Amount": 120.0, "Username": "asha"},
+    ])
+    metrics = personal_metrics(df, pd.Timestamp("2025-06-15"))
+    assert metrics["total_spent"] == 120.3
+    assert metrics["this_month_total"] == 0.3 and list(metrics["this_month"]["id"]) == ["1", "2"]
+    assert metrics["last_month_total"] == 120.0
+    assert metrics["top_category"] == "Food" and metrics["top_category_amount"] == 0.3
+    assert personal_metrics(build_expense_frame([]))["top_category"] is None
+
+
+def test_split_from_form():
+    assert split_from_form(None, [], "", 10) is None
+    assert split_from_form("equal", ["asha", "ravi"], "", 10)["shares"] == {"asha": 1, "ravi": 1}
+    assert split_from_form("weights", [], "asha: 2, ravi: 1", 10)["shares"] == {"asha": 2.0, "ravi": 1.0}
+    with pytest.raises(ValidationError):
+        split_from_form("percent", [], "asha: 60", 10)
+    with pytest.raises(ValidationError):
+        split_from_form("exact", [], "asha", 10)
+
+
+def test_friend_totals():
+    friends = pd.DataFrame({"Friend": ["a", "b", "c"], "net_paise": [250, -100, -5]})
+    assert friend_totals(friends) == (2.5, 1.05)
+    assert friend_totals(friends.iloc[0:0]) == (0.0, 0.0)
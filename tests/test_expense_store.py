@@ -0,0 +1,166 @@
+import json
+import os
+
+import pytest
+
+from expense_store import JsonLogExpenseStore, ShardedExpenseStore, SqliteExpenseStore
+
+
+def _expense(n, **fields):
+    record = {"id": f"e{n}", "Date": "2025-06-01", "Category": "Food", "Amount": float(n),
+              "Username": "asha", "group_id": None}
+    record.update(fields)
+    return record
+
+
+@pytest.fixture
+def store(data_dir):
+    store = JsonLogExpenseStore(compact_threshold=10 ** 6)
+    store.recover()
+    return store
+
+
+def test_appends_go_to_the_log(store):
+    store.append_records([_expense(1), _expense(2)])
+    assert json.load(open(store.snapshot_file)) == []
+    assert len(open(store.log_file).readlines()) == 2
+    assert [r["id"] for r in store.load_records()] == ["e1", "e2"]
+
+
+def test_append_does_not_read_the_history(store, monkeypatch):
+    store.replace_records([_expense(n) for n in range(5)])
+
+    def no_reads(*args, **kwargs):
+        raise AssertionError("append read the snapshot")
+    monkeypatch.setattr(JsonLogExpenseStore, "_read_snapshot", staticmethod(no_reads))
+    store.append_records([_expense(5)])
+    store.append_records([_expense(6)])
+
+
+def test_torn_final_log_line_is_ignored(store):
+    store.append_records([_expense(1)])
+    with open(store.log_file, "a") as f:
+        f.write('{"id": "e2", "Amo')
+    assert [r["id"] for r in store.load_records()] == ["e1"]
+
+
+def test_compaction_folds_deletes_and_updates(store):
+    store.append_records([_expense(n) for n in range(4)])
+    store.delete_records(["e1"])
+    store.update_record("e2", {"Amount": 20.0})
+    store.compact()
+    assert not os.path.exists(store.log_file)
+    snapshot = json.load(open(store.snapshot_file))
+    assert [r["id"] for r in snapshot] == ["e0", "e2", "e3"]
+    assert snapshot[1]["Amount"] == 20.0
+
+
+def test_index_is_rebuilt_from_compaction_output(store, monkeypatch):
+    store.append_records([_expense(n) for n in range(4)])
+    store.compact()
+    monkeypatch.setattr(store, "load_records", lambda: pytest.fail("index reloaded the history"))
+    store.append_records([_expense(4)])
+    assert store.delete_records(["e0", "e4", "missing"]) == 2
+    assert store.update_record("e3", {"Amount": 1.0})
+
+
+def test_crash_before_compaction_commit_keeps_the_log(store):
+    store.append_records([_expense(n) for n in range(3)])
+    # Crashed after writing the pending snapshot, before removing the compacting log
+    os.replace(store.log_file, store.compacting_log_file)
+    with open(store.next_snapshot_file, "w") as f:
+        json.dump([_expense(0)], f)
+
+    reopened = JsonLogExpenseStore()
+    reopened.recover()
+    assert not os.path.exists(reopened.next_snapshot_file)
+    assert [r["id"] for r in reopened.load_records()] == ["e0", "e1", "e2"]
+    reopened.compact()
+    assert [r["id"] for r in json.load(open(reopened.snapshot_file))] == ["e0", "e1", "e2"]
+
+
+def test_crash_after_compaction_commit_promotes_the_snapshot(store):
+    store.append_records([_expense(n) for n in range(3)])
+    # Crashed after removing the compacting log, before the rename
+    with open(store.next_snapshot_file, "w") as f:
+        json.dump([_expense(n) for n in range(3)], f)
+    os.remove(store.log_file)
+
+    reopened = JsonLogExpenseStore()
+    # Readers already treat the pending snapshot as authoritative
+    assert [r["id"] for r in reopened.load_records()] == ["e0", "e1", "e2"]
+    reopened.recover()
+    assert not os.path.exists(reopened.next_snapshot_file)
+    assert [r["id"] for r in json.load(open(reopened.snapshot_file))] == ["e0", "e1", "e2"]
+
+
+def _no_full_reads(monkeypatch):
+    def no_reads(*args, **kwargs):
+        raise AssertionError("get_records read the whole history")
+    monkeypatch.setattr(JsonLogExpenseStore, "_read_entries", no_reads)
+
+
+def test_get_records_seeks_to_snapshot_and_log_lines(store, monkeypatch):
+    store.append_records([_expense(n) for n in range(5)])
+    store.compact()
+    store.append_records([_expense(5)])
+    store.update_record("e1", {"Amount": 10.0})
+    store.update_record("e1", {"Category": "Travel"})
+    store.delete_records(["e3"])
+    _no_full_reads(monkeypatch)
+    records = store.get_records(["e5", "e1", "e3", "missing"])
+    assert records == [_expense(5), _expense(1, Amount=10.0, Category="Travel")]
+
+
+def test_get_records_follows_lines_into_the_compacting_log(store, monkeypatch):
+    store.append_records([_expense(n) for n in range(3)])
+    store.get_records(["e0"])
+    original = JsonLogExpenseStore._read_snapshot
+    seen = {}
+
+    def read_mid_compaction(path, label="expenses"):
+        # Lines indexed in the log must now be found in the compacting log
+        if path == store.snapshot_file and not seen:
+            seen["records"] = store.get_records(["e2"])
+        return original(path, label)
+    monkeypatch.setattr(JsonLogExpenseStore, "_read_snapshot", staticmethod(read_mid_compaction))
+    store.compact()
+    assert seen["records"] == [_expense(2)]
+
+
+def test_get_records_after_external_change_rereads_the_files(store):
+    store.append_records([_expense(n) for n in range(3)])
+    store.compact()
+    store.get_records(["e0"])
+    # Another process rewrote the snapshot with different line lengths
+    other = JsonLogExpenseStore()
+    other.replace_records([_expense(2, Category="Rent"), _expense(0)])
+    records = sorted(store.get_records(["e0", "e2"]), key=lambda r: r["id"])
+    assert records == [_expense(0), _expense(2, Category="Rent")]
+
+
+def test_single_line_snapshot_is_read_and_rewritten(store):
+    with open(store.snapshot_file, "w") as f:
+        json.dump([_expense(0), _expense(1)], f)
+    assert store.get_records(["e1"]) == [_expense(1)]
+    store.compact(force=True)
+    assert open(store.snapshot_file).read().startswith("[\n")
+    assert store.get_records(["e1"]) == [_expense(1)]
+
+
+@pytest.mark.parametrize("backend", [JsonLogExpenseStore, SqliteExpenseStore, ShardedExpenseStore])
+def test_deletes_and_updates_by_id_survive_reopening(data_dir, backend):
+    store = backend()
+    store.recover()
+    store.append_records([_expense(n) for n in range(4)])
+    assert store.delete_records(["e1", "e1", "missing"]) == 1
+    assert store.update_record("e2", {"Amount": 20.0, "id": "ignored"})
+    assert not store.update_record("e1", {"Amount": 1.0})
+    # Moving a record to another month keeps its ID
+    assert store.update_record("e3", {"Date": "2025-07-15"})
+
+    reopened = backend()
+    records = {r["id"]: r for r in reopened.load_records()}
+    assert sorted(records) == ["e0", "e2", "e3"]
+    assert records["e2"]["Amount"] == 20.0 and records["e3"]["Date"] == "2025-07-15"
+    assert reopened.get_records(["e3", "e1"]) == [records["e3"]]
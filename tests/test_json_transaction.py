@@ -0,0 +1,90 @@
+import json
+import os
+
+import pytest
+
+import json_transaction
+from json_transaction import JOURNAL_FILE, ConflictError, Transaction, recover, run_transaction, write_json
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_commit_replaces_every_file_and_removes_the_journal(data_dir):
+    tx = Transaction()
+    tx.write("a.json", {"a": 1})
+    tx.write("b.json", {"b": 1})
+    tx.commit()
+    assert _load("a.json") == {"a": 1} and _load("b.json") == {"b": 1}
+    assert not os.path.exists(JOURNAL_FILE)
+    assert [name for name in os.listdir() if name.endswith(".tmp")] == []
+
+
+def test_commit_after_a_concurrent_write_conflicts(data_dir):
+    write_json("a.json", {"n": 0})
+    tx = Transaction()
+    tx.read("a.json")
+    write_json("a.json", {"n": 1})
+    tx.write("a.json", {"n": 2})
+    with pytest.raises(ConflictError):
+        tx.commit()
+    assert _load("a.json") == {"n": 1}
+
+
+def test_run_transaction_retries_on_conflict(data_dir):
+    write_json("a.json", {"n": 0})
+    attempts = []
+
+    def increment(tx):
+        n = tx.read("a.json")["n"]
+        attempts.append(n)
+        if len(attempts) == 1:
+            # Another writer commits between our read and our commit
+            write_json("a.json", {"n": n + 10})
+        tx.write("a.json", {"n": n + 1})
+        return n + 1
+
+    result, _ = run_transaction(increment)
+    assert attempts == [0, 10]
+    assert result == 11 and _load("a.json") == {"n": 11}
+
+
+def test_crash_between_renames_is_rolled_forward(data_dir, monkeypatch):
+    write_json("a.json", {"v": 1})
+    write_json("b.json", {"v": 1})
+    renames = []
+    original = os.replace
+
+    def crash_on_second_file(src, dst):
+        if dst != JOURNAL_FILE:
+            renames.append(dst)
+            if len(renames) == 2:
+                raise KeyboardInterrupt("power cut")
+        original(src, dst)
+    monkeypatch.setattr(json_transaction.os, "replace", crash_on_second_file)
+    tx = Transaction()
+    tx.write("a.json", {"v": 2})
+    tx.write("b.json", {"v": 2})
+    with pytest.raises(KeyboardInterrupt):
+        tx.commit()
+    monkeypatch.setattr(json_transaction.os, "replace", original)
+
+    # Half committed until the journal is replayed
+    assert os.path.exists(JOURNAL_FILE)
+    assert sorted([_load("a.json")["v"], _load("b.json")["v"]]) == [1, 2]
+    recover()
+    assert _load("a.json") == {"v": 2} and _load("b.json") == {"v": 2}
+    assert not os.path.exists(JOURNAL_FILE)
+
+
+def test_torn_journal_leaves_the_old_files(data_dir):
+    write_json("a.json", {"v": 1})
+    with open("a.json.1.2.tmp", "w") as f:
+        json.dump({"v": 2}, f)
+    with open(JOURNAL_FILE, "w") as f:
+        f.write('{"files": {"a.json": "a.json.1.')
+    recover()
+    assert _load("a.json") == {"v": 1}
+    assert not os.path.exists(JOURNAL_FILE)
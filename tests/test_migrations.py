@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import migrations
+from json_transaction import write_json
+from migrations import Migration, ensure_schema, migrate, stored_version
+from tracker_core.accounts import AUTH_MIGRATIONS, GROUPS_DB_FILE, USERS_DB_FILE
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_migrate_upgrades_old_files_once(data_dir):
+    write_json(USERS_DB_FILE, {"asha": {"password": "x"}})
+    write_json(GROUPS_DB_FILE, {"g1": {"name": "Goa", "creator": "asha"}})
+
+    applied = migrate(AUTH_MIGRATIONS)
+    assert [m.version for m in applied] == [1, 2]
+    assert _load(USERS_DB_FILE)["asha"] == {"password": "x", "groups": []}
+    assert _load(GROUPS_DB_FILE)["g1"]["members"] == []
+    assert _load(GROUPS_DB_FILE)["g1"]["invites_pending"] == []
+    assert stored_version() == 2
+    assert migrate(AUTH_MIGRATIONS) == []
+
+
+def test_migrate_applies_only_newer_steps(data_dir):
+    write_json("things.json", {"t": {"n": 1}})
+    write_json(migrations.SCHEMA_FILE, {"version": 1})
+
+    def double(key, record):
+        return {"n": record["n"] * 2}
+    steps = [Migration(1, "things.json", "already applied", double),
+             Migration(2, "things.json", "doubles n", double)]
+    assert [m.version for m in migrate(steps)] == [2]
+    assert _load("things.json") == {"t": {"n": 2}}
+
+
+def test_ensure_schema_creates_missing_files(data_dir):
+    ensure_schema(AUTH_MIGRATIONS, {USERS_DB_FILE: dict, GROUPS_DB_FILE: dict})
+    assert _load(USERS_DB_FILE) == {} and _load(GROUPS_DB_FILE) == {}
+    assert stored_version() == 2
+
+
+def test_failed_migration_keeps_the_old_schema(data_dir):
+    write_json("things.json", {"t": {"n": 1}})
+
+    def broken(key, record):
+        raise ValueError("bad record")
+    with pytest.raises(ValueError):
+        migrate([Migration(1, "things.json", "breaks", broken)])
+    assert _load("things.json") == {"t": {"n": 1}}
+    assert stored_version() == 0
@@ -0,0 +1,20 @@
+import pandas as pd
+import pytest
+
+from money import paise_column, to_paise
+
+HALF_PAISE = [0.285, 2.675, 1.005, 0.125, -0.285, -2.675]
+
+
+@pytest.mark.parametrize("amount, paise", [(0.285, 29), (2.675, 268), (1.005, 101), (0.125, 13),
+                                           (-0.285, -29), (-2.675, -268), (19.99, 1999), (None, 0)])
+def test_to_paise_rounds_half_up(amount, paise):
+    assert to_paise(amount) == paise
+
+
+def test_paise_column_matches_to_paise():
+    amounts = pd.Series(HALF_PAISE + [19.99, 1200.0, 0.1 + 0.2])
+    assert paise_column(amounts).tolist() == [to_paise(a) for a in amounts]
+    assert paise_column(pd.Series(["2.675", None])).tolist() == [268, 0]
+    assert paise_column(amounts).dtype == "int64"
+
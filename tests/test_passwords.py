@@ -0,0 +1,29 @@
+import pytest
+
+import passwords
+from passwords import hash_password, verify_password
+
+
+def test_hash_round_trip():
+    stored = hash_password("Secret#123")
+    assert verify_password("Secret#123", stored)
+    assert not verify_password("secret#123", stored)
+
+
+@pytest.mark.parametrize("stored", ["scrypt$16384,8,1$not base64!$AAAA", "scrypt$x,8,1$AAAA$AAAA",
+                                    "scrypt$only$three", "pbkdf2_sha256$many$AAAA$AAAA",
+                                    "scrypt$3,8,1$AAAA$AAAA", "ünicode-legacy-digest"])
+def test_unparseable_hash_never_matches(stored):
+    assert verify_password("Secret#123", stored) is False
+
+
+def test_unknown_user_check_costs_one_pooled_hash(monkeypatch):
+    # The dummy hash has the current cost, so rejecting an unknown user
+    # takes as long as a wrong password, and building it hashes nothing
+    assert not passwords.needs_rehash(passwords._DUMMY_HASH)
+    monkeypatch.setattr(passwords, "hash_password", lambda *args: pytest.fail("hashed outside the pool"))
+    checked = []
+    original = passwords.verify_password
+    monkeypatch.setattr(passwords, "verify_password", lambda *args: checked.append(args) or original(*args))
+    assert passwords.check_in_pool("Secret#123") == (False, False)
+    assert checked == [("Secret#123", passwords._DUMMY_HASH)]
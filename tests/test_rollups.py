@@ -0,0 +1,36 @@
+from expense_store import JsonLogExpenseStore
+from rollups import Rollups
+
+
+def _expense(n, username="asha"):
+    return {"id": f"e{n}", "Date": "2025-06-01", "Category": "Food", "Amount": float(n),
+            "amount_paise": n * 100, "Username": username, "group_id": None}
+
+
+def _add(rollups, store, record):
+    rollups.begin_add([record])
+    store.append_records([record])
+    rollups.end_add([record])
+
+
+def test_own_writes_are_applied_without_a_rebuild(data_dir):
+    store = JsonLogExpenseStore()
+    rollups = Rollups(store, str(data_dir / "expense_rollups.json"))
+    _add(rollups, store, _expense(1))
+    assert rollups.cells([("user", "asha")]) == [(("asha", None, "Food", "2025-06"), [100, 1, 100, 100])]
+    _add(rollups, store, _expense(2))
+    assert rollups.builds == 1
+    assert rollups.check() == []
+
+
+def test_foreign_write_before_ours_is_not_taken_as_applied(data_dir):
+    store = JsonLogExpenseStore()
+    rollups = Rollups(store, str(data_dir / "expense_rollups.json"))
+    _add(rollups, store, _expense(1))
+    rollups.cells([("user", "asha")])
+
+    # Another process appends to the same files
+    JsonLogExpenseStore().append_records([_expense(5)])
+    _add(rollups, store, _expense(2))
+    assert rollups.cells([("user", "asha")]) == [(("asha", None, "Food", "2025-06"), [800, 3, 100, 500])]
+    assert rollups.check() == []
@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+from settlement import EXACT_MAX_MEMBERS, SettlementLedger, settle
+
+
+def _apply(balances, transfers):
+    left = dict(balances)
+    for payer, payee, amount in transfers:
+        assert amount > 0
+        left[payer] += amount
+        left[payee] -= amount
+    return left
+
+
+def _partitions(items):
+    if not items:
+        yield []
+        return
+    first, rest = items[0], items[1:]
+    for partition in _partitions(rest):
+        yield [[first]] + partition
+        for i in range(len(partition)):
+            yield partition[:i] + [[first] + partition[i]] + partition[i + 1:]
+
+
+def _brute_force_minimum(balances):
+    """Fewest transfers: a zero-sum block of k members needs k - 1 of them,
+    so take the partition into zero-sum blocks with the most blocks"""
+    users = [u for u in balances if balances[u]]
+    most_blocks = max(
+        len(partition) for partition in _partitions(users)
+        if all(sum(balances[u] for u in block) == 0 for block in partition)
+    )
+    return len(users) - most_blocks
+
+
+def _random_balances(rng, n):
+    values = [rng.choice([-300, -200, -100, 100, 200, 300, 50, -50]) for _ in range(n - 1)]
+    values.append(-sum(values))
+    return {f"u{i}": value for i, value in enumerate(values)}
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_settle_is_minimal_on_small_groups(seed):
+    rng = random.Random(seed)
+    balances = _random_balances(rng, rng.randint(2, 8))
+    transfers = settle(balances)
+    assert all(amount == 0 for amount in _apply(balances, transfers).values())
+    assert len(transfers) == _brute_force_minimum(balances)
+
+
+def test_large_groups_settle_in_at_most_n_minus_one_transfers():
+    balances = _random_balances(random.Random(7), EXACT_MAX_MEMBERS * 3)
+    transfers = settle(balances)
+    assert all(amount == 0 for amount in _apply(balances, transfers).values())
+    assert len(transfers) <= len([b for b in balances.values() if b]) - 1
+
+
+def test_rounding_residue_goes_to_the_largest_opposite_balance():
+    # One paisa too much is owed to asha: ravi, the largest debtor, pays it
+    assert sorted(settle({"asha": 1000, "ravi": -600, "meera": -399})) == [
+        ("meera", "asha", 399), ("ravi", "asha", 601)]
+    assert settle({}) == []
+
+
+def test_ledger_records_and_nets_payments(data_dir):
+    ledger = SettlementLedger()
+    entries = ledger.record("g1", [("ravi", "asha", 600), ("meera", "asha", 0)])
+    ledger.record("g2", [("asha", "ravi", 100)])
+    assert [(e["From"], e["To"], e["amount_paise"]) for e in entries] == [("ravi", "asha", 600)]
+    assert ledger.net_paid("g1") == {"ravi": 600, "asha": -600}
+    assert ledger.remove([entries[0]["id"]]) == 1
+    assert ledger.net_paid("g1") == {}
+    assert ledger.pairs().values.tolist() == [["asha", "ravi", 100]]
@@ -0,0 +1,129 @@
+import random
+
+import pandas as pd
+import pytest
+
+from money import split_equal, split_paise
+from splits import _weight_units, build_group_ledger, build_pairwise_balances, make_split, parse_shares
+
+
+def test_parse_shares():
+    assert parse_shares("asha: 2, ravi: 1") == {"asha": "2", "ravi": "1"}
+    assert parse_shares("asha: 60\nravi : 40\n\n") == {"asha": "60", "ravi": "40"}
+    assert parse_shares("team: lead: 3") == {"team: lead": "3"}
+    assert parse_shares("") == {}
+    with pytest.raises(ValueError):
+        parse_shares("asha 2")
+    with pytest.raises(ValueError):
+        parse_shares(": 2")
+
+
+def test_make_split_validates_totals():
+    assert make_split("exact", {"asha": 10.5, "ravi": "4.50"}, 1500)["shares"] == {"asha": 1050, "ravi": 450}
+    with pytest.raises(ValueError):
+        make_split("exact", {"asha": 10, "ravi": 4}, 1500)
+    with pytest.raises(ValueError):
+        make_split("percent", {"asha": 60, "ravi": 30}, 1500)
+    with pytest.raises(ValueError):
+        make_split("weights", {"asha": "two"}, 1500)
+
+
+def _random_records(rng, count):
+    people = ["asha", "ravi", "meera", "john", "li"]
+    records = []
+    for _ in range(count):
+        record = {"Username": rng.choice(people), "amount_paise": rng.choice([1, 7, 100, 10001, -333])
+                  * rng.randint(1, 97)}
+        kind = rng.choice(["legacy", "equal", "weights", "percent", "exact"])
+        members = rng.sample(people, rng.randint(1, len(people)))
+        if kind == "weights":
+            record["split"] = {"type": "weights", "shares": {m: rng.choice([1, 1.5, 3]) for m in members}}
+        elif kind == "percent":
+            record["split"] = {"type": "percent", "shares": {m: 100 / len(members) for m in members}}
+        elif kind == "exact" and record["amount_paise"] > 0:
+            parts = split_equal(record["amount_paise"], len(members))
+            record["split"] = {"type": "exact", "shares": dict(zip(members, parts))}
+        elif kind == "equal":
+            record["split"] = {"type": "equal", "shares": {m: 1 for m in members}}
+        records.append(record)
+    return records
+
+
+def _reference_owed(records):
+    """Owed paise per user, one money.split_paise call per expense"""
+    spenders = sorted({r["Username"] for r in records})
+    owed = {}
+    for record in records:
+        spec = record.get("split")
+        if spec:
+            names = list(spec["shares"])
+            parts = split_paise(record["amount_paise"], _weight_units(spec["type"], list(spec["shares"].values())))
+        else:
+            names, parts = spenders, split_equal(record["amount_paise"], len(spenders))
+        assert sum(parts) == record["amount_paise"]
+        for name, part in zip(names, parts):
+            owed[name] = owed.get(name, 0) + part
+    return owed
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_group_ledger_shares_add_up_exactly(seed):
+    records = _random_records(random.Random(seed), 40)
+    ledger = build_group_ledger(records)
+    owed = dict(zip(ledger.users, ledger.owed.tolist()))
+    reference = _reference_owed(records)
+    assert {u: p for u, p in owed.items() if p} == {u: p for u, p in reference.items() if p}
+    assert int(ledger.owed.sum()) == sum(r["amount_paise"] for r in records)
+    assert int(ledger.net.sum()) == 0
+    pairs = ledger.pairs()
+    for user, net in zip(ledger.users, ledger.net.tolist()):
+        received = pairs.loc[pairs["payer"] == user, "paise"].sum()
+        owes = pairs.loc[pairs["beneficiary"] == user, "paise"].sum()
+        assert received - owes == net
+
+
+@pytest.mark.parametrize("split_type, shares", [
+    ("weights", {"asha": "nan", "ravi": 1}), ("weights", {"asha": "inf"}), ("percent", {"asha": "NaN"}),
+    ("percent", {"asha": "-inf", "ravi": "inf"}), ("exact", {"asha": "nan"}), ("exact", {"asha": float("inf")}),
+    ("exact", {"asha": "ten"}),
+])
+def test_make_split_rejects_non_finite_shares(split_type, shares):
+    with pytest.raises(ValueError, match="Shares must be numbers"):
+        make_split(split_type, shares, 1000)
+
+
+def test_make_split_rejects_weights_that_round_to_nothing():
+    with pytest.raises(ValueError, match="too small"):
+        make_split("weights", {"asha": 0.00001, "ravi": 0.00002}, 1000)
+    assert make_split("weights", {"asha": 0.0001, "ravi": 0.0002}, 1000)["shares"] == {"asha": 0.0001, "ravi": 0.0002}
+
+
+def test_unusable_spec_on_disk_is_split_equally():
+    records = [
+        {"Username": "asha", "amount_paise": 1000},
+        {"Username": "ravi", "amount_paise": 300,
+         "split": {"type": "weights", "shares": {"asha": float("nan"), "ravi": 1}}},
+        {"Username": "ravi", "amount_paise": 200, "split": {"type": "weights", "shares": {"asha": float("inf")}}},
+        {"Username": "asha", "amount_paise": 100, "split": {"type": "weights", "shares": {"ravi": 0.00001}}},
+    ]
+    ledger = build_group_ledger(records)
+    owed = dict(zip(ledger.users, ledger.owed.tolist()))
+    assert owed == {"asha": 800, "ravi": 800}
+    assert int(ledger.net.sum()) == 0
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_pairwise_balances_match_group_nets(seed):
+    rng = random.Random(seed)
+    ledgers = [build_group_ledger(_random_records(rng, rng.randint(0, 25))) for _ in range(4)]
+    extra = pd.DataFrame({"payer": ["asha", "zoe"], "beneficiary": ["zoe", "ravi"], "paise": [500, 120]})
+    balances = build_pairwise_balances(ledgers, extra)
+    assert int(balances.paise.sum()) == 0
+    expected = {"asha": 500, "zoe": -380, "ravi": -120}
+    for ledger in ledgers:
+        for user, net in zip(ledger.users, ledger.net.tolist()):
+            expected[user] = expected.get(user, 0) + net
+    for user, net in expected.items():
+        assert int(balances.for_user(user)["paise"].sum()) == net
+        for other in expected:
+            assert balances.between(user, other) == -balances.between(other, user)
@@ -0,0 +1,56 @@
+import contextvars
+import threading
+
+from unit_of_work import begin_unit_of_work, end_unit_of_work, invalidate, scoped, trace_read, unit_of_work
+
+
+def _counting_loader(calls, value="v"):
+    def load():
+        calls.append(1)
+        trace_read("users.json")
+        return value
+    return load
+
+
+def test_values_are_loaded_once_per_unit_and_dropped_on_write():
+    calls = []
+    with unit_of_work() as unit:
+        assert scoped(("users.json",), _counting_loader(calls)) == "v"
+        assert scoped(("users.json",), _counting_loader(calls)) == "v"
+        assert len(calls) == 1
+        invalidate("users.json")
+        scoped(("users.json",), _counting_loader(calls))
+        assert len(calls) == 2
+        assert unit.stats()["physical_reads"] == 2 and unit.stats()["hits"] == 1
+    # Outside a unit of work every call loads
+    scoped(("users.json",), _counting_loader(calls))
+    scoped(("users.json",), _counting_loader(calls))
+    assert len(calls) == 4
+
+
+def test_copies_keep_the_cached_value_intact():
+    with unit_of_work():
+        first = scoped(("groups.json",), lambda: {"g": []}, dict)
+        first["g2"] = []
+        assert scoped(("groups.json",), lambda: {}, dict) == {"g": []}
+
+
+def test_concurrent_reruns_have_separate_units():
+    results = {}
+    barrier = threading.Barrier(2)
+
+    def rerun(name):
+        calls = []
+        begin_unit_of_work()
+        scoped(("users.json",), _counting_loader(calls, name))
+        # Both sessions are inside their rerun at the same time
+        barrier.wait()
+        results[name] = (scoped(("users.json",), _counting_loader(calls, "other")), len(calls), end_unit_of_work())
+    threads = [threading.Thread(target=contextvars.copy_context().run, args=(rerun, name)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results["a"][:2] == ("a", 1) and results["b"][:2] == ("b", 1)
+    assert results["a"][2]["physical_reads"] == 1
+    assert end_unit_of_work() == {}
@@ -0,0 +1,71 @@
+import threading
+
+import expense_store
+from expense_store import JsonLogExpenseStore, ShardedExpenseStore, WriteCoalescer
+
+
+def _expense(n, month="06"):
+    return {"Date": f"2025-{month}-01", "Category": "Food", "Amount": float(n),
+            "Username": "asha", "group_id": None, "Description": f"e{n}"}
+
+
+def _submit_together(coalescer, records):
+    errors = []
+
+    def submit(record):
+        try:
+            coalescer.submit(record)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=submit, args=(record,)) for record in records]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return errors
+
+
+def _fail_once(monkeypatch, target, name, after=0):
+    original = getattr(target, name)
+    calls = []
+
+    def flaky(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == after + 1:
+            raise OSError("disk full")
+        return original(*args, **kwargs)
+    monkeypatch.setattr(target, name, flaky)
+
+
+def test_failed_fsync_mid_batch_does_not_duplicate(data_dir, monkeypatch):
+    store = JsonLogExpenseStore(compact_threshold=10 ** 6)
+    store.recover()
+    coalescer = WriteCoalescer(store.append_records, window=0.5, max_batch=3)
+    # The batch's bytes reach the log, then the fsync fails
+    _fail_once(monkeypatch, expense_store.os, "fsync")
+    assert _submit_together(coalescer, [_expense(n) for n in range(3)]) == []
+    descriptions = sorted(r["Description"] for r in store.load_records())
+    assert descriptions == ["e0", "e1", "e2"]
+    assert len(open(store.log_file).readlines()) == 3
+
+
+def test_torn_line_is_dropped_before_the_next_append(data_dir):
+    store = JsonLogExpenseStore(compact_threshold=10 ** 6)
+    store.recover()
+    store.append_records([_expense(0)])
+    with open(store.log_file, "a") as f:
+        f.write('{"Date": "2025-')
+    store.append_records([_expense(1)])
+    assert [r["Description"] for r in JsonLogExpenseStore().load_records()] == ["e0", "e1"]
+
+
+def test_partly_written_sharded_batch_does_not_duplicate(data_dir, monkeypatch):
+    store = ShardedExpenseStore(import_from=None)
+    coalescer = WriteCoalescer(store.append_records, window=0.5, max_batch=3)
+    # The June segment is written, then the July one fails
+    _fail_once(monkeypatch, JsonLogExpenseStore, "append_records", after=1)
+    records = [_expense(0, "06"), _expense(1, "07"), _expense(2, "06")]
+    assert _submit_together(coalescer, records) == []
+    reopened = ShardedExpenseStore(import_from=None)
+    descriptions = sorted(r["Description"] for r in reopened.load_records())
+    assert descriptions == ["e0", "e1", "e2"]
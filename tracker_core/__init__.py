@@ -0,0 +1,12 @@
+"""Headless core of the travel expense tracker
+
+Everything here runs without Streamlit: expenses, balances and
+settlements (tracker_core.expenses), users and groups
+(tracker_core.accounts) and batch statements (tracker_core.report).
+Failures raise the typed errors below; the Streamlit app (main.py,
+expense_logic, auth) turns them into messages.
+"""
+from passwords import TooManyAttempts
+from tracker_core.errors import NotFoundError, StorageError, TrackerError, ValidationError
+
+__all__ = ["NotFoundError", "StorageError", "TooManyAttempts", "TrackerError", "ValidationError"]
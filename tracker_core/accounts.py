@@ -0,0 +1,500 @@
+import json
+import os
+import re
+import copy
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from datetime import datetime
+from unit_of_work import scoped, invalidate, trace_read
+from instrumentation import instrumented
+from metrics import LOGINS, STORE_READ_BYTES, register_cache, timed
+from json_transaction import file_version, run_transaction, write_json
+from migrations import Migration, ensure_schema
+from passwords import TooManyAttempts, check_in_pool, hash_in_pool, hash_password
+from tracker_core.errors import NotFoundError, ValidationError, storage_errors
+
+
+# File to store user credentials and groups
+USERS_DB_FILE = "users.json"
+GROUPS_DB_FILE = "groups.json"
+
+def validate_password(password: str) -> tuple[bool, str]:
+    """
+    Validate password strength
+    Returns: (is_valid, error_message)
+    """
+    if len(password) < 8:
+        return False, "Password must be at least 8 characters long"
+    
+    if not re.search(r"[A-Z]", password):
+        return False, "Password must contain at least one uppercase letter"
+    
+    if not re.search(r"[a-z]", password):
+        return False, "Password must contain at least one lowercase letter"
+    
+    if not re.search(r"\d", password):
+        return False, "Password must contain at least one number"
+    
+    if not re.search(r"[!@#$%^&*(),.?\":{}|<>]", password):
+        return False, "Password must contain at least one special character"
+    
+    return True, ""
+
+def _initial_users() -> Dict:
+    return {
+        "swa u gou": {
+            "password": hash_password("swa123"),
+            "created_at": datetime.now().isoformat(),
+            "groups": []
+        }
+    }
+
+def _user_has_groups(username: str, user: Dict) -> Dict:
+    user.setdefault("groups", [])
+    return user
+
+def _group_has_member_lists(group_id: str, group: Dict) -> Dict:
+    group.setdefault("members", [])
+    group.setdefault("invites_pending", [])
+    return group
+
+AUTH_MIGRATIONS = [
+    Migration(1, USERS_DB_FILE, "every user has a groups list", _user_has_groups),
+    Migration(2, GROUPS_DB_FILE, "every group has members and invites_pending lists", _group_has_member_lists),
+]
+
+@storage_errors
+def init_db():
+    """Create missing database files and bring them to the current schema
+
+    Runs the migrations at most once per process; the readers and writers
+    below call it on first access, so importing this module does no I/O.
+    """
+    ensure_schema(AUTH_MIGRATIONS, {USERS_DB_FILE: _initial_users, GROUPS_DB_FILE: dict})
+
+@instrumented
+def _read_json(path: str) -> Dict:
+    trace_read(path)
+    with open(path, "r") as f:
+        STORE_READ_BYTES.inc(os.path.basename(path), amount=os.fstat(f.fileno()).st_size)
+        return json.load(f)
+
+@storage_errors
+def load_users() -> Dict:
+    """Load users from the JSON file (once per unit of work)"""
+    # Callers modify what they get, so each one receives its own copy
+    return scoped((USERS_DB_FILE,), lambda: get_user_directory().users, copy.deepcopy)
+
+@storage_errors
+def save_users(users: Dict):
+    """Save users to the JSON file"""
+    try:
+        write_json(USERS_DB_FILE, users)
+    finally:
+        invalidate(USERS_DB_FILE)
+
+@storage_errors
+def load_groups() -> Dict:
+    """Load groups from the JSON file (once per unit of work)"""
+    init_db()
+    return scoped((GROUPS_DB_FILE,), lambda: _read_json(GROUPS_DB_FILE), copy.deepcopy)
+
+@storage_errors
+def save_groups(groups: Dict):
+    """Save groups to the JSON file"""
+    try:
+        write_json(GROUPS_DB_FILE, groups)
+    finally:
+        invalidate(GROUPS_DB_FILE)
+
+class GroupIndex:
+    """Membership indexes over groups.json
+
+    group -> members and user -> groups / pending invites, as sets (dicts
+    where order matters), so the sidebar only touches the user's own groups
+    and membership checks are O(1). Built once per version of the file.
+    Readers use it without a lock, so it is never changed once published:
+    writers apply their change to a _copy() and swap the reference.
+    """
+
+    def __init__(self, groups: Dict, signature: Optional[Tuple] = None):
+        self.groups = groups
+        self.signature = signature
+        self.members: Dict[str, Set[str]] = {}
+        self.user_groups: Dict[str, Dict[str, None]] = {}
+        self.user_invites: Dict[str, Dict[str, None]] = {}
+        for group_id, group_info in groups.items():
+            self.members[group_id] = set(group_info.get("members", []))
+            for member in self.members[group_id]:
+                self.user_groups.setdefault(member, {})[group_id] = None
+            for invitee in group_info.get("invites_pending", []):
+                self.user_invites.setdefault(invitee, {})[group_id] = None
+
+    def _copy(self) -> "GroupIndex":
+        """Copy sharing the inner containers, which the methods below replace instead of changing"""
+        index = GroupIndex.__new__(GroupIndex)
+        index.groups = dict(self.groups)
+        index.signature = self.signature
+        index.members = dict(self.members)
+        index.user_groups = dict(self.user_groups)
+        index.user_invites = dict(self.user_invites)
+        return index
+
+    def add_group(self, group_id: str, group_info: Dict):
+        self.groups[group_id] = copy.deepcopy(group_info)
+        self.members[group_id] = set(group_info.get("members", []))
+        for member in self.members[group_id]:
+            self.user_groups[member] = {**self.user_groups.get(member, {}), group_id: None}
+        for invitee in group_info.get("invites_pending", []):
+            self.user_invites[invitee] = {**self.user_invites.get(invitee, {}), group_id: None}
+
+    def add_invite(self, group_id: str, username: str):
+        group_info = dict(self.groups[group_id])
+        group_info["invites_pending"] = group_info["invites_pending"] + [username]
+        self.groups[group_id] = group_info
+        self.user_invites[username] = {**self.user_invites.get(username, {}), group_id: None}
+
+    def add_member(self, group_id: str, username: str):
+        group_info = dict(self.groups[group_id])
+        group_info["invites_pending"] = list(group_info["invites_pending"])
+        if username in group_info["invites_pending"]:
+            group_info["invites_pending"].remove(username)
+        group_info["members"] = group_info["members"] + [username]
+        self.groups[group_id] = group_info
+        invites = dict(self.user_invites.get(username, {}))
+        invites.pop(group_id, None)
+        self.user_invites[username] = invites
+        self.members[group_id] = self.members[group_id] | {username}
+        self.user_groups[username] = {**self.user_groups.get(username, {}), group_id: None}
+
+    def is_member(self, group_id: str, username: str) -> bool:
+        return username in self.members.get(group_id, ())
+
+    def is_invited(self, group_id: str, username: str) -> bool:
+        return group_id in self.user_invites.get(username, {})
+
+_group_index: Optional[GroupIndex] = None
+_group_index_lock = threading.Lock()
+
+def get_group_index() -> GroupIndex:
+    """Current membership index, rebuilt only when groups.json changed on disk"""
+    global _group_index
+    signature = file_version(GROUPS_DB_FILE)
+    with _group_index_lock:
+        if _group_index is None or _group_index.signature != signature:
+            init_db()
+            signature = file_version(GROUPS_DB_FILE)
+            _group_index = GroupIndex(_read_json(GROUPS_DB_FILE) if signature else {}, signature)
+        return _group_index
+
+def _update_group_index(tx, change):
+    """Apply ``change`` to the index after a committed write to groups.json
+
+    If the index was not built from the version the transaction read, it
+    is dropped and rebuilt from disk on next use instead.
+    """
+    global _group_index
+    with _group_index_lock:
+        index = _group_index
+        if index is None:
+            return
+        if index.signature != tx.versions.get(GROUPS_DB_FILE):
+            _group_index = None
+            return
+        # Readers holding the old index keep a consistent view of it
+        updated = index._copy()
+        change(updated)
+        updated.signature = tx.committed_versions[GROUPS_DB_FILE]
+        _group_index = updated
+
+class UserDirectory:
+    """Process-wide copy of users.json for lookups by username
+
+    Loaded once and reloaded only when the file's version changes, which
+    costs one stat per lookup instead of parsing the whole file. Commits
+    made through this module hand over the data they wrote, so our own
+    writes never trigger a reload. Counts hits, reloads and time spent.
+    """
+
+    def __init__(self):
+        self.users: Dict[str, Dict] = {}
+        self.version = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.reloads = 0
+        self.lookup_seconds = 0.0
+        self.reload_seconds = 0.0
+
+    def _refresh(self) -> bool:
+        """Reload if the file changed; True if the cached copy was current"""
+        version = file_version(USERS_DB_FILE)
+        if self._loaded and version == self.version:
+            return True
+        init_db()
+        version = file_version(USERS_DB_FILE)
+        with self._lock:
+            if self._loaded and version == self.version:
+                return True
+            started = time.perf_counter()
+            self.users = _read_json(USERS_DB_FILE) if version else {}
+            self.version = version
+            self._loaded = True
+            self.reloads += 1
+            self.reload_seconds += time.perf_counter() - started
+            return False
+
+    def get(self, username: str) -> Optional[Dict]:
+        """The user's record (shared, do not modify), or None"""
+        started = time.perf_counter()
+        hit = self._refresh()
+        user = self.users.get(username)
+        # Sessions look users up concurrently; += on shared counters is not atomic
+        with self._lock:
+            self.hits += hit
+            self.lookups += 1
+            self.lookup_seconds += time.perf_counter() - started
+        return user
+
+    def exists(self, username: str) -> bool:
+        return self.get(username) is not None
+
+    def committed(self, tx):
+        """Take over the users dict a transaction just committed"""
+        if USERS_DB_FILE in tx.committed_versions:
+            with self._lock:
+                self.users = tx.writes[USERS_DB_FILE]
+                self.version = tx.committed_versions[USERS_DB_FILE]
+                self._loaded = True
+
+    def stats(self) -> Dict:
+        lookups = max(self.lookups, 1)
+        return {
+            "users": len(self.users),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "reloads": self.reloads,
+            "avg_lookup_ms": round(1000 * self.lookup_seconds / lookups, 4),
+            "reload_seconds": round(self.reload_seconds, 4)
+        }
+
+_user_directory = UserDirectory()
+register_cache("user_directory", lambda: (_user_directory.hits, _user_directory.lookups))
+
+def get_user_directory() -> UserDirectory:
+    """Return the process-wide user directory, reloaded if users.json changed"""
+    _user_directory._refresh()
+    return _user_directory
+
+@storage_errors
+def create_user(username: str, password: str):
+    """Create a new user
+
+    Raises ValidationError for a weak password or a taken username and
+    TooManyAttempts when every hashing slot is busy.
+    """
+    # Validate password strength
+    is_valid, error_message = validate_password(password)
+    if not is_valid:
+        raise ValidationError(error_message)
+    
+    if _user_directory.exists(username):
+        raise ValidationError("Username already exists")
+    
+    password_hash = hash_in_pool(password)
+    
+    def add_user(tx):
+        users = tx.read(USERS_DB_FILE, dict)
+        if username in users:
+            return False
+        users[username] = {
+            "password": password_hash,
+            "created_at": datetime.now().isoformat(),
+            "groups": []  # List of group IDs the user belongs to
+        }
+        tx.write(USERS_DB_FILE, users)
+        return True
+    
+    created, tx = run_transaction(add_user)
+    _user_directory.committed(tx)
+    if not created:
+        raise ValidationError("Username already exists")
+
+@timed("authenticate_user")
+@storage_errors
+def authenticate_user(username: str, password: str) -> bool:
+    """Authenticate user credentials
+
+    Raises TooManyAttempts when every hashing slot is busy. A hash made
+    with older settings (or legacy SHA-256) is replaced after a
+    successful login.
+    """
+    user = _user_directory.get(username)
+    stored = user["password"] if user is not None else None
+    try:
+        matches, rehash = check_in_pool(password, stored)
+    except TooManyAttempts:
+        LOGINS.inc("throttled")
+        raise
+    LOGINS.inc("success" if matches else "failure")
+    if matches and rehash:
+        _upgrade_password_hash(username, password, stored)
+    return matches
+
+def _upgrade_password_hash(username: str, password: str, old_hash: str):
+    try:
+        new_hash = hash_in_pool(password)
+        
+        def replace_hash(tx):
+            users = tx.read(USERS_DB_FILE, dict)
+            # Leave it alone if the password changed in the meantime
+            if users.get(username, {}).get("password") != old_hash:
+                return False
+            users[username]["password"] = new_hash
+            tx.write(USERS_DB_FILE, users)
+            return True
+        
+        _, tx = run_transaction(replace_hash)
+        _user_directory.committed(tx)
+    except Exception:
+        # The old hash still works; the upgrade is retried at the next login
+        pass
+
+@storage_errors
+def create_group(name: str, creator_username: str, description: str = "") -> str:
+    """Create a new expense group and return its ID"""
+    init_db()
+    
+    def add_group(tx):
+        groups = tx.read(GROUPS_DB_FILE, dict)
+        users = tx.read(USERS_DB_FILE, dict)
+        if creator_username not in users:
+            return ""
+        
+        # Generate a unique group ID
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        group_id = f"group_{timestamp}_{len(groups)}"
+        
+        # Create the group
+        groups[group_id] = {
+            "name": name,
+            "description": description,
+            "creator": creator_username,
+            "members": [creator_username],
+            "created_at": datetime.now().isoformat(),
+            "invites_pending": []
+        }
+        
+        # Add group to user's groups
+        users[creator_username].setdefault("groups", []).append(group_id)
+        
+        # Both files are replaced together or not at all
+        tx.write(GROUPS_DB_FILE, groups)
+        tx.write(USERS_DB_FILE, users)
+        return group_id
+    
+    group_id, tx = run_transaction(add_group)
+    _user_directory.committed(tx)
+    if not group_id:
+        raise NotFoundError("Creator user not found")
+    _update_group_index(tx, lambda index: index.add_group(group_id, tx.writes[GROUPS_DB_FILE][group_id]))
+    return group_id
+
+@storage_errors
+def invite_to_group(group_id: str, username: str, inviter_username: str) -> bool:
+    """Invite a user to a group"""
+    index = get_group_index()
+    if (not index.is_member(group_id, inviter_username) or
+        index.is_member(group_id, username) or
+        index.is_invited(group_id, username) or
+        not _user_directory.exists(username)):
+        return False
+    
+    def add_invite(tx):
+        groups = tx.read(GROUPS_DB_FILE, dict)
+        group_info = groups.get(group_id)
+        if (group_info is None or
+            inviter_username not in group_info["members"] or
+            username in group_info["members"] or
+            username in group_info["invites_pending"] or
+            username not in tx.read(USERS_DB_FILE, dict)):
+            return False
+        group_info["invites_pending"].append(username)
+        tx.write(GROUPS_DB_FILE, groups)
+        return True
+    
+    invited, tx = run_transaction(add_invite)
+    if invited:
+        _update_group_index(tx, lambda index: index.add_invite(group_id, username))
+    return invited
+
+@storage_errors
+def accept_group_invite(group_id: str, username: str) -> bool:
+    """Accept a group invitation"""
+    if not get_group_index().is_invited(group_id, username):
+        return False
+    
+    def join(tx):
+        groups = tx.read(GROUPS_DB_FILE, dict)
+        users = tx.read(USERS_DB_FILE, dict)
+        if (group_id not in groups or
+            username not in users or
+            username not in groups[group_id]["invites_pending"]):
+            return False
+        
+        # Add user to group
+        groups[group_id]["members"].append(username)
+        groups[group_id]["invites_pending"].remove(username)
+        
+        # Add group to user's groups
+        users[username].setdefault("groups", []).append(group_id)
+        
+        # Both files are replaced together or not at all
+        tx.write(GROUPS_DB_FILE, groups)
+        tx.write(USERS_DB_FILE, users)
+        return True
+    
+    joined, tx = run_transaction(join)
+    _user_directory.committed(tx)
+    if joined:
+        _update_group_index(tx, lambda index: index.add_member(group_id, username))
+    return joined
+
+def _group_with_id(index: GroupIndex, group_id: str) -> Dict:
+    group_info = copy.deepcopy(index.groups[group_id])
+    group_info["id"] = group_id
+    return group_info
+
+@storage_errors
+def get_user_groups(username: str) -> List[Dict]:
+    """Get all groups a user belongs to"""
+    index = get_group_index()
+    return [_group_with_id(index, group_id) for group_id in index.user_groups.get(username, {})]
+
+@storage_errors
+def get_user_group(username: str, group_id: str) -> Optional[Dict]:
+    """A single group, if the user belongs to it"""
+    index = get_group_index()
+    if not index.is_member(group_id, username):
+        return None
+    return _group_with_id(index, group_id)
+
+@storage_errors
+def get_user_pending_invites(username: str) -> List[Dict]:
+    """Get all pending group invites for a user"""
+    index = get_group_index()
+    
+    pending_invites = []
+    for group_id in index.user_invites.get(username, {}):
+        group_info = index.groups[group_id]
+        invite_info = {
+            "group_id": group_id,
+            "group_name": group_info["name"],
+            "creator": group_info["creator"],
+            "description": group_info.get("description", "")
+        }
+        pending_invites.append(invite_info)
+    
+    return pending_invites
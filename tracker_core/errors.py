@@ -0,0 +1,33 @@
+import functools
+import sqlite3
+
+from json_transaction import ConflictError
+
+
+class TrackerError(Exception):
+    """Base class of the errors tracker_core raises"""
+
+
+class StorageError(TrackerError):
+    """Reading or writing the data files or database failed"""
+
+
+class NotFoundError(TrackerError, LookupError):
+    """A user, group or expense that the call needs does not exist"""
+
+
+class ValidationError(TrackerError, ValueError):
+    """The caller passed values the operation cannot accept"""
+
+
+def storage_errors(fn):
+    """Re-raise failures of the underlying files and database as StorageError"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except TrackerError:
+            raise
+        except (OSError, ValueError, sqlite3.Error, ConflictError) as e:
+            raise StorageError(str(e)) from e
+    return wrapper
@@ -0,0 +1,620 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from expense_store import get_store, new_expense_id
+from expense_cache import FrameCache
+from rollups import get_rollups, owner_of
+from settlement import get_ledger, settle
+from money import paise_column, to_paise, to_rupees
+from splits import (
+    GroupLedger, PairwiseBalances, build_group_ledger, build_pairwise_balances, describe_split, make_split,
+    parse_shares
+)
+from unit_of_work import scoped, invalidate, trace_read
+from instrumentation import instrumented, span
+from metrics import register_cache, timed
+from tracker_core.errors import NotFoundError, ValidationError, storage_errors
+
+# Parsed frames shared by every session, keyed by the get_expenses filters
+_frame_cache = FrameCache(maxsize=64)
+# Expanded split ledgers per group, shared read-only
+_ledger_cache = FrameCache(maxsize=32, copy=False)
+register_cache("expense_frames", lambda: (_frame_cache.hits, _frame_cache.hits + _frame_cache.misses))
+register_cache("group_ledgers", lambda: (_ledger_cache.hits, _ledger_cache.hits + _ledger_cache.misses))
+# User x user balances across every group, rebuilt when the store version
+# changes. Once a rebuild has taken longer than PAIRWISE_BACKGROUND_AFTER
+# seconds, the previous matrix is served while a thread builds the next one.
+PAIRWISE_BACKGROUND_AFTER = 0.5
+_pairwise = {"balances": None, "version": None, "seconds": 0.0, "building": None}
+_pairwise_lock = threading.Lock()
+
+# Low-cardinality text columns stored as pandas categoricals
+CATEGORICAL_COLUMNS = ["Category", "Username", "Location", "group_id"]
+# Format add_expense writes into the Date field
+DATE_FORMAT = "%Y-%m-%d"
+EMPTY_STATS = {
+    "total_spent": 0,
+    "avg_expense": 0,
+    "num_transactions": 0,
+    "top_category": "N/A",
+    "this_month_total": 0,
+    "last_month_total": 0
+}
+
+def _expenses_changed():
+    """Drop everything derived from expenses after a write"""
+    _frame_cache.invalidate()
+    _ledger_cache.invalidate()
+    invalidate("expenses")
+    invalidate("rollups")
+    invalidate("ledger")
+    invalidate("pairwise")
+
+@storage_errors
+def init_expenses_file():
+    """Initialize the expense store if it doesn't exist
+
+    get_store() already does this when it opens the store; call it to do
+    the work up front, e.g. before serving.
+    """
+    get_store().recover()
+
+@storage_errors
+def load_expenses() -> List[Dict]:
+    """Load every expense record from the expense store"""
+    return get_store().load_records()
+
+@storage_errors
+def save_expenses(expenses: List[Dict]):
+    """Replace the contents of the expense store"""
+    get_store().replace_records(expenses)
+    _expenses_changed()
+    get_rollups().invalidate()
+
+@timed("add_expense")
+@storage_errors
+def add_expense(expense_data: Dict) -> str:
+    """Add a new expense to the expense store and return its ID"""
+    # Add timestamp to expense
+    expense_data["timestamp"] = datetime.now().isoformat()
+
+    # Ensure group_id is None for personal expenses
+    if "group_id" not in expense_data:
+        expense_data["group_id"] = None
+    expense_data.setdefault("id", new_expense_id())
+    # Exact integer amount used by every aggregation
+    expense_data["amount_paise"] = to_paise(expense_data.get("Amount"))
+
+    # Rollups apply the new row once the store has it
+    rollups = get_rollups()
+    rollups.begin_add([expense_data])
+    succeeded = False
+    try:
+        get_store().append_record(expense_data)
+        succeeded = True
+    finally:
+        rollups.end_add([expense_data], succeeded)
+    _expenses_changed()
+    return expense_data["id"]
+
+def _empty_expense_frame() -> pd.DataFrame:
+    """Zero-row frame with the usual columns, so callers can still select them"""
+    return pd.DataFrame({
+        "Date": pd.Series(dtype="datetime64[ns]"),
+        "Category": pd.Series(dtype="category"),
+        "Amount": pd.Series(dtype="float64"),
+        "Location": pd.Series(dtype="category"),
+        "Description": pd.Series(dtype="object"),
+        "Username": pd.Series(dtype="category"),
+        "group_id": pd.Series(dtype="category"),
+        "amount_paise": pd.Series(dtype="int64")
+    })
+
+@instrumented
+def build_expense_frame(expenses: List[Dict]) -> pd.DataFrame:
+    """Turn expense records into the DataFrame returned by get_expenses"""
+    if not expenses:
+        return _empty_expense_frame()
+
+    df = pd.DataFrame(expenses)
+    if df.empty:
+        return df
+
+    # Convert date strings to datetime with the known format instead of inferring it
+    try:
+        df["Date"] = pd.to_datetime(df["Date"], format=DATE_FORMAT)
+    except (ValueError, TypeError):
+        df["Date"] = pd.to_datetime(df["Date"])
+
+    # Handle group_id field
+    if "group_id" not in df.columns:
+        df["group_id"] = None
+
+    # Dictionary-encode repeated strings: one copy per distinct value plus small integer codes
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    if "timestamp" in df.columns:
+        df["timestamp"] = pd.to_datetime(df["timestamp"], format="ISO8601")
+    if "split" in df.columns:
+        # Readable text instead of nested dicts, which tables cannot show
+        df["split"] = df["split"].map(describe_split).astype("category")
+
+    # Exact integer paise for arithmetic (stored, or derived for older records)
+    # plus float64 rupees for display
+    paise = paise_column(df["Amount"])
+    if "amount_paise" in df.columns:
+        paise = pd.to_numeric(df["amount_paise"]).fillna(paise)
+    df["amount_paise"] = paise.astype("int64")
+    df["Amount"] = df["amount_paise"] / 100
+
+    return df
+
+@storage_errors
+def get_frame_memory_report(username: str = None, group_id: str = None) -> Dict:
+    """Compare the memory of a plain object-dtype frame with the compact one get_expenses builds"""
+    expenses = get_store().query(username, group_id)
+    plain = pd.DataFrame(expenses)
+    if not plain.empty:
+        plain["Date"] = pd.to_datetime(plain["Date"])
+    compact = build_expense_frame(expenses)
+
+    before = int(plain.memory_usage(deep=True).sum())
+    after = int(compact.memory_usage(deep=True).sum())
+    return {
+        "rows": len(compact),
+        "before_bytes": before,
+        "after_bytes": after,
+        "reduction": round(before / after, 2) if after else 0.0,
+        "columns_before": plain.memory_usage(deep=True).to_dict(),
+        "columns_after": compact.memory_usage(deep=True).to_dict()
+    }
+
+def get_cache_stats() -> Dict:
+    """Hit/miss counters of the get_expenses frame cache"""
+    return _frame_cache.stats()
+
+def date_key(value) -> Optional[str]:
+    """Normalise a date, datetime or string to the stored YYYY-MM-DD form"""
+    if value is None:
+        return None
+    return pd.Timestamp(value).strftime(DATE_FORMAT)
+
+def month_bounds(today=None) -> Tuple[str, str, str]:
+    """First day of last month, this month and next month as YYYY-MM-DD strings"""
+    this_month_start = pd.Timestamp(today or pd.Timestamp.now()).normalize().replace(day=1)
+    last_month_start = this_month_start - pd.DateOffset(months=1)
+    next_month_start = this_month_start + pd.DateOffset(months=1)
+    return date_key(last_month_start), date_key(this_month_start), date_key(next_month_start)
+
+def expenses_between(df: pd.DataFrame, start_date=None, end_date=None) -> pd.DataFrame:
+    """Rows of an expense frame dated on or after start_date and before end_date
+
+    Lets month cards slice the frame already loaded instead of querying
+    the store again for each month.
+    """
+    if df.empty or "Date" not in df.columns:
+        return df
+    mask = pd.Series(True, index=df.index)
+    if start_date:
+        mask &= df["Date"] >= pd.Timestamp(start_date)
+    if end_date:
+        mask &= df["Date"] < pd.Timestamp(end_date)
+    return df[mask]
+
+def _total_rupees(df: pd.DataFrame) -> float:
+    paise = df["amount_paise"] if "amount_paise" in df.columns else paise_column(df["Amount"])
+    return to_rupees(int(paise.sum()))
+
+def personal_metrics(df: pd.DataFrame, today=None) -> Dict:
+    """Figures behind the personal dashboard cards, from the user's expense frame
+
+    The month frames are slices of ``df``, so no further reads are needed.
+    """
+    last_month_start, this_month_start, next_month_start = month_bounds(today)
+    this_month = expenses_between(df, this_month_start, next_month_start)
+    last_month = expenses_between(df, last_month_start, this_month_start)
+    top_category, top_expenses = None, df
+    if not df.empty:
+        top_category = df["Category"].mode()[0]
+        top_expenses = df[df["Category"] == top_category]
+    return {
+        "total_spent": _total_rupees(df) if not df.empty else 0.0,
+        "this_month": this_month,
+        "this_month_total": _total_rupees(this_month) if not this_month.empty else 0.0,
+        "last_month": last_month,
+        "last_month_total": _total_rupees(last_month) if not last_month.empty else 0.0,
+        "top_category": top_category,
+        "top_category_expenses": top_expenses,
+        "top_category_amount": _total_rupees(top_expenses) if top_category is not None else 0.0
+    }
+
+def _load_expense_frame(username: str, group_id: str, start_date: str, end_date: str) -> pd.DataFrame:
+    store = get_store()
+    key = (username, group_id, start_date, end_date)
+    # Take the version before reading so a concurrent write forces a reload
+    version = store.query_version(username, group_id, start_date, end_date)
+    df = _frame_cache.get(key, version)
+    if df is not None:
+        return df
+
+    # Date ranges let the store skip segments outside the range
+    trace_read("expenses")
+    with span("expense_store.query") as frame:
+        records = store.query(username, group_id, start_date, end_date)
+        if frame:
+            frame.rows = len(records)
+    df = build_expense_frame(records)
+    _frame_cache.put(key, version, df)
+    return df
+
+@timed("get_expenses")
+@storage_errors
+def get_expenses(username: str = None, group_id: str = None,
+                 start_date=None, end_date=None) -> pd.DataFrame:
+    """Get expenses as a pandas DataFrame
+
+    Args:
+        username: If provided, get personal expenses for this user
+        group_id: If provided, get expenses for this group
+        start_date: If provided, only expenses on or after this date
+        end_date: If provided, only expenses before this date
+    """
+    start_date, end_date = date_key(start_date), date_key(end_date)
+    # Within a unit of work the same query is answered once per rerun
+    return scoped(
+        ("expenses", username, group_id, start_date, end_date),
+        lambda: _load_expense_frame(username, group_id, start_date, end_date),
+        pd.DataFrame.copy
+    )
+
+def _rollup_cells(owners: List[Tuple[str, str]]) -> List[Tuple[tuple, tuple]]:
+    """Rollup cells of the owners, fetched once per owner and unit of work"""
+    cells = []
+    for owner in owners:
+        cells.extend(scoped(
+            ("rollups", owner),
+            lambda: [(key, tuple(cell)) for key, cell in get_rollups().cells([owner])]
+        ))
+    return cells
+
+def calculate_summary(df: pd.DataFrame) -> Tuple[float, pd.DataFrame]:
+    """Calculate summary statistics from expenses"""
+    if df.empty:
+        return 0, pd.DataFrame()
+
+    paise = df["amount_paise"] if "amount_paise" in df.columns else paise_column(df["Amount"])
+    total = int(paise.sum())
+    summary = paise.groupby(df["Category"], observed=True).sum().sort_values(ascending=False)
+    summary_df = pd.DataFrame({
+        "Total Amount": summary / 100,
+        "Percentage": (summary / total * 100).round(2) if total else 0.0
+    })
+    return to_rupees(total), summary_df
+
+def _member_paise(group_id: str) -> Dict[str, List[int]]:
+    """Paise spent and number of expenses per member, from the group's rollup cells"""
+    totals = {}
+    for (username, _, _, _), (amount, count, _, _) in _rollup_cells([("group", group_id)]):
+        member = totals.setdefault(username, [0, 0])
+        member[0] += amount
+        member[1] += count
+    return totals
+
+@timed("get_group_member_summary")
+@storage_errors
+def get_group_member_summary(group_id: str) -> pd.DataFrame:
+    """Calculate how much each member has spent in the group"""
+    totals = _member_paise(group_id)
+    if not totals:
+        return pd.DataFrame()
+
+    usernames = sorted(totals)
+    index = pd.Index(usernames, name="Username")
+    spent = pd.Series([totals[u][0] for u in usernames], index=index, dtype="int64")
+    counts = pd.Series([totals[u][1] for u in usernames], index=index, dtype="int64")
+    member_summary = pd.DataFrame({
+        "Total Spent": spent / 100,
+        "Number of Expenses": counts,
+        "Average Expense": (spent / counts / 100).round(2)
+    })
+
+    # Calculate percentage of total
+    total_spent = int(spent.sum())
+    if total_spent > 0:
+        member_summary["Percentage of Total"] = (spent / total_spent * 100).round(2)
+    else:
+        member_summary["Percentage of Total"] = 0
+
+    return member_summary
+
+def _load_group_ledger(group_id: str) -> GroupLedger:
+    store = get_store()
+    version = store.query_version(None, group_id)
+    ledger = _ledger_cache.get(group_id, version)
+    if ledger is None:
+        trace_read("expenses")
+        ledger = build_group_ledger(store.query(group_id=group_id))
+        _ledger_cache.put(group_id, version, ledger)
+    return ledger
+
+@storage_errors
+def get_group_ledger(group_id: str) -> GroupLedger:
+    """Paid/owed ledger of a group with every expense's split applied"""
+    return scoped(("ledger", group_id), lambda: _load_group_ledger(group_id))
+
+def get_group_participants(group_id: str) -> List[str]:
+    """Everyone who paid for or shares in a group expense, in name order"""
+    return sorted(get_group_ledger(group_id).users, key=str)
+
+def _pairwise_version() -> tuple:
+    return (get_store().version(), get_ledger().store.version())
+
+def _build_pairwise_balances(version: tuple) -> PairwiseBalances:
+    started = time.perf_counter()
+    # One pass over the expenses, bucketed by group so each group's splits
+    # (and its "everyone who paid" default) apply within that group only
+    trace_read("expenses")
+    by_group = {}
+    for record in get_store().query():
+        if record.get("group_id") is not None:
+            by_group.setdefault(record["group_id"], []).append(record)
+    group_ledgers = [build_group_ledger(records) for records in by_group.values()]
+    balances = build_pairwise_balances(group_ledgers, get_ledger().pairs())
+    with _pairwise_lock:
+        _pairwise.update(balances=balances, version=version, seconds=time.perf_counter() - started)
+    return balances
+
+def _rebuild_pairwise_in_background(version: tuple):
+    try:
+        _build_pairwise_balances(version)
+    finally:
+        with _pairwise_lock:
+            _pairwise["building"] = None
+
+def _load_pairwise_balances() -> Tuple[PairwiseBalances, bool]:
+    version = _pairwise_version()
+    with _pairwise_lock:
+        balances, current = _pairwise["balances"], _pairwise["version"] == version
+        slow = _pairwise["seconds"] > PAIRWISE_BACKGROUND_AFTER
+        if balances is not None and not current and slow:
+            if _pairwise["building"] is None:
+                _pairwise["building"] = threading.Thread(
+                    target=_rebuild_pairwise_in_background, args=(version,), daemon=True
+                )
+                _pairwise["building"].start()
+            return balances, False
+    if balances is not None and current:
+        return balances, True
+    return _build_pairwise_balances(version), True
+
+@storage_errors
+def get_pairwise_balances() -> Tuple[PairwiseBalances, bool]:
+    """Net balance between every pair of users across all groups and settlements
+
+    Returns the balances and whether they include every write so far (False
+    while a slow rebuild runs in the background).
+    """
+    return scoped(("pairwise",), _load_pairwise_balances)
+
+@timed("get_friend_balances")
+def get_friend_balances(username: str) -> pd.DataFrame:
+    """What each person owes ``username`` (positive) or is owed by them (negative), across all groups"""
+    balances, current = get_pairwise_balances()
+    rows = balances.for_user(username)
+    friends = pd.DataFrame({
+        "Friend": rows["friend"],
+        "Net Balance": rows["paise"] / 100,
+        "net_paise": rows["paise"]
+    })
+    friends = friends.sort_values("Net Balance", ascending=False, kind="stable").reset_index(drop=True)
+    # Tells the view the latest writes are still being folded in
+    friends.attrs["stale"] = not current
+    return friends
+
+def friend_totals(friends: pd.DataFrame) -> Tuple[float, float]:
+    """(owed to the user, owed by the user) in rupees, from get_friend_balances"""
+    if friends.empty:
+        return 0.0, 0.0
+    paise = friends["net_paise"]
+    return to_rupees(int(paise[paise > 0].sum())), to_rupees(int(-paise[paise < 0].sum()))
+
+def split_from_form(split_type: Optional[str], split_with: List[str], shares_text: str, amount) -> Optional[Dict]:
+    """Split spec from the group expense form; None for the default equal split
+
+    An equal split is among ``split_with`` (or the names in ``shares_text``);
+    other types parse ``shares_text``. Raises ValidationError with a message
+    for the user.
+    """
+    if not split_type:
+        return None
+    try:
+        if split_type == "equal":
+            shares = {name: 1 for name in split_with} or parse_shares(shares_text)
+        else:
+            shares = parse_shares(shares_text)
+        return make_split(split_type, shares, to_paise(amount))
+    except ValueError as e:
+        raise ValidationError(str(e)) from e
+
+def balances_from_ledger(ledger: GroupLedger, net_paid: Dict[str, int]) -> pd.DataFrame:
+    """Per-member balance table of a group ledger plus its recorded settlements"""
+    if not ledger.users:
+        return pd.DataFrame()
+
+    # Paid and owed come from each expense's split (equal among
+    # everyone who paid for expenses without one), in whole paise
+    order = np.argsort(np.array(ledger.users, dtype=str), kind="stable")
+    usernames = [ledger.users[i] for i in order]
+    spent = ledger.paid[order]
+    fair_share = ledger.owed[order]
+
+    # Recorded settlements: paying someone back raises your balance
+    settled = np.array([net_paid.get(u, 0) for u in usernames], dtype=np.int64)
+    net = spent - fair_share + settled
+
+    # Calculate how much each person owes or is owed
+    return pd.DataFrame({
+        "Username": usernames,
+        "Total Spent": spent / 100,
+        "Fair Share": fair_share / 100,
+        "Settled": settled / 100,
+        "Net Balance": net / 100,
+        "net_paise": net
+    }, index=pd.Index(usernames, name="Username"))
+
+@timed("calculate_group_balances")
+@storage_errors
+def calculate_group_balances(group_id: str) -> pd.DataFrame:
+    """Calculate who owes what to whom in the group"""
+    ledger = get_group_ledger(group_id)
+    if not ledger.users:
+        return pd.DataFrame()
+    net_paid = scoped(("settlements", group_id), lambda: get_ledger().net_paid(group_id))
+    return balances_from_ledger(ledger, net_paid)
+
+def plan_from_balances(balances: pd.DataFrame) -> pd.DataFrame:
+    """Transfers (From, To, Amount) that bring a balance table to zero"""
+    if balances.empty:
+        return pd.DataFrame(columns=["From", "To", "Amount"])
+
+    transfers = settle(dict(zip(balances["Username"], balances["net_paise"])))
+    return pd.DataFrame(
+        [(payer, payee, to_rupees(amount)) for payer, payee, amount in transfers],
+        columns=["From", "To", "Amount"]
+    )
+
+@timed("get_settlement_plan")
+def get_settlement_plan(group_id: str) -> pd.DataFrame:
+    """Transfers that settle the group's outstanding balances"""
+    return plan_from_balances(calculate_group_balances(group_id))
+
+@storage_errors
+def record_settlements(group_id: str, transfers: pd.DataFrame) -> int:
+    """Record transfers (From, To, Amount) as paid so they count in future balances
+
+    Returns the number of ledger entries written.
+    """
+    rows = [
+        (row["From"], row["To"], to_paise(row["Amount"]))
+        for _, row in transfers.iterrows()
+    ]
+    recorded = get_ledger().record(group_id, rows)
+    invalidate("settlements")
+    invalidate("pairwise")
+    return len(recorded)
+
+@storage_errors
+def get_settlement_history(group_id: str) -> pd.DataFrame:
+    """Settlements recorded for the group, newest first"""
+    entries = get_ledger().entries(group_id)
+    if not entries:
+        return pd.DataFrame(columns=["Date", "From", "To", "Amount"])
+
+    history = pd.DataFrame(entries)
+    return history.sort_values("timestamp", ascending=False)[["Date", "From", "To", "Amount", "id"]]
+
+def _stats_from_rollups(owners: List[Tuple[str, str]]) -> Optional[Dict]:
+    """Expense stats from rollup cells, O(categories x months) instead of O(expenses)"""
+    last_month_start, this_month_start, _ = month_bounds()
+    total = count = this_month = last_month = 0
+    by_category = {}
+    for (_, _, category, month), (amount, cell_count, _, _) in _rollup_cells(owners):
+        total += amount
+        count += cell_count
+        by_category[category] = by_category.get(category, 0) + amount
+        if month == this_month_start[:7]:
+            this_month += amount
+        elif month == last_month_start[:7]:
+            last_month += amount
+    if count == 0:
+        return None
+    return {
+        "total_spent": to_rupees(total),
+        "avg_expense": total / count / 100,
+        "num_transactions": count,
+        "top_category": max(sorted(by_category, key=str), key=lambda c: by_category[c]),
+        "this_month_total": to_rupees(this_month),
+        "last_month_total": to_rupees(last_month)
+    }
+
+@storage_errors
+def get_expense_stats(username: str = None, group_id: str = None) -> Dict:
+    """Get statistics about expenses"""
+    if username or group_id:
+        owners = []
+        if username:
+            owners.append(("user", username))
+        if group_id:
+            owners.append(("group", group_id))
+        return _stats_from_rollups(owners) or dict(EMPTY_STATS)
+
+    df = get_expenses()
+    if df.empty:
+        return dict(EMPTY_STATS)
+
+    # Get current month's start and end dates
+    last_month_start, this_month_start, next_month_start = month_bounds()
+
+    paise = df["amount_paise"]
+    this_month = (df["Date"] >= this_month_start) & (df["Date"] < next_month_start)
+    last_month = (df["Date"] >= last_month_start) & (df["Date"] < this_month_start)
+    return {
+        "total_spent": to_rupees(int(paise.sum())),
+        "avg_expense": paise.mean() / 100,
+        "num_transactions": len(df),
+        "top_category": paise.groupby(df["Category"], observed=True).sum().idxmax(),
+        "this_month_total": to_rupees(int(paise[this_month].sum())),
+        "last_month_total": to_rupees(int(paise[last_month].sum()))
+    }
+
+@storage_errors
+def remove_expenses(expense_ids: List[str]) -> int:
+    """Remove expenses by their stable IDs; returns how many were removed"""
+    store = get_store()
+    rollups = get_rollups()
+    records = store.get_records(expense_ids)
+    rollups.begin_delete(records)
+    removed = 0
+    try:
+        removed = store.delete_records(expense_ids)
+    finally:
+        rollups.end_delete(records, removed > 0)
+    _expenses_changed()
+    return removed
+
+@storage_errors
+def update_expense(expense_id: str, **fields):
+    """Change fields of an existing expense, e.g. update_expense(id, Amount=250.0)
+
+    Raises NotFoundError if there is no expense with that ID.
+    """
+    store = get_store()
+    # Keep the rupee and paise amounts in step
+    if "Amount" in fields:
+        fields["amount_paise"] = to_paise(fields["Amount"])
+    elif "amount_paise" in fields:
+        fields["Amount"] = to_rupees(int(fields["amount_paise"]))
+    old = store.get_records([expense_id])
+    updated = store.update_record(expense_id, fields)
+    _expenses_changed()
+    # An update can move a row between owners, months and categories
+    owners = {owner_of(r) for r in old} | {owner_of({**r, **fields}) for r in old}
+    get_rollups().invalidate(owners)
+    if not updated:
+        raise NotFoundError(f"No expense with ID {expense_id}")
+
+def remove_expenses_by_indices(indices: List[int]) -> int:
+    """Remove expenses at specified positions in load_expenses() order
+
+    Prefer remove_expenses with IDs: positions shift when another session
+    writes between reading the list and deleting from it.
+    """
+    expenses = load_expenses()
+    expense_ids = [expenses[index]["id"] for index in set(indices) if 0 <= index < len(expenses)]
+    if not expense_ids:
+        return 0
+    return remove_expenses(expense_ids)
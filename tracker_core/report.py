@@ -0,0 +1,193 @@
+"""Monthly statements for users and groups, fanned out over worker processes
+
+    python -m tracker_core.report monthly --all-users --all-groups [--month 2025-06]
+    python -m tracker_core.report monthly --user swati --group group_20250615002702_4
+
+Each worker process indexes the expenses and settlements once, checking
+they are still current once per chunk. It then writes the statements of
+each chunk of users or groups it is handed as JSON Lines under --out, one
+file per chunk: users-<month>-<chunk>.jsonl and groups-<month>-<chunk>.jsonl.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from expense_store import get_store
+from money import record_paise, to_rupees
+from settlement import get_ledger, settle
+from splits import build_group_ledger
+from tracker_core import accounts
+from tracker_core.expenses import month_bounds
+
+CHUNK_SIZE = 1000
+
+# Per-process index of the data the statements need, rebuilt when the
+# month, the expenses or the settlements change
+_index = {}
+
+
+def _refresh(month: str):
+    """Index every expense and settlement in one pass each, unless already current"""
+    store, ledger = get_store(), get_ledger()
+    version = (month, store.version(), ledger.store.version())
+    if _index.get("version") == version:
+        return
+    personal, grouped, paid, records = {}, {}, {}, {}
+    for record in store.query():
+        group_id = record.get("group_id")
+        in_month = (record.get("Date") or "")[:7] == month
+        if group_id is None:
+            if in_month:
+                personal.setdefault(record.get("Username"), []).append(record)
+            continue
+        records.setdefault(group_id, []).append(record)
+        if in_month:
+            grouped.setdefault(group_id, []).append(record)
+            payer = (group_id, record.get("Username"))
+            paid[payer] = paid.get(payer, 0) + record_paise(record)
+    settled = {}
+    for entry in ledger.store.load_records():
+        net = settled.setdefault(entry["group_id"], {})
+        amount = int(entry["amount_paise"])
+        net[entry["From"]] = net.get(entry["From"], 0) + amount
+        net[entry["To"]] = net.get(entry["To"], 0) - amount
+    _index.clear()
+    _index.update(version=version, personal=personal, grouped=grouped, paid=paid,
+                  records=records, settled=settled, balances={})
+
+
+def _group_balance(group_id: str) -> Dict[str, int]:
+    """Current net balance in paise of every member of a group, settlements included"""
+    balances = _index["balances"].get(group_id)
+    if balances is None:
+        ledger = build_group_ledger(_index["records"].get(group_id, []))
+        settled = _index["settled"].get(group_id, {})
+        net = ledger.paid - ledger.owed
+        balances = {user: int(net[i]) + settled.get(user, 0) for i, user in enumerate(ledger.users)}
+        _index["balances"][group_id] = balances
+    return balances
+
+
+def _totals(records: List[Dict], key: str) -> Dict:
+    paise = {}
+    for record in records:
+        name = record.get(key)
+        paise[name] = paise.get(name, 0) + record_paise(record)
+    return {name: to_rupees(amount) for name, amount in sorted(paise.items(), key=lambda item: str(item[0]))}
+
+
+def user_statement(username: str, month: str) -> Dict:
+    """Personal spending of the month, group spending and current group balances of one user"""
+    _refresh(month)
+    return _user_statement(username, month)
+
+
+def _user_statement(username: str, month: str) -> Dict:
+    personal = _index["personal"].get(username, [])
+    index = accounts.get_group_index()
+    groups = []
+    for group_id in index.user_groups.get(username, {}):
+        groups.append({
+            "group_id": group_id,
+            "name": index.groups[group_id]["name"],
+            "paid_this_month": to_rupees(_index["paid"].get((group_id, username), 0)),
+            "net_balance": to_rupees(_group_balance(group_id).get(username, 0))
+        })
+    return {
+        "username": username,
+        "month": month,
+        "total_spent": to_rupees(sum(record_paise(r) for r in personal)),
+        "num_transactions": len(personal),
+        "by_category": _totals(personal, "Category"),
+        "groups": groups
+    }
+
+
+def group_statement(group_id: str, month: str) -> Dict:
+    """Spending of the month per member and category, current balances and how to settle them"""
+    _refresh(month)
+    return _group_statement(group_id, month)
+
+
+def _group_statement(group_id: str, month: str) -> Dict:
+    records = _index["grouped"].get(group_id, [])
+    group_info = accounts.get_group_index().groups.get(group_id, {})
+    balances = _group_balance(group_id)
+    return {
+        "group_id": group_id,
+        "name": group_info.get("name"),
+        "month": month,
+        "total_spent": to_rupees(sum(record_paise(r) for r in records)),
+        "num_transactions": len(records),
+        "by_member": _totals(records, "Username"),
+        "by_category": _totals(records, "Category"),
+        "balances": {user: to_rupees(paise) for user, paise in sorted(balances.items(), key=lambda item: str(item[0]))},
+        "settle_up": [[payer, payee, to_rupees(amount)] for payer, payee, amount in settle(balances)]
+    }
+
+
+def _write_chunk(kind: str, names: List[str], month: str, chunk: int, out_dir: str) -> int:
+    """Worker task: write the statements of one chunk and return how many were written"""
+    build = _user_statement if kind == "users" else _group_statement
+    _refresh(month)
+    path = os.path.join(out_dir, f"{kind}-{month}-{chunk:05d}.jsonl")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        for name in names:
+            f.write(json.dumps(build(name, month)) + "\n")
+    os.replace(tmp_path, path)
+    return len(names)
+
+
+def run_monthly(month: str, usernames: List[str], group_ids: List[str], out_dir: str,
+                workers: int = None, chunk_size: int = CHUNK_SIZE) -> Dict[str, int]:
+    """Write every statement, chunks spread over ``workers`` processes (0: in this process)"""
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = []
+    for kind, names in (("users", usernames), ("groups", group_ids)):
+        for chunk, start in enumerate(range(0, len(names), chunk_size)):
+            tasks.append((kind, names[start:start + chunk_size], month, chunk, out_dir))
+    written = {"users": 0, "groups": 0}
+    if workers == 0:
+        for task in tasks:
+            written[task[0]] += _write_chunk(*task)
+        return written
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(task[0], pool.submit(_write_chunk, *task)) for task in tasks]
+        for kind, future in futures:
+            written[kind] += future.result()
+    return written
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Write monthly expense statements")
+    parser.add_argument("command", choices=["monthly"])
+    parser.add_argument("--month", default=month_bounds()[0][:7], help="YYYY-MM (default: last month)")
+    parser.add_argument("--all-users", action="store_true", help="A statement for every user")
+    parser.add_argument("--all-groups", action="store_true", help="A statement for every group")
+    parser.add_argument("--user", action="append", default=[], help="Only this user (repeatable)")
+    parser.add_argument("--group", action="append", default=[], help="Only this group (repeatable)")
+    parser.add_argument("--out", default="statements", help="Output directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Worker processes (default: one per core; 0 runs in this process)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Statements per task and file")
+    args = parser.parse_args(argv)
+
+    usernames = sorted(accounts.load_users()) if args.all_users else args.user
+    group_ids = sorted(accounts.load_groups()) if args.all_groups else args.group
+    if not usernames and not group_ids:
+        parser.error("nothing to do: pass --all-users, --all-groups, --user or --group")
+
+    started = time.perf_counter()
+    written = run_monthly(args.month, usernames, group_ids, args.out, args.workers, args.chunk_size)
+    print(f"Wrote {written['users']} user and {written['groups']} group statements for {args.month} "
+          f"to {args.out} in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
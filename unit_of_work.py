@@ -0,0 +1,108 @@
+import contextvars
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, Optional
+
+# Request-scoped snapshot of everything one Streamlit rerun reads. Loaders
+# in auth and expense_logic go through scoped(), so users.json, groups.json
+# and each expense query are read at most once per rerun no matter how many
+# functions ask for them. Writes drop the affected entries. Outside a unit
+# of work every call reads as before.
+
+_current: contextvars.ContextVar = contextvars.ContextVar("unit_of_work", default=None)
+
+
+class UnitOfWork:
+    """Values loaded during one rerun plus a trace of the physical reads"""
+
+    def __init__(self):
+        self._values: Dict[Hashable, object] = {}
+        self.reads = Counter()
+        self.loads = 0
+        self.hits = 0
+        self.started = time.perf_counter()
+
+    def get(self, key: tuple, loader: Callable, copy: Callable = None):
+        """Value for ``key``, calling ``loader`` only the first time"""
+        if key in self._values:
+            self.hits += 1
+            value = self._values[key]
+        else:
+            value = loader()
+            self.loads += 1
+            self._values[key] = value
+        return copy(value) if copy else value
+
+    def invalidate(self, source: str = None):
+        """Drop cached values of one source (the first key element), or all of them"""
+        if source is None:
+            self._values.clear()
+        else:
+            for key in [k for k in self._values if k[0] == source]:
+                del self._values[key]
+
+    def stats(self) -> Dict:
+        return {
+            "physical_reads": sum(self.reads.values()),
+            "reads_by_source": dict(self.reads),
+            "loads": self.loads,
+            "hits": self.hits,
+            "seconds": round(time.perf_counter() - self.started, 4)
+        }
+
+
+def current_unit_of_work() -> Optional[UnitOfWork]:
+    return _current.get()
+
+
+def scoped(key: tuple, loader: Callable, copy: Callable = None):
+    """Load through the active unit of work, or directly if there is none"""
+    unit = _current.get()
+    if unit is None:
+        value = loader()
+        return copy(value) if copy else value
+    return unit.get(key, loader, copy)
+
+
+def invalidate(source: str = None):
+    """Forget cached values after a write so the rest of the rerun sees it"""
+    unit = _current.get()
+    if unit is not None:
+        unit.invalidate(source)
+
+
+def trace_read(source: str):
+    """Count one physical read (file open or store query) against the active unit of work"""
+    unit = _current.get()
+    if unit is not None:
+        unit.reads[source] += 1
+
+
+def begin_unit_of_work() -> UnitOfWork:
+    """Start a fresh unit of work for the current context, replacing any previous one
+
+    Meant for the top of a Streamlit script, where st.rerun() and st.stop()
+    end the run with an exception and the next run starts over.
+    """
+    unit = UnitOfWork()
+    _current.set(unit)
+    return unit
+
+
+def end_unit_of_work() -> Dict:
+    """Close the active unit of work and return its read trace"""
+    unit = _current.get()
+    _current.set(None)
+    return unit.stats() if unit is not None else {}
+
+
+@contextmanager
+def unit_of_work():
+    """Scope for scripts and background jobs: ``with unit_of_work() as uow: ...``"""
+    unit = UnitOfWork()
+    token = _current.set(unit)
+    try:
+        yield unit
+    finally:
+        _current.reset(token)